@@ -0,0 +1,110 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the time EventDispatcher.dispatch takes per event
+# for common handler layouts, compared with wrapping every coroutine
+# handler in a task and gathering them.
+#
+# Run with `python -m benchmarks.bench_dispatch`.
+
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+from shanghai.event import (
+    Event, EventDispatcher, HandlerInstance, ResultSet, build_event, event,
+)
+
+
+class GatheringDispatcher(EventDispatcher):
+
+    """Runs every coroutine handler in a task, as dispatch did before the fast path."""
+
+    async def dispatch(self, event: Event) -> Optional[ResultSet]:
+        plan = self.plans.get(event.name)
+        if plan is None:
+            return None
+        joined_result_set = ResultSet()
+        for priority, coroutines, functions, handlers in plan:
+            results: List = []
+            if coroutines:
+                tasks = [asyncio.ensure_future(h(**event.args)) for h in coroutines]
+                results.extend(await asyncio.gather(*tasks, return_exceptions=True))
+            for handler in functions:
+                try:
+                    results.append(handler(**event.args))
+                except Exception as e:
+                    results.append(e)
+            joined_result_set += self.handle_results(event.name, priority, handlers, results)
+            if joined_result_set.eat:
+                return joined_result_set
+        return joined_result_set
+
+
+def make_handler(is_async: bool) -> Callable:
+    # a new function every time, since a handler can only be registered once
+    if is_async:
+        async def handler(message):
+            pass
+    else:
+        def handler(message):
+            pass
+    return event('PRIVMSG')(handler)
+
+
+# whether each handler on the same priority level is async
+LAYOUTS: Dict[str, List[bool]] = {
+    'one async': [True],
+    'one sync': [False],
+    'async + sync': [True, False],
+    'two async': [True, True],
+}
+
+
+def make_dispatcher(cls, layout: List[bool]) -> EventDispatcher:
+    dispatcher = cls()
+    for is_async in layout:
+        dispatcher.register(HandlerInstance.from_handler(make_handler(is_async)))
+    return dispatcher
+
+
+async def bench(dispatcher: EventDispatcher, events: int) -> float:
+    evt = build_event('PRIVMSG', message=None)
+    start = time.perf_counter()
+    for _ in range(events):
+        await dispatcher.dispatch(evt)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    loop = asyncio.get_event_loop()
+    events = 20000
+    print(f"{'handlers':>12} {'gather':>9} {'dispatch':>9} {'saved':>8}")
+    for name, layout in LAYOUTS.items():
+        times = []
+        for cls in (GatheringDispatcher, EventDispatcher):
+            dispatcher = make_dispatcher(cls, layout)
+            times.append(min(loop.run_until_complete(bench(dispatcher, events))
+                             for _ in range(5)) / events)
+        before, after = times
+        print(f"{name:>12} {before * 1e6:>7.2f}us {after * 1e6:>7.2f}us"
+              f" {(before - after) * 1e6:>6.2f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures parsing throughput and allocations on the synthetic corpora.
+#
+# Run with `python -m benchmarks.bench_parser`.
+# Use `--json results.json` to store the results
+# and `--compare results.json` on another commit to compare against them.
+
+import argparse
+import datetime
+import json
+import logging
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from shanghai.irc import LazyMessage, Message, Options, Prefix
+from shanghai.irc.message import CtcpMessage, PrefixCache, TextMessage
+
+from .corpora import CORPORA, Corpus
+
+
+class Case(NamedTuple):
+    name: str
+    corpus: str
+    func: Callable[[Any], Any]
+    inputs: Sequence[Any]
+
+
+class Result(NamedTuple):
+    case: str
+    corpus: str
+    items: int
+    seconds: float
+    items_per_second: float
+    peak_bytes_per_item: float
+    retained_blocks_per_item: float
+
+
+def make_cases(corpora: Dict[str, Corpus]) -> List[Case]:
+    cases = []
+    messages: Dict[str, List[Message]] = {}
+    for name, lines in corpora.items():
+        messages[name] = [Message.from_line(line.decode('utf-8')) for line in lines]
+        # the baseline, what reading a line amounted to before `from_bytes`
+        cases.append(Case('decode+Message.from_line', name,
+                          lambda line: Message.from_line(line.decode('utf-8')), lines))
+        cases.append(Case('Message.from_bytes', name, Message.from_bytes, lines))
+        cases.append(Case('LazyMessage.from_bytes', name, LazyMessage.from_bytes, lines))
+
+    for name in ('ctcp', 'privmsg_flood'):
+        privmsgs = [msg for msg in messages[name] if msg.command == 'PRIVMSG']
+        cases.append(Case('CtcpMessage.from_message', name, CtcpMessage.from_message, privmsgs))
+        # as in the CTCP plugin, starting from a line that is only parsed on demand
+        raw_privmsgs = [line for line, msg in zip(corpora[name], messages[name])
+                        if msg.command == 'PRIVMSG']
+        cases.append(Case('CtcpMessage.from_message[lazy]', name,
+                          lambda line: CtcpMessage.from_message(LazyMessage.from_bytes(line)),
+                          raw_privmsgs))
+
+    for name in ('privmsg_flood', 'tag_heavy'):
+        text_messages = [msg for msg in messages[name] if msg.command in ('PRIVMSG', 'NOTICE')]
+        cases.append(Case('TextMessage.from_message', name, TextMessage.from_message,
+                          text_messages))
+        # the whole path of a text message, compared to decode+Message.from_line
+        raw_text = [line for line, msg in zip(corpora[name], messages[name])
+                    if msg.command in ('PRIVMSG', 'NOTICE')]
+        cases.append(Case('decode+from_line+TextMessage', name,
+                          lambda line: TextMessage.from_message(
+                              Message.from_line(line.decode('utf-8'))),
+                          raw_text))
+        cases.append(Case('LazyMessage+TextMessage', name,
+                          lambda line, cache=PrefixCache(): TextMessage.from_message(
+                              LazyMessage.from_bytes(line, prefix_cache=cache)),
+                          raw_text))
+
+    for name in ('privmsg_flood', 'tag_heavy'):
+        prefixes = [f":{msg.prefix}" for msg in messages[name]]
+        cases.append(Case('Prefix.from_string', name, Prefix.from_string, prefixes))
+
+    nicks = [nick for msg in messages['names_burst'] if msg.command == '353'
+             for nick in msg.params[3].split()]
+    cases.append(Case('Options.split_prefixes', 'names_burst',
+                      Options().split_prefixes, nicks))
+    cases.append(Case('Options.split_prefixes[NAMESX]', 'names_burst',
+                      Options(NAMESX=True).split_prefixes, nicks))
+    return cases
+
+
+def measure_time(case: Case, repeat: int) -> float:
+    func, inputs = case.func, case.inputs
+    timer = timeit.Timer(lambda: [func(item) for item in inputs])
+    return min(timer.repeat(repeat=repeat, number=1))
+
+
+def measure_memory(case: Case) -> Tuple[int, int]:
+    """Return the peak traced memory and the number of blocks still held by the results.
+
+    Results are kept alive until the end of the pass,
+    like a burst of events waiting in the queue.
+    """
+    func, inputs = case.func, case.inputs
+    tracemalloc.start()
+    try:
+        results = [func(item) for item in inputs]
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del results
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    return peak, blocks
+
+
+def run_case(case: Case, repeat: int) -> Result:
+    items = len(case.inputs)
+    seconds = measure_time(case, repeat)
+    peak, blocks = measure_memory(case)
+    return Result(case.name, case.corpus, items, seconds,
+                  items / seconds if seconds else float('inf'),
+                  peak / items, blocks / items)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path: str) -> Dict[Tuple[str, str], float]:
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return {(result['case'], result['corpus']): result['items_per_second']
+            for result in data['results']}
+
+
+def print_table(results: List[Result],
+                baseline: Optional[Dict[Tuple[str, str], float]] = None) -> None:
+    header = (f"{'case':<32} {'corpus':<17} {'items':>7} {'items/s':>11}"
+              f" {'peak B/item':>12} {'blocks/item':>12}")
+    if baseline is not None:
+        header += f" {'vs base':>8}"
+    print(header)
+    for result in results:
+        row = (f"{result.case:<32} {result.corpus:<17} {result.items:>7}"
+               f" {result.items_per_second:>11,.0f} {result.peak_bytes_per_item:>12.1f}"
+               f" {result.retained_blocks_per_item:>12.2f}")
+        if baseline is not None:
+            base = baseline.get((result.case, result.corpus))
+            row += f" {result.items_per_second / base:>7.2f}x" if base else f" {'-':>8}"
+        print(row)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_parser')
+    parser.add_argument('--count', type=int, default=5000,
+                        help="lines per corpus, nicks for names_burst (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="timing runs per case, the fastest is used (default: %(default)s)")
+    parser.add_argument('--filter', default='',
+                        help="only run cases whose name contains this string")
+    parser.add_argument('--json', metavar='PATH',
+                        help="write the results as JSON to PATH ('-' for stdout)")
+    parser.add_argument('--compare', metavar='PATH',
+                        help="compare throughput against a previous JSON result")
+    args = parser.parse_args(argv)
+
+    # unknown_numerics makes the parser warn about every new numeric
+    logging.disable(logging.WARNING)
+
+    corpora = {name: generate(args.count, args.seed) for name, generate in CORPORA.items()}
+    cases = [case for case in make_cases(corpora) if args.filter in case.name]
+    results = [run_case(case, args.repeat) for case in cases]
+
+    if args.json != '-':
+        baseline = load_baseline(args.compare) if args.compare else None
+        print_table(results, baseline)
+
+    if args.json:
+        data = {
+            'meta': {
+                'revision': git_revision(),
+                'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': sys.version,
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'count': args.count,
+                'seed': args.seed,
+                'repeat': args.repeat,
+            },
+            'results': [result._asdict() for result in results],
+        }
+        if args.json == '-':
+            json.dump(data, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
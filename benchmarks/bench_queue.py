@@ -0,0 +1,78 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares consuming bursts of events from an asyncio.Queue one at a time
+# with taking them in batches from an EventQueue.
+#
+# Run with `python -m benchmarks.bench_queue`.
+
+import asyncio
+import time
+
+from shanghai.event_queue import EventQueue
+
+
+async def bench_asyncio_queue(bursts: int, burst_size: int) -> float:
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def consumer():
+        for _ in range(bursts * burst_size):
+            await queue.get()
+
+    start = time.perf_counter()
+    task = asyncio.ensure_future(consumer())
+    for _ in range(bursts):
+        for i in range(burst_size):
+            queue.put_nowait(i)
+        await asyncio.sleep(0)
+    await task
+    return time.perf_counter() - start
+
+
+async def bench_event_queue(bursts: int, burst_size: int) -> float:
+    queue: EventQueue = EventQueue()
+
+    async def consumer():
+        remaining = bursts * burst_size
+        while remaining:
+            remaining -= len(await queue.get_batch())
+
+    start = time.perf_counter()
+    task = asyncio.ensure_future(consumer())
+    for _ in range(bursts):
+        queue.put_many_nowait(range(burst_size))
+        await asyncio.sleep(0)
+    await task
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    loop = asyncio.get_event_loop()
+    print(f"{'burst':>6} {'asyncio.Queue':>14} {'EventQueue':>11} {'speedup':>8}")
+    for burst_size in (1, 10, 100, 1000):
+        bursts = 100000 // burst_size
+        plain = min(loop.run_until_complete(bench_asyncio_queue(bursts, burst_size))
+                    for _ in range(3))
+        batched = min(loop.run_until_complete(bench_event_queue(bursts, burst_size))
+                      for _ in range(3))
+        print(f"{burst_size:>6} {plain * 1000:>12.1f}ms {batched * 1000:>9.1f}ms"
+              f" {plain / batched:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
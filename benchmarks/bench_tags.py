@@ -0,0 +1,115 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares the compiled tag codec in `shanghai.irc.tags`
+# with the previous character-by-character implementation.
+#
+# Run with `python -m benchmarks.bench_tags`.
+
+import timeit
+from typing import Callable, Dict, List, Union
+
+from shanghai.irc import tags
+
+from .corpora import make_tag_sections
+
+_ESCAPE_SEQUENCES = {
+    'n': '\n',
+    'r': '\r',
+    's': ' ',
+    '\\': '\\',
+    ':': ';',
+}
+
+
+def naive_escape(value: str) -> str:
+    out_value = ''
+    sequences = {v: k for k, v in _ESCAPE_SEQUENCES.items()}
+    for char in value:
+        if char in sequences:
+            out_value += '\\' + sequences[char]
+        else:
+            out_value += char
+    return out_value
+
+
+def naive_unescape(value: str) -> str:
+    out_value = ''
+    escape = False
+    for char in value:
+        if escape:
+            out_value += _ESCAPE_SEQUENCES.get(char, char)
+            escape = False
+        else:
+            if char == '\\':
+                escape = True
+            else:
+                out_value += char
+    return out_value
+
+
+def naive_parse_tags(data: str) -> Dict[str, Union[str, bool]]:
+    parsed: Dict[str, Union[str, bool]] = {}
+    for tag in data.split(';'):
+        if '=' in tag:
+            key, value = tag.split('=', 1)
+            parsed[key] = naive_unescape(value)
+        else:
+            parsed[tag] = True
+    return parsed
+
+
+def naive_format_tags(mapping: Dict[str, Union[str, bool]]) -> str:
+    out = ''
+    for key, value in mapping.items():
+        if out:
+            out += ';'
+        out += key
+        if value is not True:
+            out += '=' + naive_escape(value)
+    return out
+
+
+def bench(func: Callable, inputs: List, repeat: int = 5) -> float:
+    timer = timeit.Timer(lambda: [func(item) for item in inputs])
+    return min(timer.repeat(repeat=repeat, number=1))
+
+
+def main() -> None:
+    sections = make_tag_sections(2000)
+    values = [value for section in sections
+              for value in tags.parse_tags(section).values() if value is not True]
+    mappings = [tags.parse_tags(section) for section in sections]
+
+    cases = [
+        ("unescape", naive_unescape, tags.unescape, sections),
+        ("escape", naive_escape, tags.escape, values),
+        ("parse_tags", naive_parse_tags, tags.parse_tags, sections),
+        ("format_tags", naive_format_tags, tags.format_tags, mappings),
+    ]
+
+    print(f"{'case':<12} {'naive':>10} {'codec':>10} {'speedup':>8}")
+    for name, naive_func, codec_func, inputs in cases:
+        naive_time = bench(naive_func, inputs)
+        codec_time = bench(codec_func, inputs)
+        print(f"{name:<12} {naive_time * 1000:>8.2f}ms {codec_time * 1000:>8.2f}ms"
+              f" {naive_time / codec_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares the connection transports on a local server
+# that sends a corpus of lines as fast as possible.
+#
+# Run with `python -m benchmarks.bench_transport`.
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import List, Optional
+
+from shanghai.config import Server
+from shanghai.connection import TRANSPORTS
+from shanghai.event_queue import EventQueue
+from shanghai.plugin_base import NetworkEventName
+
+from .bench_parser import git_revision
+from .corpora import CORPORA
+
+
+async def _serve(data: bytes, chunk_size: int,
+                 reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    for i in range(0, len(data), chunk_size):
+        writer.write(data[i:i + chunk_size])
+        # let the client read each chunk on its own
+        await writer.drain()
+        await asyncio.sleep(0)
+    writer.close()
+
+
+async def measure(transport: str, data: bytes, chunk_size: int) -> float:
+    loop = asyncio.get_event_loop()
+    server = await asyncio.start_server(lambda r, w: _serve(data, chunk_size, r, w),
+                                        '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    queue: EventQueue = EventQueue()
+    connection = TRANSPORTS[transport](Server('127.0.0.1', port), queue, loop)
+
+    start = time.perf_counter()
+    task = loop.create_task(connection.run())
+    lines = 0
+    while True:
+        event = await queue.get()
+        if event.name == NetworkEventName.RAW_LINES:
+            lines += len(event.args['raw_lines'])
+        elif event.name == NetworkEventName.DISCONNECTED:
+            break
+    elapsed = time.perf_counter() - start
+
+    await task
+    server.close()
+    await server.wait_closed()
+    return elapsed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_transport')
+    parser.add_argument('--count', type=int, default=50000,
+                        help="lines to send (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="runs per transport, the fastest is used (default: %(default)s)")
+    parser.add_argument('--chunk-size', type=int, action='append',
+                        help="bytes per server write, may be repeated (default: 512 and 16384)")
+    parser.add_argument('--json', metavar='PATH',
+                        help="write the results as JSON to PATH ('-' for stdout)")
+    args = parser.parse_args(argv)
+    chunk_sizes = args.chunk_size or [512, 16384]
+
+    # silence the connection's info messages
+    logging.disable(logging.WARNING)
+
+    lines = CORPORA['privmsg_flood'](args.count, args.seed)
+    data = b''.join(line + b'\r\n' for line in lines)
+
+    loop = asyncio.get_event_loop()
+    results = []
+    for chunk_size in chunk_sizes:
+        for transport in TRANSPORTS:
+            seconds = min(loop.run_until_complete(measure(transport, data, chunk_size))
+                          for _ in range(args.repeat))
+            results.append({
+                'transport': transport,
+                'chunk_size': chunk_size,
+                'lines': len(lines),
+                'seconds': seconds,
+                'lines_per_second': len(lines) / seconds,
+            })
+
+    if args.json != '-':
+        print(f"{'transport':<10} {'chunk':>6} {'lines':>7} {'lines/s':>11}")
+        for result in results:
+            print(f"{result['transport']:<10} {result['chunk_size']:>6} {result['lines']:>7}"
+                  f" {result['lines_per_second']:>11,.0f}")
+
+    if args.json:
+        output = {'meta': {'revision': git_revision()}, 'results': results}
+        if args.json == '-':
+            print(json.dumps(output, indent=2))
+        else:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(output, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
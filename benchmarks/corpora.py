@@ -0,0 +1,166 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Reproducible synthetic IRC traffic for the benchmarks.
+#
+# Every generator takes a line (or nick) count and a seed
+# and returns the same list of raw lines for the same arguments,
+# so numbers from different commits can be compared.
+
+import random
+from typing import Callable, Dict, List
+
+from shanghai.irc import tags
+
+CHANNELS = ('#chireiden', '#shanghai', '#python', '#ircv3', '#touhou')
+WORDS = ('hello', 'world', 'shanghai', 'doll', 'alice', 'marisa', 'reimu',
+         'http://example.com/some/path', 'the', 'a', 'is', 'of', 'and', ':)',
+         'ünïcödé', '日本語', 'lorem', 'ipsum', 'dolor', 'sit', 'amet')
+CTCP_COMMANDS = ('VERSION', 'PING', 'TIME', 'CLIENTINFO', 'ACTION', 'FINGER')
+
+_NICK_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789[]\\`_^{|}-'
+_SERVER = 'irc.example.com'
+# RFC 1459 line length without CR LF
+_MAX_LINE_LENGTH = 510
+
+Corpus = List[bytes]
+
+
+def make_nick(rng: random.Random) -> str:
+    return rng.choice('abcdefghijklmnopqrstuvwxyz') + ''.join(
+        rng.choice(_NICK_CHARS) for _ in range(rng.randrange(2, 15)))
+
+
+def make_prefix(rng: random.Random) -> str:
+    nick = make_nick(rng)
+    return f"{nick}!~{nick[:9].lower()}@user/{nick.lower()}/x-{rng.randrange(10 ** 6)}"
+
+
+def make_text(rng: random.Random, max_words: int = 30) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(1, max_words)))
+
+
+def make_tag_sections(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    sections = []
+    for i in range(count):
+        mapping = {
+            'time': f"2016-01-{i % 28 + 1:02}T12:{i % 60:02}:00.{i % 1000:03}Z",
+            'msgid': ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789')
+                             for _ in range(22)),
+            'account': f"user{rng.randrange(5000)}",
+            'batch': f"netjoin{rng.randrange(10)}",
+            '+draft/reply': f"ref{i}",
+            # escaped, long value
+            'example.com/note': ' '.join(["some; text\\with escapes"] * rng.randrange(1, 20)),
+        }
+        if i % 3:
+            mapping['bot'] = True
+        sections.append(tags.format_tags(mapping))
+    return sections
+
+
+def tag_heavy(count: int, seed: int = 0) -> Corpus:
+    """PRIVMSGs and JOINs carrying IRCv3 tag sections of varying size."""
+    rng = random.Random(seed)
+    lines = []
+    for section in make_tag_sections(count, seed):
+        prefix = make_prefix(rng)
+        if rng.random() < 0.8:
+            line = f"@{section} :{prefix} PRIVMSG {rng.choice(CHANNELS)} :{make_text(rng)}"
+        else:
+            line = f"@{section} :{prefix} JOIN {rng.choice(CHANNELS)}"
+        lines.append(line.encode('utf-8'))
+    return lines
+
+
+def names_burst(count: int, seed: int = 0) -> Corpus:
+    """RPL_NAMREPLY lines listing `count` (multi-)prefixed nicks, as sent after a JOIN."""
+    rng = random.Random(seed)
+    channel = rng.choice(CHANNELS)
+    head = f":{_SERVER} 353 Shanghai = {channel} :"
+    lines = []
+    nicks: List[str] = []
+    length = len(head)
+    for _ in range(count):
+        # mostly regular users, some voiced or opped, a few both (NAMESX)
+        prefixes = rng.choice(('', '', '', '', '', '', '+', '@', '@+', '%'))
+        nick = prefixes + make_nick(rng)
+        if nicks and length + len(nick) + 1 > _MAX_LINE_LENGTH:
+            lines.append((head + ' '.join(nicks)).encode('utf-8'))
+            nicks, length = [], len(head)
+        nicks.append(nick)
+        length += len(nick) + 1
+    if nicks:
+        lines.append((head + ' '.join(nicks)).encode('utf-8'))
+    lines.append(f":{_SERVER} 366 Shanghai {channel} :End of /NAMES list.".encode('utf-8'))
+    return lines
+
+
+def privmsg_flood(count: int, seed: int = 0) -> Corpus:
+    """Channel and private messages and notices from a few hundred users."""
+    rng = random.Random(seed)
+    prefixes = [make_prefix(rng) for _ in range(300)]
+    lines = []
+    for _ in range(count):
+        command = 'PRIVMSG' if rng.random() < 0.9 else 'NOTICE'
+        target = rng.choice(CHANNELS) if rng.random() < 0.85 else 'Shanghai'
+        line = f":{rng.choice(prefixes)} {command} {target} :{make_text(rng)}"
+        lines.append(line.encode('utf-8'))
+    return lines
+
+
+def ctcp(count: int, seed: int = 0) -> Corpus:
+    """CTCP requests, ACTIONs and a few malformed CTCP-like messages."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        prefix = make_prefix(rng)
+        command = rng.choice(CTCP_COMMANDS)
+        if command == 'ACTION':
+            body = f"\x01ACTION {make_text(rng, 10)}\x01"
+            target = rng.choice(CHANNELS)
+        else:
+            body = f"\x01{command} {rng.randrange(10 ** 9)}\x01"
+            target = 'Shanghai'
+        if i % 10 == 0:
+            # unterminated
+            body = body[:-1]
+        lines.append(f":{prefix} PRIVMSG {target} :{body}".encode('utf-8'))
+    return lines
+
+
+def unknown_numerics(count: int, seed: int = 0) -> Corpus:
+    """Numerics that are not part of ServerReply, e.g. from server extensions."""
+    rng = random.Random(seed)
+    numerics = [f"{rng.randrange(600, 1000):03}" for _ in range(20)]
+    lines = []
+    for _ in range(count):
+        params = ' '.join(make_nick(rng) for _ in range(rng.randrange(0, 5)))
+        line = f":{_SERVER} {rng.choice(numerics)} Shanghai {params} :{make_text(rng, 10)}"
+        lines.append(line.encode('utf-8'))
+    return lines
+
+
+CORPORA: Dict[str, Callable[[int, int], Corpus]] = {
+    'tag_heavy': tag_heavy,
+    'names_burst': names_burst,
+    'privmsg_flood': privmsg_flood,
+    'ctcp': ctcp,
+    'unknown_numerics': unknown_numerics,
+}
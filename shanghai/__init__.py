@@ -20,7 +20,7 @@ import asyncio
 from typing import Any, Dict, Generator
 
 from .config import ShanghaiConfiguration
-from .network import Network
+from .network import Network, NetworkStatus
 from .plugin_system import PluginManager
 
 __all__ = ('Shanghai')
@@ -56,6 +56,9 @@ class Shanghai:
             )
             yield network_task
 
+    def status(self) -> Dict[str, NetworkStatus]:
+        return {name: network['network'].status() for name, network in self.networks.items()}
+
     def stop_networks(self) -> None:
         for network in self.networks.values():
             network['network'].request_close()
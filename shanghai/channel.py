@@ -19,7 +19,8 @@
 import asyncio
 from typing import Coroutine, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 
-from .event import EventDispatcher
+from .event import Event, EventDispatcher
+from .event_queue import EventQueue
 from .irc import Prefix
 from .logging import get_logger, Logger
 from .plugin_base import ChannelPlugin
@@ -60,7 +61,7 @@ class Channel:
         self.logger: Logger = get_logger('channel', f'{self.name}@{self.network.name}',
                                          self.config)
         self.modes = ChannelModes()
-        self.event_queue: asyncio.Queue = asyncio.Queue()
+        self.event_queue: EventQueue[Event] = EventQueue(loop=self.network.loop)
 
         self._event_dispatcher = EventDispatcher(logger=self.logger)
         self._plugins: Set[ChannelPlugin] = set()
@@ -85,13 +86,20 @@ class Channel:
     async def _worker(self) -> None:
         """Dispatches events from the event queue."""
         while not (self._parted and self.event_queue.empty()):
-            event = await self.event_queue.get()
-            self.logger.debug(f"Dispatching {event}")
-            result = await self._event_dispatcher.dispatch(event)
-            if result:
-                self._manage_subtasks(result.schedule)
-                for new_event in result.append_events:
-                    self.event_queue.put_nowait(new_event)
+            events = await self.event_queue.get_batch()
+            for i, event in enumerate(events):
+                try:
+                    await self._dispatch(event)
+                except BaseException:
+                    self.event_queue.requeue(events[i + 1:])
+                    raise
+
+    async def _dispatch(self, event: Event) -> None:
+        self.logger.debug(f"Dispatching {event}")
+        result = await self._event_dispatcher.dispatch(event)
+        if result:
+            self._manage_subtasks(result.schedule)
+            self.event_queue.put_many_nowait(result.append_events)
 
     def _manage_subtasks(self, new_coroutines: Optional[Iterable[Coroutine]]):
         """Clean up finished subtasks and add new ones."""
@@ -31,13 +31,18 @@ class Server(NamedTuple):
     host: str
     port: int
     ssl: bool = False
+    # TLS options
+    verify: bool = True
+    ca_file: Optional[str] = None
+    client_cert: Optional[str] = None  # e.g. for SASL EXTERNAL
+    client_key: Optional[str] = None
 
     @classmethod
-    def with_optional_port(cls, host: str, port: Optional[int] = None, ssl: bool = False) \
-            -> 'Server':
+    def with_optional_port(cls, host: str, port: Optional[int] = None, ssl: bool = False,
+                           **tls_options: Any) -> 'Server':
         if port is None:
             port = 6697 if ssl else 6667
-        return cls(host, port, ssl)
+        return cls(host, port, ssl, **tls_options)
 
     @classmethod
     def from_string(cls, string: str) -> 'Server':
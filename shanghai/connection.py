@@ -17,22 +17,55 @@
 # along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
 
 import asyncio
+from typing import Callable, Dict, List, Optional, Type
 
-from .config import Server
-from .event import build_event
+from .config import ConfigurationError, Server
+from .event import build_event, Event
+from .event_queue import EventQueue
+from .helpers import DedupeSource
+from .irc.message import split_lines
+from .limits import LineLimiter
 from .plugin_base import NetworkEventName
-from .logging import Logger, get_default_logger
+from .logging import Logger, LogLevels, get_default_logger
+from .overload import LoadShedder
+from .tls import get_ssl_context, store_session
 
 
 class Connection:
 
+    """Stream-based connection, reading from an `asyncio.StreamReader`.
+
+    Lines written during one iteration of the event loop
+    are sent with a single write.
+    When more than `high_water` bytes are waiting in the transport,
+    further lines are held back until it has drained
+    and `on_drained` is called, if set.
+    Writers should check `draining` and hold back lines themselves in the meantime.
+
+    Received lines longer than allowed by `line_limiter`, if given, are truncated or dropped.
+    Lines other connections already received are removed by `deduplicator`, if given.
+    They are also passed through `shedder`, if given,
+    while the event queue is overloaded.
+    """
+
     writer: asyncio.StreamWriter
+    _reader: asyncio.StreamReader
+    read_size = 2 ** 16
+    # seconds it took to establish the connection, including the TLS handshake
+    connect_duration: Optional[float] = None
+    # whether a previous TLS session was resumed
+    tls_resumed: Optional[bool] = None
+    on_drained: Optional[Callable[[], None]] = None
 
     def __init__(self,
                  server: Server,
-                 queue: asyncio.Queue,
+                 queue: EventQueue[Event],
                  loop: asyncio.AbstractEventLoop,
-                 logger: Logger = None,
+                 logger: Optional[Logger] = None,
+                 high_water: int = 2 ** 16,
+                 shedder: Optional[LoadShedder] = None,
+                 line_limiter: Optional[LineLimiter] = None,
+                 deduplicator: Optional[DedupeSource] = None,
                  ) -> None:
         self.server = server
         self.queue = queue
@@ -40,32 +73,196 @@ class Connection:
         if logger is None:
             logger = get_default_logger()
         self.logger = logger
+        self.high_water = high_water
+        self.shedder = shedder
+        self.line_limiter = line_limiter
+        self.deduplicator = deduplicator
+        self._buffer = b''
+        self._skip_line = False
+        self._out_lines: List[bytes] = []
+        self._out_size = 0
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        self._connect_started = 0.0
+
+    @property
+    def _transport(self) -> asyncio.WriteTransport:
+        return self.writer.transport  # type: ignore
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Number of bytes written but not yet sent."""
+        size = self._out_size
+        if hasattr(self, 'writer'):
+            size += self._transport.get_write_buffer_size()
+        return size
+
+    @property
+    def draining(self) -> bool:
+        """Whether lines are held back until the transport has drained."""
+        return self._drain_task is not None
 
     def writeline(self, line: bytes) -> None:
-        self.logger.info("<", line)
-        self.writer.write(line)
-        self.writer.write(b'\r\n')
+        self._out_lines.append(line)
+        self._out_size += len(line) + 2
+        if self._flush_handle is None and self._drain_task is None:
+            self._flush_handle = self.loop.call_soon(self._flush)
+
+    async def flush(self) -> None:
+        """Write all lines written so far to the transport.
+
+        Waits for the transport to drain first if it holds more than `high_water` bytes.
+        """
+        while self._out_lines or self._drain_task:
+            if self._drain_task:
+                await asyncio.wait([self._drain_task])
+            elif self._transport.is_closing():
+                return
+            else:
+                self._flush()
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        lines = self._out_lines
+        if not lines or self._transport.is_closing():
+            return
+        self._out_lines, self._out_size = [], 0
+
+        if self.logger.isEnabledFor(LogLevels.INFO):
+            for line in lines:
+                self.logger.info("<", line)
+        lines.append(b'')
+        self.writer.write(b'\r\n'.join(lines))
+
+        buffered = self._transport.get_write_buffer_size()
+        if buffered > self.high_water:
+            self.logger.debug(f"Waiting for {buffered} buffered bytes to drain")
+            self._drain_task = self.loop.create_task(self._drain())
+
+    async def _wait_drained(self) -> None:
+        await self.writer.drain()
+
+    async def _drain(self) -> None:
+        try:
+            await self._wait_drained()
+        except ConnectionError:
+            return
+        finally:
+            self._drain_task = None
+        self._flush()
+        if self.on_drained and self._drain_task is None:
+            self.on_drained()
 
     def close(self) -> None:
+        if self._flush_handle:
+            self._flush_handle.cancel()
+        # send what we have, closing the transport flushes its buffer
+        self._flush()
+        if self._drain_task:
+            self._drain_task.cancel()
+        # TLS 1.3 sends session tickets after the handshake
+        self._store_tls_session()
         self.writer.close()
 
-    async def run(self) -> None:
-        self.logger.info(f"connecting to {self.server}...")
-        reader, writer = await asyncio.open_connection(
-            self.server.host, self.server.port, ssl=self.server.ssl, loop=self.loop
+    def _store_tls_session(self) -> None:
+        context = get_ssl_context(self.server)
+        ssl_object = self._transport.get_extra_info('ssl_object')
+        if context is not None and ssl_object is not None:
+            store_session(context, ssl_object)
+
+    def _feed(self, data: bytes) -> Optional[Event]:
+        """Split received data into lines and build an event for all complete ones.
+
+        Partial lines are kept until the next call.
+        """
+        data = self._buffer + data
+        if self._skip_line:
+            # rest of an oversized line
+            end = data.find(b'\n')
+            if end == -1:
+                self._buffer = b''
+                return None
+            data = data[end + 1:]
+            self._skip_line = False
+
+        lines, self._buffer = split_lines(data)
+        limiter = self.line_limiter
+        if limiter:
+            if lines:
+                lines = limiter.filter(lines)
+            if len(self._buffer) > limiter.max_raw_length:
+                # don't wait for the end of the line
+                lines.extend(limiter.apply_partial(self._buffer))
+                self._buffer = b''
+                self._skip_line = True
+        if self.deduplicator and lines:
+            lines = self.deduplicator.filter(lines)
+        if not lines:
+            return None
+        if self.logger.isEnabledFor(LogLevels.DEBUG):
+            for line in lines:
+                self.logger.debug(">", line)
+
+        shedder = self.shedder
+        if shedder:
+            was_overloaded = shedder.overloaded
+            if shedder.check(shedder.pending):
+                if not was_overloaded:
+                    self.logger.warning(f"{shedder.pending} lines are waiting;"
+                                        f" {shedder.policy.value} chat messages")
+                lines = shedder.filter(lines)
+                if not lines:
+                    return None
+            elif was_overloaded:
+                self.logger.info(f"No longer overloaded; {shedder.stats()}")
+            shedder.queued(len(lines))
+
+        return build_event(NetworkEventName.RAW_LINES, raw_lines=lines)
+
+    async def _open(self) -> None:
+        self._reader, self.writer = await asyncio.open_connection(
+            self.server.host, self.server.port, ssl=get_ssl_context(self.server)
         )
-        self.writer = writer
 
+    async def _read(self) -> None:
+        # Read whatever is available and hand all complete lines
+        # to the network at once.
+        while True:
+            data = await self._reader.read(self.read_size)
+            if not data:
+                break
+            event = self._feed(data)
+            if event:
+                await self.queue.put(event)
+
+    async def connect(self) -> None:
+        """Establish the connection without reading from it yet.
+
+        `run` calls this unless it has been called before.
+        """
+        self.logger.info(f"connecting to {self.server}...")
+        self._connect_started = self.loop.time()
+        await self._open()
+        self._transport.set_write_buffer_limits(high=self.high_water)
+        self.connect_duration = self.loop.time() - self._connect_started
+
+        ssl_object = self._transport.get_extra_info('ssl_object')
+        if ssl_object is None:
+            self.logger.debug(f"connected to {self.server} in {self.connect_duration:.3f}s")
+            return
+        self.tls_resumed = ssl_object.session_reused
+        self._store_tls_session()
+        self.logger.debug(f"connected to {self.server} in {self.connect_duration:.3f}s"
+                          f" using {ssl_object.version()}"
+                          f" ({'resumed' if self.tls_resumed else 'full handshake'})")
+
+    async def run(self) -> None:
+        if self.connect_duration is None:
+            await self.connect()
         await self.queue.put(build_event(NetworkEventName.CONNECTED))
 
         try:
-            while not reader.at_eof():
-                line = await reader.readline()
-                line = line.strip()  # TODO remove?
-                self.logger.debug(">", line)
-                if line:
-                    event = build_event(NetworkEventName.RAW_LINE, raw_line=line)
-                    await self.queue.put(event)
+            await self._read()
         except asyncio.CancelledError:
             self.logger.info("Connection.run was cancelled")
         except ConnectionResetError as e:
@@ -74,3 +271,108 @@ class Connection:
             self.logger.debug("closing connection")
             self.close()
             await self.queue.put(build_event(NetworkEventName.DISCONNECTED))
+
+
+class _LineProtocol(asyncio.Protocol):
+
+    transport: asyncio.Transport
+
+    def __init__(self, connection: 'ProtocolConnection') -> None:
+        self.connection = connection
+        self.closed = connection.loop.create_future()
+        self._reading_paused = False
+        self._writing_paused = False
+        self._drain_waiters: List[asyncio.Future] = []
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore
+        self.connection.writer = transport  # type: ignore
+        self.connection._protocol = self
+        # until the connection is run
+        self.transport.pause_reading()
+
+    def data_received(self, data: bytes) -> None:
+        event = self.connection._feed(data)
+        if not event:
+            return
+        queue = self.connection.queue
+        queue.put_nowait(event)
+        if queue.full() and not self._reading_paused:
+            # Let the socket buffers fill up instead of the queue
+            self._reading_paused = True
+            self.transport.pause_reading()
+            self.connection.loop.create_task(self._resume_reading())
+
+    async def _resume_reading(self) -> None:
+        await self.connection.queue.wait_not_full()
+        self._reading_paused = False
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+
+    def pause_writing(self) -> None:
+        self._writing_paused = True
+
+    def resume_writing(self) -> None:
+        self._writing_paused = False
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drained(self) -> None:
+        if self._writing_paused and not self.closed.done():
+            waiter = self.connection.loop.create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if not self.closed.done():
+            self.closed.set_result(exc)
+        self.resume_writing()
+
+
+class ProtocolConnection(Connection):
+
+    """Connection based on `asyncio.Protocol`.
+
+    Received data is split into lines directly in the protocol callback
+    without waking up a reading coroutine for every chunk.
+    """
+
+    writer: asyncio.Transport  # type: ignore
+    _protocol: _LineProtocol
+
+    @property
+    def _transport(self) -> asyncio.WriteTransport:
+        return self.writer
+
+    async def _wait_drained(self) -> None:
+        await self._protocol.drained()
+
+    async def _open(self) -> None:
+        await self.loop.create_connection(
+            lambda: _LineProtocol(self), self.server.host, self.server.port,
+            ssl=get_ssl_context(self.server),
+        )
+
+    async def _read(self) -> None:
+        protocol = self._protocol
+        if not protocol.transport.is_closing():
+            protocol.transport.resume_reading()
+        exc = await protocol.closed
+        if isinstance(exc, ConnectionResetError):
+            raise exc
+
+
+TRANSPORTS: Dict[str, Type[Connection]] = {
+    'stream': Connection,
+    'protocol': ProtocolConnection,
+}
+
+
+def get_connection_class(transport: str) -> Type[Connection]:
+    try:
+        return TRANSPORTS[transport]
+    except KeyError:
+        raise ConfigurationError(f"Unknown transport {transport!r};"
+                                 f" expected one of {', '.join(TRANSPORTS)}") from None
@@ -16,14 +16,15 @@
 # You should have received a copy of the GNU General Public License
 # along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import enum
 from typing import Dict, Optional, Set, Type
 
-from ..event import build_event, core_event, event, Priority, ReturnValue
+from ..event import build_event, core_event, event, Event, Priority, ReturnValue
 from ..plugin_base import (ChannelEventName, MessagePluginMixin, NetworkPlugin, NetworkEventName,
                            OptionsPluginMixin)
 from ..irc import ServerReply
-from ..irc.message import (Prefix, Message, ChannelMessage, ChannelNotice,
+from ..irc.message import (Message, ChannelMessage, ChannelNotice,
                            PrivateMessage, PrivateNotice, TextMessage)
 from ..channel import Channel
 
@@ -36,6 +37,7 @@ class _ChannelStateEventName(str, enum.Enum):
     AFTER_KICKED = f'{__name__}_after_kicked'
     AFTER_PARTED = f'{__name__}_after_parted'
     AFTER_DISCONNECTED = f'{__name__}_after_disconnected'
+    RESYNC_EXPIRED = f'{__name__}_resync_expired'
 
 
 class ChannelStatePlugin(NetworkPlugin, MessagePluginMixin, OptionsPluginMixin):
@@ -43,15 +45,31 @@ class ChannelStatePlugin(NetworkPlugin, MessagePluginMixin, OptionsPluginMixin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # set of channel names we are currently collecting members for
-        self._collecting_names: Set[str] = set()  # {l(channel-name)}
+        # members of the channels we are currently receiving NAMES for
+        self._names: Dict[str, Dict[str, str]] = {}  # {l(channel-name): {l(nickname): modes}}
         # _joins is a relational table that connects channels and users
         self._joins: Dict[(str, str), Dict] = {}  # {(l(channel-name), l(nickname)) -> info_dict}
 
+        # Keep channels and their members when disconnected
+        # and reconcile them when rejoining.
+        self._warm_resync = self.network.config.get('warm_resync', False)
+        # channels kept from the previous connection that we haven't rejoined yet
+        self._resyncing: Set[str] = set()  # {l(channel-name)}
+        # seconds after RPL_WELCOME until channels not rejoined by then are left
+        self._resync_timeout = self.network.config.get('warm_resync_timeout', 60)
+        self._resync_timer: Optional[asyncio.TimerHandle] = None
+
     @core_event(NetworkEventName.DISCONNECTED)
     def on_disconnected(self):
+        self._names.clear()
+        if self._resync_timer:
+            self._resync_timer.cancel()
+            self._resync_timer = None
+        if self._warm_resync:
+            self._resyncing = set(self.network.channels)
+            return
+
         self._joins.clear()
-        self._collecting_names.clear()
         evt = build_event(_ChannelStateEventName.AFTER_DISCONNECTED)
         return ReturnValue(insert_events=(evt,))
 
@@ -59,6 +77,27 @@ class ChannelStatePlugin(NetworkPlugin, MessagePluginMixin, OptionsPluginMixin):
     def on_post_disconnected(self):
         self.network.channels.clear()
 
+    @core_event(ServerReply.RPL_WELCOME)
+    def on_welcome(self, message: Message):
+        # the channels are rejoined now (see JoinOnConnectPlugin)
+        if self._resyncing and self._resync_timeout > 0:
+            self._resync_timer = self.network.loop.call_later(self._resync_timeout,
+                                                              self._on_resync_timer)
+
+    def _on_resync_timer(self):
+        self._resync_timer = None
+        # handled in order with the other events
+        self.network.event_queue.put_nowait(build_event(_ChannelStateEventName.RESYNC_EXPIRED))
+
+    @core_event(_ChannelStateEventName.RESYNC_EXPIRED)
+    def on_resync_expired(self):
+        events = []
+        for lchannel in sorted(self._resyncing):
+            self.logger.warning(f"Couldn't rejoin {lchannel} within {self._resync_timeout}s")
+            events.append(self._leave_kept(lchannel))
+        if events:
+            return ReturnValue(insert_events=events)
+
     @core_event('JOIN')
     async def on_join(self, message: Message):
         if not message.params:
@@ -99,13 +138,8 @@ class ChannelStatePlugin(NetworkPlugin, MessagePluginMixin, OptionsPluginMixin):
             self.logger.warning(f"Got message from channel we're not in: {message!r}")
             return
 
-        if lchannel not in self._collecting_names:
-            self._collecting_names.add(lchannel)
-            # restarting NAMES command, so we empty the join list for current channel
-            # TODO self.network.users isn't cleaned up here
-            for lkey in tuple(self._joins):  # lkey = (lchannel, lnick)
-                if self.chan_eq(lkey[0], message.params[2]):
-                    del self._joins[lkey]
+        # The members are applied at the end of the NAMES list.
+        names = self._names.setdefault(lchannel, {})
 
         # get list of nicknames and their modes if available
         # TODO: when CAP is implemented, this has to respect the "multi-prefix" capability as well.
@@ -114,12 +148,10 @@ class ChannelStatePlugin(NetworkPlugin, MessagePluginMixin, OptionsPluginMixin):
             prefixes, nick = self.network.options.split_prefixes(prefixed_nick)
             modes = self.network.options.prefixes_to_modes(prefixes)
 
-            # add nick to channel
             lnick = self.nick_lower(nick)
             if lnick not in self.network.users:
-                self.network.users[lnick] = Prefix(nick)
-
-            self._joins[(lchannel, lnick)] = {'modes': modes}
+                self.network.users[lnick] = self.network.prefix_cache.from_string(nick)
+            names[lnick] = modes
 
     @core_event(ServerReply.RPL_ENDOFNAMES)
     def on_names_end(self, message: Message):
@@ -128,7 +160,45 @@ class ChannelStatePlugin(NetworkPlugin, MessagePluginMixin, OptionsPluginMixin):
             self.logger.warning(f"Got message from channel we're not in: {message!r}")
             return
 
-        self._collecting_names.discard(lchannel)
+        self._resyncing.discard(lchannel)
+        names = self._names.pop(lchannel, None)
+        if names is not None:
+            self._sync_members(lchannel, names)
+
+    # TODO multiple events per handler
+    @core_event(ServerReply.ERR_NOSUCHCHANNEL)
+    def on_no_such_channel(self, message: Message):
+        return self._join_failed(message)
+
+    @core_event(ServerReply.ERR_CHANNELISFULL)
+    def on_channel_is_full(self, message: Message):
+        return self._join_failed(message)
+
+    @core_event(ServerReply.ERR_INVITEONLYCHAN)
+    def on_invite_only_chan(self, message: Message):
+        return self._join_failed(message)
+
+    @core_event(ServerReply.ERR_BANNEDFROMCHAN)
+    def on_banned_from_chan(self, message: Message):
+        return self._join_failed(message)
+
+    @core_event(ServerReply.ERR_BADCHANNELKEY)
+    def on_bad_channel_key(self, message: Message):
+        return self._join_failed(message)
+
+    def _join_failed(self, message: Message):
+        # Only relevant for channels kept from the previous connection
+        lchannel = self.chan_lower(message.params[1])
+        if lchannel not in self._resyncing:
+            return
+        self.logger.warning(f"Couldn't rejoin {lchannel}: {message.params[-1]}")
+        return ReturnValue(insert_events=(self._leave_kept(lchannel),))
+
+    def _leave_kept(self, lchannel: str) -> Event:
+        """Leave a channel kept from the previous connection, like after a PART."""
+        self._resyncing.discard(lchannel)
+        self._remove_nick_from_channel(self.network.nickname, lchannel)
+        return build_event(_ChannelStateEventName.AFTER_PARTED, lchannel=lchannel)
 
     @core_event('PART')
     def on_part(self, message: Message):
@@ -194,6 +264,34 @@ class ChannelStatePlugin(NetworkPlugin, MessagePluginMixin, OptionsPluginMixin):
             del self.network.users[lnick]
 
     # Manipulation API
+    def _sync_members(self, lchannel: str, names: Dict[str, str]) -> None:
+        """Update the members of a channel to a complete list of (lower-case) nicks and modes.
+
+        Only the differences are applied,
+        so the join info of members that are still there is kept.
+        """
+        removed = []
+        for lkey in list(self._joins):  # lkey = (lchannel, lnick)
+            if lkey[0] == lchannel and lkey[1] not in names:
+                del self._joins[lkey]
+                removed.append(lkey[1])
+
+        added = 0
+        for lnick, modes in names.items():
+            info = self._joins.get((lchannel, lnick))
+            if info is None:
+                self._joins[(lchannel, lnick)] = {'modes': modes}
+                added += 1
+            else:
+                info['modes'] = modes
+
+        if removed:
+            visible = {lkey[1] for lkey in self._joins}
+            for lnick in removed:
+                if lnick not in visible:
+                    self.network.users.pop(lnick, None)
+        self.logger.debug(f"Members of {lchannel}: {added} added, {len(removed)} removed")
+
     def _remove_nick_from_channel(self, nick: str, lchannel: str) -> bool:
         """Removes the nick from _joins table and network's users registry.
 
@@ -262,7 +360,7 @@ class ChannelEventsPlugin(NetworkPlugin, OptionsPluginMixin):
     @event(ServerReply.RPL_ENDOFNAMES, priority=Priority.POST_CORE)
     async def on_names_end(self, message: Message):
         # dispatch the JOINED event after all members are known
-        lchannel = self.chan_lower(message.params[0])
+        lchannel = self.chan_lower(message.params[1])
         if lchannel in self._joining_names:
             self._joining_names.discard(lchannel)
             channel = self.network.channels.get(lchannel)
@@ -341,9 +439,17 @@ class JoinOnConnectPlugin(NetworkPlugin, MessagePluginMixin):
 
     @core_event(ServerReply.RPL_WELCOME)
     def on_msg_welcome(self, message: Message) -> None:
+        chan_lower = self.network.options.chan_lower
+        configured = set()
         for channel, chanconf in self.network.config.get('channels', {}).items():
+            configured.add(chan_lower(channel))
             key = chanconf.get('key', None)
             if key is not None:
                 self.send_cmd('JOIN', channel, key)
             else:
                 self.send_cmd('JOIN', channel)
+
+        # channels kept from the previous connection (see `warm_resync`)
+        for lchannel in self.network.channels:
+            if lchannel not in configured:
+                self.send_cmd('JOIN', lchannel)
@@ -0,0 +1,59 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+from typing import Optional
+
+from ..event import build_event, core_event, COMMAND_PREFIX, Event, EventDispatcher, ReturnValue
+from ..irc.message import ChannelMessage, PrivateMessage, TextMessage
+from ..plugin_base import ChannelEventName, ChannelPlugin, NetworkEventName, NetworkPlugin
+
+__plugin_name__ = 'Command'
+__plugin_version__ = '0.1.0'
+__plugin_description__ = "Dispatches bot commands like '!echo' to their handlers"
+
+
+def build_command_event(dispatcher: EventDispatcher, message: TextMessage) -> Optional[Event]:
+    """Build the event for the command word a message starts with, if it has any handlers.
+
+    Messages that are not commands thus only cost a single lookup.
+    """
+    first_word = message.line.split(None, 1)
+    if not first_word:
+        return None
+    name = COMMAND_PREFIX + first_word[0]
+    if not dispatcher.has_handlers(name):
+        return None
+    return build_event(name, message=message)
+
+
+class NetworkCommandPlugin(NetworkPlugin):
+
+    @core_event(NetworkEventName.PRIVATE_MESSAGE)
+    def on_private_message(self, message: PrivateMessage):
+        evt = build_command_event(self.network._event_dispatcher, message)
+        if evt:
+            return ReturnValue(insert_events=(evt,))
+
+
+class ChannelCommandPlugin(ChannelPlugin):
+
+    @core_event(ChannelEventName.MESSAGE)
+    def on_channel_message(self, message: ChannelMessage):
+        evt = build_command_event(self.channel._event_dispatcher, message)
+        if evt:
+            return ReturnValue(insert_events=(evt,))
@@ -29,6 +29,8 @@ class ConnectionPlugin(NetworkPlugin, MessagePluginMixin):
     @core_event(NetworkEventName.CONNECTED)
     def on_connected(self) -> None:
         self.network.connected = True
+        self.network.server_pool.connected(self.network.server,
+                                           self.network._connection.connect_duration)
         self.logger.info("connected!")
 
     @core_event(NetworkEventName.DISCONNECTED)
@@ -16,9 +16,12 @@
 # You should have received a copy of the GNU General Public License
 # along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
 
+from typing import Optional
+
 from ..event import build_event, core_event, CTCP_PREFIX, ReturnValue
 from ..irc import Message, CtcpMessage
 from ..plugin_base import NetworkPlugin
+from ..util import RateLimiter, TokenBucket
 
 __plugin_name__ = 'CTCP'
 __plugin_version__ = '0.1.0'
@@ -27,11 +30,49 @@ __plugin_description__ = 'CTCP Message processing'
 
 class ParseCtcpPlugin(NetworkPlugin):
 
+    # ACTIONs are chat, not requests, and are never limited
+    unlimited_commands = frozenset({'ACTION'})
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        config = self.network.config
+        self.max_segments = config.get('ctcp.max_segments', 4)
+        interval = config.get('ctcp.interval', 5)
+        self.rate_limiter: Optional[RateLimiter] = None
+        if interval:
+            self.rate_limiter = RateLimiter(config.get('ctcp.burst', 3), 1 / interval)
+        # many hosts together, e.g. a botnet, still only get this many replies
+        global_interval = config.get('ctcp.global_interval', 1)
+        self.global_bucket: Optional[TokenBucket] = None
+        if global_interval:
+            self.global_bucket = TokenBucket(config.get('ctcp.global_burst', 10),
+                                             1 / global_interval)
+
     @core_event('PRIVMSG')
-    async def privmsg(self, message: Message):
-        ctcp_msg = CtcpMessage.from_message(message)
-        if not ctcp_msg:
+    def privmsg(self, message: Message):
+        if not message.has_ctcp():
             return
 
-        evt = build_event(CTCP_PREFIX + ctcp_msg.command, message=ctcp_msg)
-        return ReturnValue(insert_events=(evt,))
+        events = []
+        for ctcp_msg in CtcpMessage.split_message(message, self.max_segments):
+            if ctcp_msg.command not in self.unlimited_commands and not self._allow(ctcp_msg):
+                continue
+            events.append(build_event(CTCP_PREFIX + ctcp_msg.command, message=ctcp_msg))
+
+        if events:
+            return ReturnValue(insert_events=events)
+
+    def _allow(self, ctcp_msg: CtcpMessage) -> bool:
+        prefix = ctcp_msg.prefix
+        # per source first, so a single flooding host can't use up the global budget
+        if self.rate_limiter is not None:
+            source = (prefix.host or prefix.name) if prefix else None
+            if not self.rate_limiter.consume(source):
+                self.logger.debug("Ignoring CTCP", ctcp_msg.command, "from", prefix,
+                                  "(rate limited)")
+                return False
+        if self.global_bucket is not None and not self.global_bucket.consume():
+            self.logger.debug("Ignoring CTCP", ctcp_msg.command, "from", prefix,
+                              "(global rate limit)")
+            return False
+        return True
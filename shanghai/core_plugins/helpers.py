@@ -0,0 +1,55 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+from ..event import core_event
+from ..plugin_base import NetworkPlugin, NetworkEventName, OptionsPluginMixin
+from ..irc import Message, ServerReply
+
+__plugin_name__ = 'Helpers'
+__plugin_version__ = '0.1.0'
+__plugin_description__ = "Start helper connections and keep them in the network's channels"
+
+
+class HelperPlugin(NetworkPlugin, OptionsPluginMixin):
+
+    @core_event(ServerReply.RPL_WELCOME)
+    def on_welcome(self, message: Message) -> None:
+        if self.network.helpers:
+            self.network.helpers.start(self.network.server)
+
+    @core_event(NetworkEventName.DISCONNECTED)
+    async def on_disconnected(self) -> None:
+        if self.network.helpers:
+            await self.network.helpers.stop()
+
+    @core_event('JOIN')
+    def on_join(self, message: Message) -> None:
+        if (self.network.helpers and message.prefix
+                and self.nick_eq(message.prefix.name, self.network.nickname)):
+            self.network.helpers.join(self.chan_lower(message.params[0]))
+
+    @core_event('PART')
+    def on_part(self, message: Message) -> None:
+        if (self.network.helpers and message.prefix
+                and self.nick_eq(message.prefix.name, self.network.nickname)):
+            self.network.helpers.part(self.chan_lower(message.params[0]))
+
+    @core_event('KICK')
+    def on_kick(self, message: Message) -> None:
+        if self.network.helpers and self.nick_eq(message.params[1], self.network.nickname):
+            self.network.helpers.part(self.chan_lower(message.params[0]))
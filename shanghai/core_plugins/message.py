@@ -16,28 +16,42 @@
 # You should have received a copy of the GNU General Public License
 # along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
 
-from ..event import core_event, build_event, ReturnValue
+from typing import List, Optional
+
+from ..event import core_event, build_event, Event, ReturnValue
 from ..plugin_base import NetworkPlugin, MessagePluginMixin, NetworkEventName
-from ..irc import Message
+from ..irc import LazyMessage, Message
+from ..irc.commands import intern_command
 
 __plugin_name__ = 'Message'
 __plugin_version__ = '0.1.0'
-__plugin_description__ = "Parses 'raw_line' network events and replaces them with message events"
+__plugin_description__ = "Parses 'raw_lines' network events and replaces them with message events"
 
 
 class BuildMessagePlugin(NetworkPlugin, MessagePluginMixin):
 
-    @core_event(NetworkEventName.RAW_LINE)
-    def on_raw_line(self, raw_line: bytes):
-        try:
-            line = raw_line.decode(self._encoding)
-        except UnicodeDecodeError:
-            line = raw_line.decode(self._fallback_encoding, 'replace')
-        try:
-            msg = Message.from_line(line)
-        except Exception as exc:
-            self.logger.exception('-->', line)
-            raise
-
-        msg_event = build_event(msg.command, message=msg)
-        return ReturnValue(insert_events=(msg_event,))
+    def _build_message_event(self, raw_line: bytes) -> Optional[Event]:
+        # Lines nobody is going to consume are dropped without decoding them.
+        # The others are decoded once as a whole,
+        # but only the command is parsed up front (except for PRIVMSG and NOTICE).
+        command = intern_command(Message.peek_command(raw_line), raw_line)
+        if not self.network._event_dispatcher.has_handlers(command):
+            return None
+        msg = LazyMessage.from_bytes(raw_line, self._encoding, self._fallback_encoding,
+                                     prefix_cache=self.network.prefix_cache)
+        return build_event(msg.command, message=msg)
+
+    @core_event(NetworkEventName.RAW_LINES)
+    def on_raw_lines(self, raw_lines: List[bytes]):
+        msg_events: List[Event] = []
+        for raw_line in raw_lines:
+            try:
+                msg_event = self._build_message_event(raw_line)
+            except Exception:
+                self.logger.exception('-->', raw_line)
+                continue
+            if msg_event:
+                msg_events.append(msg_event)
+
+        if msg_events:
+            return ReturnValue(insert_events=msg_events)
@@ -82,6 +82,7 @@ class PingPlugin(NetworkPlugin, MessagePluginMixin):
             ms = int(text[4:])
             latency = (ms_time() - ms) / 1000
             self.logger.debug(f"latency: {latency:.3f}s")
+            self.network.server_pool.record_latency(self.network.server, latency)
 
     @core_event(NetworkEventName.DISCONNECTED)
     async def on_disconnected(self):
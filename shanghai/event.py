@@ -19,9 +19,10 @@
 import asyncio
 import functools
 import enum
+import sys
 from typing import (
     AbstractSet, Any, Callable, Container, Coroutine,
-    DefaultDict, Dict, Iterable, Iterator, List, NamedTuple, Optional,
+    DefaultDict, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence,
     Set, Tuple, TypeVar, Union,
     cast
 )
@@ -29,6 +30,13 @@ from typing import (
 from .logging import get_default_logger, Logger, LogLevels
 from .util import repr_func
 
+# A lone coroutine handler can only be awaited directly if a CancelledError it raises
+# can be told apart from the dispatching task being cancelled,
+# which needs `Task.cancelling` (Python 3.11+).
+# On older versions, including our 3.6 target, it is run in a task like any other
+# and dispatching gains nothing from this.
+_AWAIT_LONE_HANDLER = hasattr(asyncio.Task, 'cancelling')
+
 
 class ReturnValue(NamedTuple):
     eat: bool = False
@@ -128,6 +136,8 @@ class _PrioritizedSetList(Iterable[Tuple[int, Set[HT]]], Container[HT]):
 SyncEventHandler = Callable[..., Optional[ReturnValue]]
 AsyncEventHandler = Callable[..., Coroutine[Any, Any, Optional[ReturnValue]]]
 EventHandler = Union[SyncEventHandler, AsyncEventHandler]
+# what a handler returned, or the exception it raised (including CancelledError)
+HandlerResult = Union[ReturnValue, BaseException, None]
 
 
 class HandlerInfo:
@@ -153,7 +163,11 @@ class HandlerInfo:
             event_name = handler.__name__
             if event_name.startswith("on_"):
                 event_name = event_name[3:]
-        self.event_name = _prefix + event_name
+        event_name = _prefix + event_name
+        if type(event_name) is str:
+            # speed up lookups of interned message commands
+            event_name = sys.intern(event_name)
+        self.event_name = event_name
         self.priority = Priority.lookup(priority)  # for pretty __repr__
         self.should_enable = enable
         self.is_async = is_async
@@ -205,20 +219,44 @@ def event(name_or_func: Union[str, EventHandler, None] = None,
 core_event = functools.partial(event, priority=Priority.CORE)
 CTCP_PREFIX = "ctcp_"
 ctcp_event = functools.partial(event, _prefix=CTCP_PREFIX)
+COMMAND_PREFIX = "command_"
+command_event = functools.partial(event, _prefix=COMMAND_PREFIX)
 
 
 class HandlerInstance:
 
-    """Holds dynamic content about a specific handler instance."""
+    """Holds dynamic content about a specific handler instance.
+
+    Changing `enabled` updates the dispatcher the handler is registered with.
+    """
 
     handler: EventHandler
     info: HandlerInfo
-    enabled: bool
+    dispatcher: Optional['EventDispatcher']
 
     def __init__(self, handler: EventHandler, info: HandlerInfo, enabled: bool) -> None:
         self.handler = handler
         self.info = info
-        self.enabled = enabled
+        self._enabled = enabled
+        self.dispatcher = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled: bool) -> None:
+        if enabled == self._enabled:
+            return
+        self._enabled = enabled
+        if self.dispatcher:
+            self.dispatcher.compile(self.info.event_name)
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
 
     @classmethod
     def from_handler(cls, handler: EventHandler) -> 'HandlerInstance':
@@ -255,22 +293,56 @@ class ResultSet:
         return self
 
 
+class PriorityLevel(NamedTuple):
+    priority: int
+    coroutines: Tuple[AsyncEventHandler, ...]
+    functions: Tuple[SyncEventHandler, ...]
+    # coroutines first, in the order their results are collected
+    handlers: Tuple[EventHandler, ...]
+
+
+DispatchPlan = Tuple[PriorityLevel, ...]
+
+
 class EventDispatcher:
 
-    """Allows to register handlers and to dispatch events to those, by priority."""
+    """Allows to register handlers and to dispatch events to those, by priority.
+
+    The enabled handlers of each event are compiled into a `DispatchPlan`
+    whenever they change, so dispatching doesn't need to sort or filter them.
+    """
 
     event_map: DefaultDict[str, _PrioritizedSetList[HandlerInstance]]
+    plans: Dict[str, DispatchPlan]
     logger: Logger
 
     def __init__(self, logger: Logger = None) -> None:
         self.event_map = DefaultDict(_PrioritizedSetList)
+        self.plans = {}
         self.logger = logger or get_default_logger()
 
-    # def unregister(self, name: str, handler: EventHandler) -> None:
-    #     self.logger.ddebug(f"Unregistering event handler for event {name!r}: {handler}")
-    #     self.event_map[name].remove(handler)
-    #     if not self.event_map[name]:
-    #         del self.event_map[name]
+    def compile(self, name: str) -> None:
+        """Rebuild the plan for an event from its enabled handlers."""
+        levels: List[PriorityLevel] = []
+        for priority, handler_inst_set in self.event_map.get(name, ()):
+            coroutines: List[AsyncEventHandler] = []
+            functions: List[SyncEventHandler] = []
+            for handler_inst in handler_inst_set:
+                if not handler_inst.enabled:
+                    continue
+                if handler_inst.info.is_async:
+                    coroutines.append(handler_inst.handler)  # type: ignore
+                else:
+                    functions.append(handler_inst.handler)  # type: ignore
+            if coroutines or functions:
+                levels.append(PriorityLevel(Priority.lookup(priority),  # for pretty __repr__
+                                            tuple(coroutines), tuple(functions),
+                                            (*coroutines, *functions)))
+
+        if levels:
+            self.plans[name] = tuple(levels)
+        else:
+            self.plans.pop(name, None)
 
     def register(self, handler_inst: HandlerInstance) -> None:
         h_info = handler_inst.info
@@ -279,6 +351,22 @@ class EventDispatcher:
                            f" {handler_inst.handler}")
 
         self.event_map[h_info.event_name].add(h_info.priority, handler_inst)
+        handler_inst.dispatcher = self
+        self.compile(h_info.event_name)
+
+    def unregister(self, handler_inst: HandlerInstance) -> None:
+        name = handler_inst.info.event_name
+        self.logger.ddebug(f"Unregistering event handler for event {name!r}:"
+                           f" {handler_inst.handler}")
+        self.event_map[name].remove(handler_inst)
+        if not self.event_map[name]:
+            del self.event_map[name]
+        handler_inst.dispatcher = None
+        self.compile(name)
+
+    def has_handlers(self, name: str) -> bool:
+        """Check whether an event has any enabled handlers."""
+        return name in self.plans
 
     def register_plugin(self, plugin: Any) -> List[HandlerInstance]:
         instances: List[HandlerInstance] = []
@@ -293,38 +381,33 @@ class EventDispatcher:
 
     async def dispatch(self, event: Event) -> Optional[ResultSet]:
         name = event.name
-
-        if name not in self.event_map:
+        plan = self.plans.get(name)
+        if plan is None:
             self.logger.ddebug(f"No event handlers for event {name!r}")
             return None
 
+        # Use isEnabledFor because this will be run often
+        is_ddebug = self.logger.isEnabledFor(LogLevels.DDEBUG)
         joined_result_set = ResultSet()
-        for priority, handler_inst_set in self.event_map[name]:
-            if not handler_inst_set:
-                continue
-            priority = Priority.lookup(priority)  # for pretty __repr__
-            # Use isEnabledFor because this will be run often
-            is_ddebug = self.logger.isEnabledFor(LogLevels.DDEBUG)
-
-            coroutines: List[AsyncEventHandler] = []
-            functions: List[SyncEventHandler] = []
-            for handler_inst in handler_inst_set:
-                if not handler_inst.enabled:
-                    continue
-                if handler_inst.info.is_async:
-                    coroutines.append(handler_inst.handler)  # type: ignore
-                else:
-                    functions.append(handler_inst.handler)  # type: ignore
-
+        for priority, coroutines, functions, handlers in plan:
             # Collect results independently but evaluate them together
-            handlers = cast(List[EventHandler], coroutines) + cast(List[EventHandler], functions)
-            results: List[Union[ReturnValue, Exception]] = []
+            results: List[HandlerResult] = []
 
-            if not handlers:
-                self.logger.ddebug(f"No event handlers for event {name!r} at priority {priority}")
-                return None
-
-            if coroutines:
+            if len(coroutines) == 1 and _AWAIT_LONE_HANDLER:
+                # The common case, which doesn't need a task to run concurrently
+                if is_ddebug:
+                    self.logger.ddebug(f"Awaiting handler for event {name!r} ({priority!r}):"
+                                       f" {repr_func(coroutines[0])}")
+                try:
+                    results.append(await coroutines[0](**event.args))
+                except asyncio.CancelledError as e:
+                    if asyncio.current_task().cancelling():  # type: ignore
+                        raise
+                    # raised by something the handler awaited, like `gather` would collect it
+                    results.append(e)
+                except Exception as e:
+                    results.append(e)
+            elif coroutines:
                 tasks = [asyncio.ensure_future(h(**event.args)) for h in coroutines]
                 if is_ddebug:
                     self.logger.ddebug(f"Starting tasks for event {name!r} ({priority!r});"
@@ -357,10 +440,11 @@ class EventDispatcher:
         joined_result_set.insert_events = []
         return joined_result_set
 
-    def handle_results(self, name, priority, handlers, results) -> ResultSet:
+    def handle_results(self, name: str, priority: int, handlers: Sequence[EventHandler],
+                       results: Sequence[HandlerResult]) -> ResultSet:
         result_set = ResultSet()
         for handler, result in zip(handlers, results):
-            if isinstance(result, Exception):
+            if isinstance(result, BaseException):  # including CancelledError
                 self.logger.exception(
                     f"Exception in event handler {repr_func(handler)!r} for event {name!r}"
                     f" ({priority!r}):",
@@ -0,0 +1,174 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import collections
+from typing import Deque, Generic, Iterable, List, NamedTuple, Sequence, TypeVar
+
+T = TypeVar('T')
+
+
+class EventQueueStats(NamedTuple):
+    depth: int
+    maxsize: int
+    high_water: int
+    puts: int
+    batches: int
+
+
+class EventQueue(Generic[T]):
+
+    """FIFO queue that hands out all available items in one wake-up.
+
+    If `maxsize` is positive, `put` and `put_many` wait
+    while the queue holds `maxsize` or more items.
+    `put_nowait` and `put_many_nowait` never wait and never fail,
+    so a worker can always queue follow-up items onto its own queue,
+    even if that exceeds `maxsize`.
+
+    Tracks the highest depth seen, the number of items put
+    and the number of batches taken.
+    """
+
+    def __init__(self, maxsize: int = 0, *, loop: asyncio.AbstractEventLoop = None) -> None:
+        self.maxsize = maxsize
+        self._loop = loop or asyncio.get_event_loop()
+        self._items: Deque[T] = collections.deque()
+        self._getters: Deque[asyncio.Future] = collections.deque()
+        self._putters: Deque[asyncio.Future] = collections.deque()
+        self.high_water = 0
+        self.puts = 0
+        self.batches = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= len(self._items)
+
+    def stats(self) -> EventQueueStats:
+        return EventQueueStats(len(self._items), self.maxsize, self.high_water,
+                               self.puts, self.batches)
+
+    @staticmethod
+    def _wake_next(waiters: Deque[asyncio.Future]) -> None:
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def _wait(self, waiters: Deque[asyncio.Future]) -> None:
+        waiter = self._loop.create_future()
+        waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            waiter.cancel()
+            # don't swallow a wake-up meant for another waiter
+            if waiter.done() and not waiter.cancelled():
+                self._wake_next(waiters)
+            raise
+
+    def _added(self, count: int) -> None:
+        self.puts += count
+        if len(self._items) > self.high_water:
+            self.high_water = len(self._items)
+        self._wake_next(self._getters)
+
+    def _taken(self) -> None:
+        self.batches += 1
+        if self._items:
+            self._wake_next(self._getters)
+        # all of them, since a batch may have freed room for several
+        while self._putters and not self.full():
+            self._wake_next(self._putters)
+
+    def put_nowait(self, item: T) -> None:
+        self._items.append(item)
+        self._added(1)
+
+    def put_many_nowait(self, items: Iterable[T]) -> None:
+        depth = len(self._items)
+        self._items.extend(items)
+        if len(self._items) > depth:
+            self._added(len(self._items) - depth)
+
+    async def wait_not_full(self) -> None:
+        """Wait until there is room for at least one more item."""
+        while self.full():
+            await self._wait(self._putters)
+
+    async def put(self, item: T) -> None:
+        await self.wait_not_full()
+        self.put_nowait(item)
+
+    async def put_many(self, items: Iterable[T]) -> None:
+        """Put items as room becomes available, preserving their order."""
+        pending = list(items)
+        while pending:
+            await self.wait_not_full()
+            room = self.maxsize - len(self._items) if self.maxsize > 0 else len(pending)
+            self.put_many_nowait(pending[:room])
+            del pending[:room]
+
+    def requeue(self, items: Sequence[T]) -> None:
+        """Put items back at the front of the queue, e.g. unprocessed parts of a batch."""
+        if items:
+            self._items.extendleft(reversed(items))
+            self._wake_next(self._getters)
+
+    def get_nowait(self) -> T:
+        if not self._items:
+            raise asyncio.QueueEmpty
+        item = self._items.popleft()
+        self._taken()
+        return item
+
+    async def get(self) -> T:
+        while not self._items:
+            await self._wait(self._getters)
+        return self.get_nowait()
+
+    def get_batch_nowait(self, max_items: int = 0) -> List[T]:
+        """Take all available items, or at most `max_items` if non-zero."""
+        items = self._items
+        if not max_items or max_items >= len(items):
+            batch = list(items)
+            items.clear()
+        else:
+            batch = [items.popleft() for _ in range(max_items)]
+        if batch:
+            self._taken()
+        return batch
+
+    async def get_batch(self, max_items: int = 0) -> List[T]:
+        """Wait until an item is available, then take all of them like `get_batch_nowait`."""
+        while not self._items:
+            await self._wait(self._getters)
+        return self.get_batch_nowait(max_items)
+
+    def __repr__(self) -> str:
+        return (f"<{self.__class__.__name__} depth={len(self._items)} maxsize={self.maxsize}"
+                f" high_water={self.high_water}>")
@@ -0,0 +1,344 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Helper connections for spreading outgoing messages
+
+import asyncio
+import collections
+import zlib
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set
+
+from .config import Server
+from .event import build_event
+from .event_queue import EventQueue
+from .irc import Message, ServerReply
+from .logging import get_logger
+from .plugin_base import NetworkEventName
+from .scheduler import Lane, OutboundScheduler
+
+if TYPE_CHECKING:
+    from .connection import Connection  # noqa: F401
+    from .network import Network  # noqa: F401
+
+# Seconds to wait for a helper's QUIT to be sent before closing its connection
+QUIT_TIMEOUT = 5
+
+# Commands that every connection in the same channels receives
+SHARED_COMMANDS = frozenset({b'PRIVMSG', b'NOTICE', b'JOIN', b'PART', b'KICK', b'QUIT',
+                             b'NICK', b'MODE', b'TOPIC'})
+# Messages that must not be passed on if one of our own connections sent them
+MESSAGE_COMMANDS = frozenset({b'PRIVMSG', b'NOTICE', b'TAGMSG'})
+# Commands a helper handles itself
+_HELPER_COMMANDS = frozenset({b'PING', b'ERROR', ServerReply.RPL_WELCOME.encode(),
+                              ServerReply.ERR_NICKNAMEINUSE.encode()})
+
+
+def _split_body(line: bytes) -> List[bytes]:
+    """Return the (optional) prefix, command and first parameter of a line, without tags."""
+    if line.startswith(b'@'):
+        line = line[line.find(b' ') + 1:]
+    return line.split(b' ', 3)[:3]
+
+
+class InboundDeduplicator:
+
+    """Passes on each message only once, even if several connections received it.
+
+    Lines are compared without their tags.
+    A line is passed on when one of the connections has received it
+    more often than it has been passed on,
+    so identical messages sent repeatedly aren't lost.
+    Only the `maxsize` most recent distinct lines are remembered.
+
+    Messages for which `is_own` returns True when called with the sender's nickname
+    are dropped, so the bot never sees its own output as incoming messages.
+    """
+
+    def __init__(self, maxsize: int = 4096,
+                 is_own: Optional[Callable[[bytes], bool]] = None) -> None:
+        self.maxsize = maxsize
+        self.is_own = is_own
+        self.sources = 0
+        self.duplicates = 0
+        # {line body: [times passed on, {source: times received}]}
+        self._seen: 'collections.OrderedDict[bytes, list]' = collections.OrderedDict()
+
+    def source(self) -> 'DedupeSource':
+        """Register a connection."""
+        self.sources += 1
+        return DedupeSource(self, self.sources - 1)
+
+    def offer(self, source: int, line: bytes) -> bool:
+        """Return whether `line`, received by `source`, should be passed on."""
+        key = line[line.find(b' ') + 1:] if line.startswith(b'@') else line
+        entry = self._seen.get(key)
+        if entry is None:
+            entry = self._seen[key] = [0, collections.Counter()]
+            if len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+        else:
+            self._seen.move_to_end(key)
+
+        received = entry[1]
+        received[source] += 1
+        if received[source] > entry[0]:
+            entry[0] += 1
+            return True
+        self.duplicates += 1
+        return False
+
+
+class DedupeSource:
+
+    """A connection's view of an `InboundDeduplicator`."""
+
+    __slots__ = ('deduplicator', 'index')
+
+    def __init__(self, deduplicator: InboundDeduplicator, index: int) -> None:
+        self.deduplicator = deduplicator
+        self.index = index
+
+    def filter(self, lines: List[bytes]) -> List[bytes]:
+        """Remove our own messages and lines of the `SHARED_COMMANDS` already passed on."""
+        offer = self.deduplicator.offer
+        is_own = self.deduplicator.is_own
+        result = []
+        for line in lines:
+            words = _split_body(line)
+            if words[0].startswith(b':') and len(words) > 1:
+                command = words[1].upper()
+                if (is_own and command in MESSAGE_COMMANDS
+                        and is_own(words[0][1:].partition(b'!')[0].partition(b'@')[0])):
+                    continue
+            else:
+                command = words[0].upper()
+            if command not in SHARED_COMMANDS or offer(self.index, line):
+                result.append(line)
+        return result
+
+
+class HelperConnection:
+
+    """An additional client on the network's server that takes over sending some messages.
+
+    It joins the same channels as the network
+    and passes on the channel traffic it receives through the deduplicator.
+    Everything else it receives is handled here or ignored.
+    """
+
+    def __init__(self, network: 'Network', nickname: str, dedupe: DedupeSource) -> None:
+        self.network = network
+        self.nickname = nickname
+        self.dedupe = dedupe
+        self.logger = get_logger('helper', f'{nickname}@{network.name}', network.config)
+        self.encoding = network.config.get('encoding', 'utf-8')
+        self.fallback_encoding = network.config.get('fallback_encoding', 'latin1')
+        self.registered = False
+        self.channels: Set[str] = set()  # {l(channel-name)}
+        self._connection: Optional['Connection'] = None
+        self._scheduler: Optional[OutboundScheduler] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def can_send(self, ltarget: str) -> bool:
+        """Whether this helper can send to a lower-case target right now.
+
+        Only channels it has joined qualify.
+        Users and services must see messages from the network's own nickname,
+        since helpers ignore private messages and replies to them would be lost.
+        """
+        return self.registered and ltarget in self.channels
+
+    def start(self, server: Server) -> None:
+        if not self.running:
+            self._task = self.network.loop.create_task(self._run(server))
+
+    async def stop(self) -> None:
+        if self._task:
+            if self.registered and self._connection:
+                self.send_cmd('QUIT')
+                # QUIT skips flood control, but still has to reach the transport
+                try:
+                    await asyncio.wait_for(self._connection.flush(), QUIT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.logger.warning(f"QUIT wasn't sent within {QUIT_TIMEOUT}s")
+            self._task.cancel()
+            await asyncio.wait([self._task])
+            self._task = None
+
+    def send_byteline(self, line: bytes) -> None:
+        if self._scheduler:
+            self._scheduler.submit(line)
+
+    def send_cmd(self, command: str, *params: str) -> None:
+        self.send_byteline(Message(command, params=params).to_bytes(self.encoding))
+
+    async def _run(self, server: Server) -> None:
+        network = self.network
+        queue: EventQueue = EventQueue(loop=network.loop)
+        connection = self._connection = network._connection_class(
+            server, queue, network.loop, logger=self.logger,
+            line_limiter=network.inbound_limiter,
+        )
+        self._scheduler = OutboundScheduler(
+            connection.writeline, network.loop,
+            burst=network.config.get('flood_control.burst', 8),
+            rate=network.config.get('flood_control.rate', 1),
+            line_bytes=network.config.get('flood_control.line_bytes', 512),
+            max_targets=network.options.max_targets,
+            writable=lambda: not connection.draining,
+        )
+        connection.on_drained = self._scheduler.resume
+        connection_task = network.loop.create_task(connection.run())
+        try:
+            while not (connection_task.done() and queue.empty()):
+                for event in await queue.get_batch():
+                    if event.name == NetworkEventName.CONNECTED:
+                        self.send_cmd('NICK', self.nickname)
+                        self.send_cmd('USER', network.user or network.config['user'], "*", "*",
+                                      network.realname or network.config['realname'])
+                    elif event.name == NetworkEventName.RAW_LINES:
+                        self._handle_lines(event.args['raw_lines'])
+        except Exception:
+            self.logger.exception("Helper connection failed")
+        finally:
+            connection_task.cancel()
+            self._scheduler.close()
+            self.registered = False
+            self.channels.clear()
+
+    def _handle_lines(self, lines: List[bytes]) -> None:
+        opt_chantypes = self.network.options.get('CHANTYPES', '#&+')
+        if not isinstance(opt_chantypes, str):
+            opt_chantypes = '#&+'
+        chantypes = tuple(c.encode() for c in opt_chantypes)
+        shared = []
+        for line in lines:
+            words = _split_body(line)
+            if words[0].startswith(b':') and len(words) > 1:
+                command, target = words[1].upper(), words[2] if len(words) > 2 else b''
+            else:
+                command, target = words[0].upper(), b''
+
+            if command in SHARED_COMMANDS:
+                if command in (b'PRIVMSG', b'NOTICE') and not target.startswith(chantypes):
+                    continue  # private messages to helpers are ignored
+                if command in (b'JOIN', b'PART', b'KICK'):
+                    self._track_channels(line)
+                shared.append(line)
+            elif command in _HELPER_COMMANDS:
+                self._handle_message(Message.from_bytes(line, self.encoding,
+                                                        self.fallback_encoding))
+
+        shared = self.dedupe.filter(shared)
+        if shared and self.network.connected:
+            evt = build_event(NetworkEventName.RAW_LINES, raw_lines=shared)
+            self.network.load_shedder.queued(len(shared))
+            self.network.event_queue.put_nowait(evt)
+
+    def _handle_message(self, message: Message) -> None:
+        if message.command == 'PING':
+            self.send_cmd('PONG', *message.params)
+        elif message.command == ServerReply.RPL_WELCOME:
+            self.nickname = message.params[0]
+            self.registered = True
+            self.logger.info(f"registered as {self.nickname}")
+            for lchannel in self.network.channels:
+                self.send_cmd('JOIN', lchannel)
+        elif message.command == ServerReply.ERR_NICKNAMEINUSE:
+            self.nickname += '_'
+            self.send_cmd('NICK', self.nickname)
+        else:
+            self.logger.warning("Server closed the helper connection:", *message.params)
+
+    def _track_channels(self, line: bytes) -> None:
+        message = Message.from_bytes(line, self.encoding, self.fallback_encoding)
+        if not message.params:
+            return
+        options = self.network.options
+        if message.command == 'KICK':
+            gone = len(message.params) > 1 and options.nick_eq(message.params[1], self.nickname)
+        elif message.prefix and options.nick_eq(message.prefix.name, self.nickname):
+            gone = message.command == 'PART'
+        else:
+            return
+        lchannel = options.chan_lower(message.params[0])
+        if gone:
+            self.channels.discard(lchannel)
+        else:
+            self.channels.add(lchannel)
+
+
+class HelperPool:
+
+    """Helper connections of a network and the deduplicator for all connections."""
+
+    def __init__(self, network: 'Network', nicknames: List[str], maxsize: int = 4096) -> None:
+        self.network = network
+        self.deduplicator = InboundDeduplicator(maxsize, is_own=self.is_own)
+        # index 0 is the network's own connection
+        self.primary = self.deduplicator.source()
+        self.helpers = [HelperConnection(network, nickname, self.deduplicator.source())
+                        for nickname in nicknames]
+
+    def start(self, server: Server) -> None:
+        for helper in self.helpers:
+            helper.start(server)
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(helper.stop() for helper in self.helpers))
+
+    def join(self, lchannel: str) -> None:
+        for helper in self.helpers:
+            if helper.registered and lchannel not in helper.channels:
+                helper.send_cmd('JOIN', lchannel)
+
+    def part(self, lchannel: str) -> None:
+        for helper in self.helpers:
+            if lchannel in helper.channels:
+                helper.send_cmd('PART', lchannel)
+
+    def is_own(self, nickname: bytes) -> bool:
+        """Whether a nickname belongs to the network's connection or one of the helpers."""
+        options = self.network.options
+        nick = nickname.decode(self.network.config.get('encoding', 'utf-8'), 'replace')
+        return (options.nick_eq(nick, self.network.nickname)
+                or any(options.nick_eq(nick, helper.nickname) for helper in self.helpers))
+
+    def route(self, line: bytes) -> Optional[HelperConnection]:
+        """Return the helper that should send a line, or None for the network's connection.
+
+        Messages to the same target are always sent by the same connection
+        as long as the available helpers don't change.
+        """
+        lane, target = OutboundScheduler.classify(line)
+        if lane is not Lane.BULK:
+            return None
+        ltarget = self.network.options.chan_lower(
+            target.decode(self.network.config.get('encoding', 'utf-8'), 'replace')
+        )
+        candidates: List[Optional[HelperConnection]] = [None]
+        candidates.extend(helper for helper in self.helpers if helper.can_send(ltarget))
+        return candidates[zlib.crc32(target) % len(candidates)]
+
+    def stats(self) -> Dict[str, int]:
+        return {'helpers': sum(helper.registered for helper in self.helpers),
+                'duplicates': self.deduplicator.duplicates}
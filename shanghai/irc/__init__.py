@@ -16,14 +16,16 @@
 # You should have received a copy of the GNU General Public License
 # along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
 
-from .message import CtcpMessage, Message, Prefix
+from .message import CtcpMessage, LazyMessage, Message, Prefix, PrefixCache
 from .options import Options
 from .server_reply import ServerReply
 
 __all__ = (
     'CtcpMessage',
+    'LazyMessage',
     'Message',
     'Options',
     'Prefix',
+    'PrefixCache',
     'ServerReply',
 )
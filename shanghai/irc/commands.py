@@ -0,0 +1,103 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from typing import Dict, Union
+
+from .server_reply import ServerReply
+from ..logging import get_default_logger
+
+COMMON_COMMANDS = (
+    'PRIVMSG', 'NOTICE', 'TAGMSG',
+    'JOIN', 'PART', 'KICK', 'QUIT', 'NICK', 'MODE', 'TOPIC', 'INVITE',
+    'PING', 'PONG', 'ERROR', 'KILL', 'WALLOPS',
+    'CAP', 'AUTHENTICATE', 'AWAY', 'ACCOUNT', 'CHGHOST', 'SETNAME', 'BATCH',
+)
+
+
+class CommandTable:
+
+    """Interns commands of incoming lines.
+
+    Maps raw commands (as bytes or str, in any case)
+    to canonical command objects,
+    i.e. `ServerReply` members for known numerics
+    and interned upper-case strings for everything else.
+    Known commands thus resolve with a single dict lookup
+    and are hashed and compared by identity in event maps.
+
+    Unknown commands are added on first sight
+    (unknown numerics log a warning only then),
+    up to `max_dynamic_entries` entries.
+    """
+
+    def __init__(self, max_dynamic_entries: int = 4096) -> None:
+        self.max_dynamic_entries = max_dynamic_entries
+        self._dynamic_entries = 0
+        self._table: Dict[Union[bytes, str], str] = {}
+
+        # iterating skips aliases, which resolve to the first member with that value
+        for reply in ServerReply:
+            self._add_static(reply.value, reply)
+        for command in COMMON_COMMANDS:
+            command = sys.intern(command)
+            self._add_static(command, command)
+            self._add_static(command.lower(), command)
+
+    def _add_static(self, key: str, command: str) -> None:
+        self._table[key] = command
+        self._table[key.encode('ascii')] = command
+
+    def lookup(self, raw_command: Union[bytes, str], raw_line: Union[bytes, str, None] = None) \
+            -> str:
+        try:
+            return self._table[raw_command]
+        except KeyError:
+            return self._add(raw_command, raw_line)
+
+    __getitem__ = lookup
+
+    def _add(self, raw_command: Union[bytes, str], raw_line: Union[bytes, str, None]) -> str:
+        if isinstance(raw_command, str):
+            command_str = raw_command
+        else:
+            command_str = raw_command.decode('ascii', 'replace')
+        upper = command_str.upper()  # TODO check if really case-insensitive
+        command = self._table.get(upper)
+        if command is None:
+            if upper.isdigit():
+                get_default_logger().warning(f"unknown server reply code {upper};"
+                                             f" {raw_line!r}")
+            command = sys.intern(upper)
+            self._add_dynamic(upper, command)
+        self._add_dynamic(raw_command, command)
+        return command
+
+    def _add_dynamic(self, key: Union[bytes, str], command: str) -> None:
+        if key not in self._table and self._dynamic_entries < self.max_dynamic_entries:
+            self._dynamic_entries += 1
+            self._table[key] = command
+
+
+default_table = CommandTable()
+
+
+def intern_command(raw_command: Union[bytes, str], raw_line: Union[bytes, str, None] = None) \
+        -> str:
+    """Resolve a raw command to its canonical object using the default table."""
+    return default_table.lookup(raw_command, raw_line)
@@ -0,0 +1,84 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# CTCP framing and low-level quoting
+# https://modern.ircdocs.horse/ctcp.html
+# http://www.irchelp.org/protocol/ctcpspec.html
+
+import re
+from typing import List, Match
+
+DELIMITER = '\x01'
+M_QUOTE = '\x10'
+
+_QUOTE_SEQUENCES = {
+    '0': '\0',
+    'n': '\n',
+    'r': '\r',
+    M_QUOTE: M_QUOTE,
+}
+# Unknown sequences drop the quote character, as does a trailing one
+_DEQUOTE_RE = re.compile('\x10(.?)', re.DOTALL)
+
+
+def is_ctcp(text: str) -> bool:
+    """Check whether a message text carries CTCP data, without copying it."""
+    return text.startswith(DELIMITER)
+
+
+def quote(text: str) -> str:
+    """Apply low-level quoting, so `text` can contain NUL, CR and LF."""
+    return (text.replace(M_QUOTE, M_QUOTE + M_QUOTE)
+            .replace('\0', M_QUOTE + '0')
+            .replace('\n', M_QUOTE + 'n')
+            .replace('\r', M_QUOTE + 'r'))
+
+
+def _dequote_match(match: Match[str]) -> str:
+    char = match.group(1)
+    return _QUOTE_SEQUENCES.get(char, char)
+
+
+def dequote(text: str) -> str:
+    if M_QUOTE not in text:
+        return text
+    return _DEQUOTE_RE.sub(_dequote_match, text)
+
+
+def split_segments(text: str, limit: int = 0) -> List[str]:
+    """Return the dequoted CTCP segments of a message text.
+
+    Only texts starting with a delimiter are considered.
+    Each segment must be terminated by another delimiter,
+    text between segments is ignored.
+    If `limit` is non-zero, at most `limit` segments are returned.
+    """
+    if not is_ctcp(text):
+        return []
+    # parts alternate between text and segment, the last one is unterminated
+    parts = text.split(DELIMITER, 2 * limit if limit else -1)
+    return [dequote(segment) for segment in parts[1:-1:2]]
+
+
+def frame(command: str, text: str = "") -> str:
+    """Build a quoted CTCP message text."""
+    if text:
+        text = f"{command} {text}"
+    else:
+        text = command
+    return DELIMITER + quote(text) + DELIMITER
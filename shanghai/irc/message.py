@@ -16,20 +16,216 @@
 # You should have received a copy of the GNU General Public License
 # along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
+import re
 import types
-from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Union
+from typing import (
+    Any, Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+)
 
-from .server_reply import ServerReply
+from . import ctcp as _ctcp, tags as _tags
+from .commands import intern_command
 from ..logging import get_default_logger
+from ..util import cached_property
+
+
+_INVALID_CHARS_RE = re.compile('[\r\n\0]')
+# unlike `str.splitlines`, which also splits at formatting codes like \x1d (italics)
+_LINE_BREAK_RE = re.compile(r'\r\n|[\r\n]')
 
-
-_ESCAPE_SEQUENCES = {
-    'n': '\n',
-    'r': '\r',
-    's': ' ',
-    '\\': '\\',
-    ':': ';',
-}
+ByteLine = Union[bytes, memoryview]
+
+
+def decode_field(data: bytes, encoding: str = 'utf-8', fallback_encoding: str = 'latin1') -> str:
+    """Decode a single field of a line.
+
+    Falls back to `fallback_encoding` (replacing unknown glyphs)
+    if `data` can not be decoded with `encoding`.
+    """
+    try:
+        return data.decode(encoding)
+    except UnicodeDecodeError:
+        return data.decode(fallback_encoding, 'replace')
+
+
+@functools.lru_cache(maxsize=1024)
+def _encode_word(word: str, encoding: str) -> bytes:
+    """Validate and encode a command, prefix or middle parameter.
+
+    These parts tend to be repeated (e.g. a relay's targets),
+    so the encoded result is cached.
+    """
+    if not word or ' ' in word or word.startswith(':') or _INVALID_CHARS_RE.search(word):
+        raise ValueError(f"Invalid command, prefix or middle parameter {word!r}")
+    return word.encode(encoding)
+
+
+def _scan_line(line: bytes) -> Tuple[int, int, int, int, int]:
+    """Find the field boundaries of a raw IRC line.
+
+    Returns `(tags_end, prefix_end, command_start, command_end, params_start)`.
+    Tags, if present, span `line[1:tags_end]`;
+    `tags_end` is -1 otherwise.
+    The prefix, if present, spans `line[tags_end + 2:prefix_end]`;
+    `prefix_end` equals `tags_end` otherwise.
+    """
+    length = len(line)
+    pos = 0
+
+    tags_end = -1
+    if line.startswith(b'@'):
+        tags_end = line.find(b' ')
+        if tags_end == -1:
+            tags_end = length
+        pos = tags_end + 1
+
+    prefix_end = pos - 1
+    if line.startswith(b':', pos):
+        prefix_end = line.find(b' ', pos)
+        if prefix_end == -1:
+            prefix_end = length
+        pos = prefix_end + 1
+
+    command_start = pos
+    command_end = line.find(b' ', pos)
+    if command_end == -1:
+        command_end = length
+    return tags_end, prefix_end, command_start, command_end, command_end + 1
+
+
+def split_lines(buffer: ByteLine) -> Tuple[List[bytes], bytes]:
+    """Split a chunk of data into lines, accepting both CRLF and LF line endings.
+
+    Returns the complete lines, without line endings and empty lines,
+    and the unterminated tail of `buffer`.
+    """
+    if isinstance(buffer, memoryview):
+        buffer = buffer.tobytes()
+    lines = buffer.split(b'\n')
+    tail = lines.pop()
+    return [line for line in (line.rstrip(b'\r') for line in lines) if line], tail
+
+
+def body_length(line: bytes) -> int:
+    """Return the length of a line without its tag section."""
+    if not line.startswith(b'@'):
+        return len(line)
+    tags_end = line.find(b' ')
+    return 0 if tags_end == -1 else len(line) - tags_end - 1
+
+
+def truncate_bytes(data: bytes, length: int) -> bytes:
+    """Cut `data` to at most `length` bytes without splitting a UTF-8 sequence.
+
+    Other encodings lose at most three more bytes than necessary.
+    """
+    if len(data) <= length:
+        return data
+    end = length
+    for _ in range(3):
+        if end and 0x80 <= data[end] < 0xC0:  # continuation byte
+            end -= 1
+        else:
+            break
+    return data[:end]
+
+
+def split_long_line(line: bytes, limit: int) -> List[bytes]:
+    """Split the last parameter of a line so that no line exceeds `limit` bytes.
+
+    The tags are not counted. Everything before the last parameter is repeated on each line.
+    Returns an empty list if the line can't be split.
+    """
+    tags_end, _, _, _, params_start = _scan_line(line)
+    start = _last_param_start(line, params_start)
+    if start == -1:
+        return []
+    head = line[:start]
+    if not head.endswith(b':'):
+        head = line[:start] + b':'
+    room = limit - (len(head) - tags_end - 1)
+    if room <= 0:
+        return []
+
+    text = line[start:]
+    lines = []
+    while text:
+        chunk = truncate_bytes(text, room) or text[:room]
+        lines.append(head + chunk)
+        text = text[len(chunk):]
+    return lines
+
+
+def _fitting_chars(text: str, length: int, encoding: str) -> int:
+    # Binary search for the longest prefix of `text` encoding to at most `length` bytes,
+    # which is exact for any encoding, including stateful ones.
+    low, high = 0, min(len(text), length)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if len(text[:mid].encode(encoding)) <= length:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def split_text(text: str, length: int, encoding: str = 'utf-8') -> List[str]:
+    """Split a message text into parts of at most `length` bytes in `encoding`.
+
+    Every line break (CR, LF or CRLF) starts a new part and empty lines are skipped.
+    Longer lines are packed greedily and split at the last space that fits,
+    which is dropped, or mid-word if a word does not fit on its own.
+    Characters are never split.
+    """
+    if length <= 0:
+        raise ValueError(f"Invalid length {length}")
+    parts: List[str] = []
+    for line in _LINE_BREAK_RE.split(text):
+        while len(line.encode(encoding)) > length:
+            end = _fitting_chars(line, length, encoding) or 1
+            space = line.rfind(' ', 0, end + 1)
+            if space > 0:
+                parts.append(line[:space])
+                line = line[space + 1:]
+            else:
+                parts.append(line[:end])
+                line = line[end:]
+        if line:
+            parts.append(line)
+    return parts
+
+
+def _split_params_str(params: str) -> List[str]:
+    if params.startswith(':'):
+        return [params[1:]]
+    middle, has_trailing, trailing = params.partition(' :')
+    if has_trailing:
+        result = middle.split(' ')
+        result.append(trailing)
+    elif middle:
+        result = middle.split(' ')
+        if not result[-1]:
+            del result[-1]  # trailing space
+    else:
+        result = []
+    return result
+
+
+def _last_param_start(line: bytes, pos: int) -> int:
+    """Find where the last parameter starts without splitting the parameters.
+
+    Returns -1 if there are no parameters.
+    """
+    start = -1
+    length = len(line)
+    while pos < length:
+        if line[pos] == 0x3a:  # ':'
+            return pos + 1
+        start = pos
+        pos = line.find(b' ', pos) + 1
+        if not pos:
+            break
+    return start
 
 
 class Prefix(NamedTuple):
@@ -49,6 +245,11 @@ class Prefix(NamedTuple):
                 name, ident = name.split('!', 1)
         return cls(name, ident, host)
 
+    @classmethod
+    def from_bytes(cls, prefix: bytes, encoding: str = 'utf-8',
+                   fallback_encoding: str = 'latin1') -> 'Prefix':
+        return cls.from_string(decode_field(prefix, encoding, fallback_encoding))
+
     def __str__(self) -> str:
         ret = self.name
         if self.host:
@@ -58,108 +259,393 @@ class Prefix(NamedTuple):
         return ret
 
 
+class PrefixCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class PrefixCache:
+
+    """Bounded LRU cache for parsing prefixes.
+
+    The same few thousand prefixes tend to repeat endlessly on busy networks,
+    so repeated senders share a single `Prefix` instance
+    and parsing is skipped entirely on a hit.
+    Prefixes given as bytes are decoded first,
+    so both entry points share the same entries.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        # takes prefixes without the leading colon
+        self.lookup = functools.lru_cache(maxsize)(Prefix.from_string)
+
+    def from_string(self, prefix: str) -> Prefix:
+        return self.lookup(prefix[1:] if prefix.startswith(':') else prefix)
+
+    def from_bytes(self, prefix: bytes, encoding: str = 'utf-8',
+                   fallback_encoding: str = 'latin1') -> Prefix:
+        return self.lookup(decode_field(prefix, encoding, fallback_encoding))
+
+    def info(self) -> PrefixCacheInfo:
+        info = self.lookup.cache_info()
+        return PrefixCacheInfo(info.hits, info.misses, self.maxsize, info.currsize)
+
+    def clear(self) -> None:
+        self.lookup.cache_clear()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.info()})"
+
+
+def _prefix_from_str(prefix_string: str, prefix_cache: Optional[PrefixCache]) -> Prefix:
+    # `prefix_string` includes the colon
+    if prefix_cache:
+        return prefix_cache.lookup(prefix_string[1:])
+    return Prefix.from_string(prefix_string)
+
+
+def _tags_from_str(tag_string: str, raw_line: Union[str, bytes, None]) \
+        -> Dict[str, Union[str, bool]]:
+    try:
+        return _tags.parse_tags(tag_string[1:])
+    except _tags.TagError as e:
+        get_default_logger().warning(f"dropping tags; {e}; {raw_line!r}")
+        return {}
+
+
 class Message(NamedTuple):
 
     command: str
     prefix: Optional[Prefix] = None
     params: Sequence[str] = ()
     tags: Mapping[str, Union[str, bool]] = types.MappingProxyType({})  # immutable dict
-    raw_line: str = None
+    raw_line: Union[str, bytes, None] = None
 
     @staticmethod
     def escape(value: str) -> str:
-        out_value = ''
-        sequences = {v: k for k, v in _ESCAPE_SEQUENCES.items()}
-        for char in value:
-            if char in sequences:
-                out_value += '\\' + sequences[char]
-            else:
-                out_value += char
-        return out_value
+        return _tags.escape(value)
 
     @staticmethod
     def unescape(value: str) -> str:
-        out_value = ''
-        escape = False
-        for char in value:
-            if escape:
-                out_value += _ESCAPE_SEQUENCES.get(char, char)
-                escape = False
-            else:
-                if char == '\\':
-                    escape = True
-                else:
-                    out_value += char
-        return out_value
+        return _tags.unescape(value)
 
     @classmethod
     def from_line(cls, line: str) -> 'Message':
+        return cls._from_str(line, line, None)
+
+    @classmethod
+    def _from_str(cls, line: str, raw_line: Union[str, bytes],
+                  prefix_cache: Optional[PrefixCache]) -> 'Message':
         # https://tools.ietf.org/html/rfc2812#section-2.3.1
         # http://ircv3.net/specs/core/message-tags-3.2.html
-        raw_line = line
-        tags: Dict[str, Union[str, bool]] = {}
-        prefix = None
-
+        tag_string = prefix_string = ''
         if line.startswith('@'):
-            # irc tag
             tag_string, _, line = line.partition(" ")
-            for tag in tag_string[1:].split(';'):
-                if '=' in tag:
-                    key, value = tag.split('=', 1)
-                    tags[key] = cls.unescape(value)
-                else:
-                    tags[tag] = True
-
         if line.startswith(':'):
-            prefix_str, _, line = line.partition(" ")
-            prefix = Prefix.from_string(prefix_str)
-
-        command, _, line = line.partition(" ")
-        command = command.upper()  # TODO check if really case-insensitive
-        if command.isdigit():
-            try:
-                command = ServerReply(command)
-            except ValueError:
-                get_default_logger().warning(f"unknown server reply code {command}; {raw_line}")
-
-        params: List[str] = []
-        while line:
-            if line.startswith(':'):
-                params.append(line[1:])
-                line = ''
+            prefix_string, _, line = line.partition(" ")
+        command, _, params = line.partition(" ")
+        command = intern_command(command, raw_line)
+        return cls._from_parts(tag_string, prefix_string, command, params, raw_line, prefix_cache)
+
+    @classmethod
+    def _from_parts(cls, tag_string: str, prefix_string: str, command: str, params: str,
+                    raw_line: Union[str, bytes], prefix_cache: Optional[PrefixCache],
+                    ) -> 'Message':
+        return cls(command,
+                   _prefix_from_str(prefix_string, prefix_cache) if prefix_string else None,
+                   _split_params_str(params),
+                   _tags_from_str(tag_string, raw_line) if tag_string else {},
+                   raw_line)
+
+    @staticmethod
+    def peek_command(line: ByteLine) -> bytes:
+        """Return the raw command of a line without parsing anything else."""
+        if isinstance(line, memoryview):
+            line = line.tobytes()
+        _, _, command_start, command_end, _ = _scan_line(line)
+        return line[command_start:command_end]
+
+    @staticmethod
+    def _tags_from_bytes(data: bytes, encoding: str, fallback_encoding: str) \
+            -> Dict[str, Union[str, bool]]:
+        try:
+            return _tags.parse_tags(data.decode(encoding))
+        except UnicodeDecodeError:
+            pass
+        except _tags.TagError as e:
+            get_default_logger().warning(f"dropping tags; {e}")
+            return {}
+
+        # decode each field on its own
+        tags: Dict[str, Union[str, bool]] = {}
+        try:
+            _tags.check_length(len(data))
+        except _tags.TagError as e:
+            get_default_logger().warning(f"dropping tags; {e}")
+            return tags
+
+        for tag in data.split(b';'):
+            key, is_not_bool, value = tag.partition(b'=')
+            if not key:
+                continue
+            if is_not_bool:
+                tags[decode_field(key, encoding, fallback_encoding)] \
+                    = _tags.unescape(decode_field(value, encoding, fallback_encoding))
+            else:
+                tags[decode_field(key, encoding, fallback_encoding)] = True
+        return tags
+
+    @classmethod
+    def from_bytes(cls, line: ByteLine,
+                   encoding: str = 'utf-8',
+                   fallback_encoding: str = 'latin1',
+                   prefix_cache: Optional[PrefixCache] = None,
+                   ) -> 'Message':
+        """Parse a raw line.
+
+        If the line can't be decoded with `encoding` as a whole,
+        each field is decoded on its own,
+        so a single badly encoded parameter
+        does not cause the rest of the line to use `fallback_encoding`.
+        `raw_line` holds the original bytes.
+
+        Prefixes are parsed through `prefix_cache`, if provided.
+        """
+        if isinstance(line, memoryview):
+            line = line.tobytes()
+        try:
+            return cls._from_str(line.decode(encoding), line, prefix_cache)
+        except UnicodeDecodeError:
+            pass
+        return cls._from_undecodable(line, encoding, fallback_encoding, prefix_cache)
+
+    @classmethod
+    def _from_undecodable(cls, line: bytes, encoding: str, fallback_encoding: str,
+                          prefix_cache: Optional[PrefixCache],
+                          ) -> 'Message':
+        # Undecodable bytes are escaped to lone surrogates,
+        # so the line can be split like any other
+        # and each field is turned back into its original bytes to be decoded on its own.
+        text = line.decode(encoding, 'surrogateescape')
+
+        def raw(field: str) -> bytes:
+            return field.encode(encoding, 'surrogateescape')
+
+        tags: Dict[str, Union[str, bool]] = {}
+        if text.startswith('@'):
+            tag_string, _, text = text.partition(' ')
+            tags = cls._tags_from_bytes(raw(tag_string[1:]), encoding, fallback_encoding)
+
+        prefix = None
+        if text.startswith(':'):
+            prefix_string, _, text = text.partition(' ')
+            parse_prefix = prefix_cache.from_bytes if prefix_cache else Prefix.from_bytes
+            prefix = parse_prefix(raw(prefix_string[1:]), encoding, fallback_encoding)
+
+        command, _, param_string = text.partition(' ')
+        params = [decode_field(raw(param), encoding, fallback_encoding)
+                  for param in _split_params_str(param_string)]
+        return cls(intern_command(raw(command), line), prefix, params, tags, line)
+
+    def to_bytes(self, encoding: str = 'utf-8') -> bytes:
+        """Serialize the message to a line, without line ending.
+
+        Tags are limited to the budget of client-sent tags.
+        Raises ValueError if a part would change the meaning of the line
+        (e.g. a middle parameter containing a space)
+        or contains CR, LF or NUL.
+        """
+        parts: List[bytes] = []
+        if self.tags:
+            tag_string = _tags.format_tags(self.tags, _tags.MAX_CLIENT_TAGS_LENGTH, encoding)
+            parts.append(b'@' + tag_string.encode(encoding))
+        if self.prefix:
+            parts.append(b':' + _encode_word(str(self.prefix), encoding))
+        parts.append(_encode_word(self.command, encoding))
+
+        params = self.params
+        if params:
+            for param in params[:-1]:
+                parts.append(_encode_word(param, encoding))
+            trailing = params[-1]
+            if _INVALID_CHARS_RE.search(trailing):
+                raise ValueError(f"Invalid trailing parameter {trailing!r}")
+            if not trailing or ' ' in trailing or trailing.startswith(':'):
+                parts.append(b':' + trailing.encode(encoding))
             else:
-                param, _, line = line.partition(" ")
-                params.append(param)
+                parts.append(trailing.encode(encoding))
+
+        return b' '.join(parts)
 
-        return cls(command, prefix, params, tags, raw_line)
+    def has_ctcp(self) -> bool:
+        """Check whether the last parameter starts with a CTCP delimiter."""
+        params = self.params
+        return bool(params) and params[-1].startswith(_ctcp.DELIMITER)
 
     def __repr__(self) -> str:
         return (f"{self.__class__.__name__}({self.command!r}, prefix={self.prefix!r},"
                 f" params={self.params!r}, tags={self.tags!r})")
 
 
+_UNPARSED = object()
+
+
+class _LazyField:
+
+    """Non-data descriptor that materializes a field of a `LazyMessage` on first access.
+
+    The parsed value is stored in the instance's `__dict__`,
+    which shadows the descriptor for all subsequent lookups.
+    """
+
+    def __init__(self, index: int, parse: Callable[['LazyMessage'], Any]) -> None:
+        self.index = index
+        self.parse = parse
+        self.name = parse.__name__[len('_parse_'):]
+
+    def __get__(self, instance: Optional['LazyMessage'], owner: type) -> Any:
+        if instance is None:
+            return self
+        value = tuple.__getitem__(instance, self.index)
+        if value is _UNPARSED:
+            value = instance.__dict__[self.name] = self.parse(instance)
+        return value
+
+
+class LazyMessage(Message):
+
+    """A Message parsed from bytes that defers parsing of all fields but `command`.
+
+    The line is only split into its sections on construction;
+    `prefix`, `params` and `tags` are parsed on first access.
+    Messages that are routed by their command alone
+    thus never pay for parsing the rest of the line.
+
+    Use `LazyMessage.from_bytes` to create instances.
+    Apart from that, instances behave like regular `Message`s.
+    """
+
+    # Messages that are nearly always read completely,
+    # for which deferring the parsing would only add overhead
+    EAGER_COMMANDS = frozenset({'PRIVMSG', 'NOTICE'})
+
+    _parts: Tuple[str, str, str]  # tags, prefix and parameters
+    _prefix_cache: Optional[PrefixCache]
+
+    @classmethod
+    def from_bytes(cls, line: ByteLine,
+                   encoding: str = 'utf-8',
+                   fallback_encoding: str = 'latin1',
+                   prefix_cache: Optional[PrefixCache] = None,
+                   ) -> Message:
+        """Parse a raw line lazily.
+
+        Lines with a command in `EAGER_COMMANDS`
+        and lines that can't be decoded with `encoding` as a whole
+        are parsed completely and returned as a regular `Message`.
+        """
+        if isinstance(line, memoryview):
+            line = line.tobytes()
+        try:
+            text = line.decode(encoding)
+        except UnicodeDecodeError:
+            return Message.from_bytes(line, encoding, fallback_encoding, prefix_cache)
+
+        tag_string = prefix_string = ''
+        if text.startswith('@'):
+            tag_string, _, text = text.partition(" ")
+        if text.startswith(':'):
+            prefix_string, _, text = text.partition(" ")
+        command, _, params = text.partition(" ")
+        command = intern_command(command, line)
+        if command in cls.EAGER_COMMANDS:
+            return Message._from_parts(tag_string, prefix_string, command, params, line,
+                                       prefix_cache)
+
+        self = tuple.__new__(cls, (command, _UNPARSED, _UNPARSED, _UNPARSED, line))
+        self._parts = (tag_string, prefix_string, params)
+        self._prefix_cache = prefix_cache
+        return self
+
+    def _parse_prefix(self) -> Optional[Prefix]:
+        prefix_string = self._parts[1]
+        return _prefix_from_str(prefix_string, self._prefix_cache) if prefix_string else None
+
+    def _parse_params(self) -> List[str]:
+        return _split_params_str(self._parts[2])
+
+    def _parse_tags(self) -> Dict[str, Union[str, bool]]:
+        tag_string = self._parts[0]
+        return _tags_from_str(tag_string, self.raw_line) if tag_string else {}
+
+    prefix = _LazyField(1, _parse_prefix)
+    params = _LazyField(2, _parse_params)
+    tags = _LazyField(3, _parse_tags)
+
+    # Everything operating on the tuple itself needs to see the materialized fields
+    # (The field accessors of Message use __getitem__ on Python 3.6.)
+    def __iter__(self) -> Iterator[Any]:
+        getitem = tuple.__getitem__
+        return iter((getitem(self, 0), self.prefix, self.params, self.tags, getitem(self, 4)))
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        value = tuple.__getitem__(self, index)
+        if value is _UNPARSED:
+            value = getattr(self, self._fields[index])
+        return value
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, tuple):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other: Any) -> bool:
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None  # type: ignore
+
+
 class CtcpMessage(Message):
     # http://www.kvirc.net/doc/doc_ctcp_handling.html
 
     @classmethod
-    def from_message(cls, msg: Message):
-        """Very primitive but should do the job for now."""
-        if not msg.command == 'PRIVMSG':
-            return None
-        line = msg.params[1]
-        if not line.startswith('\x01') or not line.endswith('\x01'):
-            return None
-        line = line[1:-1].rstrip()
-        if not line:
-            return None
-        ctcp_cmd, _, ctcp_text = line.partition(' ')
-        if not ctcp_cmd:
-            return None
-        ctcp_cmd = ctcp_cmd.upper()
-        ctcp_params = ctcp_text.split()
+    def split_message(cls, msg: Message, limit: int = 0) -> List['CtcpMessage']:
+        """Create a CtcpMessage for each CTCP segment of a PRIVMSG.
 
-        fields = {**msg._asdict(), 'command': ctcp_cmd, 'params': ctcp_params}
-        return cls(**fields)  # type: ignore
+        If `limit` is non-zero, at most `limit` segments are considered.
+        """
+        if msg.command != 'PRIVMSG' or not msg.has_ctcp():
+            return []
+        return cls._from_segments(msg, limit)
+
+    @classmethod
+    def _from_segments(cls, msg: Message, limit: int) -> List['CtcpMessage']:
+        params = msg.params
+        if len(params) < 2:
+            return []
+
+        ctcp_msgs = []
+        prefix, tags, raw_line = msg.prefix, msg.tags, msg.raw_line
+        for segment in _ctcp.split_segments(params[1], limit):
+            ctcp_cmd, _, ctcp_text = segment.rstrip().partition(' ')
+            if not ctcp_cmd:
+                continue
+            ctcp_msgs.append(cls(ctcp_cmd.upper(), prefix, ctcp_text.split(), tags, raw_line))
+        return ctcp_msgs
+
+    @classmethod
+    def from_message(cls, msg: Message) -> Optional['CtcpMessage']:
+        """Create a CtcpMessage from the first CTCP segment of a PRIVMSG, if any."""
+        if msg.command != 'PRIVMSG' or not msg.has_ctcp():
+            return None
+        ctcp_msgs = cls._from_segments(msg, 1)
+        return ctcp_msgs[0] if ctcp_msgs else None
 
 
 class TextMessage(Message):
@@ -173,8 +659,8 @@ class TextMessage(Message):
     def line(self):
         return self.params[1]
 
-    @property
-    def words(self):
+    @cached_property
+    def words(self) -> List[str]:
         return self.params[1].split()
 
     @property
@@ -184,7 +670,7 @@ class TextMessage(Message):
     @classmethod
     def from_message(cls, message: Message):
         assert len(message.params) == 2
-        return cls(**message._asdict())
+        return cls._make(message)
 
 
 # TODO do we need these "specialized" classes at all?
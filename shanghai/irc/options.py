@@ -59,9 +59,12 @@ class Options(MutableMapping[str, OptionValue]):
     user_modes = 'ov'
     user_prefixes = '@+'
     _case_table = _generate_case_table(DEFAULT_CASE_MAPPING)
+    _targmax: Optional[Dict[str, Optional[int]]] = None
 
     def __init__(self, **kwargs: OptionValue) -> None:
-        self._options = {k.upper(): v for k, v in kwargs.items()}
+        self._options: Dict[str, OptionValue] = {}
+        for key, value in kwargs.items():
+            self[key] = value
 
     def __setitem__(self, key: str, value: OptionValue) -> None:
         ukey = key.upper()
@@ -72,6 +75,8 @@ class Options(MutableMapping[str, OptionValue]):
                 self._parse_prefix(value)
             elif ukey == 'CASEMAPPING':
                 self._case_table = _generate_case_table(value)
+            elif ukey == 'TARGMAX':
+                self._parse_targmax(value)
 
     def __getitem__(self, item: str) -> OptionValue:
         return self._options[item.upper()]
@@ -117,6 +122,26 @@ class Options(MutableMapping[str, OptionValue]):
         else:
             self.user_modes, self.user_modes = match.groups()
 
+    def _parse_targmax(self, value: str) -> None:
+        self._targmax = {}
+        for item in value.split(','):
+            command, _, limit = item.partition(':')
+            if command:
+                self._targmax[command.upper()] = int(limit) if limit.isdigit() else None
+
+    def max_targets(self, command: str) -> Optional[int]:
+        """Return how many comma-separated targets `command` accepts, or None for no limit.
+
+        Uses TARGMAX if the server sent it, otherwise MAXTARGETS for PRIVMSG and NOTICE.
+        """
+        command = command.upper()
+        if self._targmax is not None:
+            return self._targmax.get(command, 1)
+        max_targets = self.get('MAXTARGETS')
+        if command in ('PRIVMSG', 'NOTICE') and isinstance(max_targets, str):
+            return int(max_targets) if max_targets.isdigit() else None
+        return 1
+
     def split_prefixes(self, prefixed_nick: str) -> Tuple[str, str]:
         nick = prefixed_nick
         prefixes = ''
@@ -0,0 +1,152 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# IRCv3 message tag codec
+# https://ircv3.net/specs/extensions/message-tags.html
+
+import re
+from typing import Dict, Mapping, Match, NamedTuple, Optional, Union
+
+TagValue = Union[str, bool]
+
+# Both limits include the leading '@' and the trailing space
+MAX_TAGS_LENGTH = 8191
+MAX_CLIENT_TAGS_LENGTH = 4094
+
+CLIENT_ONLY_PREFIX = '+'
+
+_UNESCAPE_SEQUENCES = {
+    ':': ';',
+    's': ' ',
+    '\\': '\\',
+    'r': '\r',
+    'n': '\n',
+}
+# A trailing lone backslash matches with an empty group and is dropped
+_UNESCAPE_RE = re.compile(r'\\(.?)', re.DOTALL)
+_KEY_RE = re.compile(r'(\+)?(?:([A-Za-z0-9.-]+)/)?([A-Za-z0-9-]+)$')
+
+
+class TagError(ValueError):
+    pass
+
+
+class TagKey(NamedTuple):
+
+    """A tag key split into its components, e.g. `+example.com/name`."""
+
+    name: str
+    vendor: Optional[str] = None
+    client_only: bool = False
+
+    @classmethod
+    def from_string(cls, key: str) -> 'TagKey':
+        match = _KEY_RE.match(key)
+        if match is None:
+            raise TagError(f"Invalid tag key {key!r}")
+        client_only, vendor, name = match.groups()
+        return cls(name, vendor, bool(client_only))
+
+    def __str__(self) -> str:
+        ret = self.name
+        if self.vendor:
+            ret = f"{self.vendor}/{ret}"
+        if self.client_only:
+            ret = CLIENT_ONLY_PREFIX + ret
+        return ret
+
+
+def is_client_only(key: str) -> bool:
+    return key.startswith(CLIENT_ONLY_PREFIX)
+
+
+def escape(value: str) -> str:
+    # A few passes of str.replace are much faster than str.translate
+    # with multi-character replacements or a regular expression.
+    return (value.replace('\\', '\\\\')
+            .replace(';', '\\:')
+            .replace(' ', '\\s')
+            .replace('\r', '\\r')
+            .replace('\n', '\\n'))
+
+
+def _unescape_match(match: Match[str]) -> str:
+    char = match.group(1)
+    return _UNESCAPE_SEQUENCES.get(char, char)
+
+
+def unescape(value: str) -> str:
+    if '\\' not in value:
+        return value
+    if '\0' in value:
+        # can't use NUL as a placeholder
+        return _UNESCAPE_RE.sub(_unescape_match, value)
+
+    value = (value.replace('\\\\', '\0')
+             .replace('\\:', ';')
+             .replace('\\s', ' ')
+             .replace('\\r', '\r')
+             .replace('\\n', '\n'))
+    if '\\' in value:
+        # invalid escape sequences or a trailing backslash
+        value = _UNESCAPE_RE.sub(r'\1', value)
+    return value.replace('\0', '\\')
+
+
+def check_length(length: int, limit: int = MAX_TAGS_LENGTH) -> None:
+    """Raise TagError if a tag section of `length` bytes (without '@') exceeds `limit`."""
+    if length + 2 > limit:
+        raise TagError(f"Tag data of {length + 2} bytes exceeds the limit of {limit} bytes")
+
+
+def parse_tags(data: str, limit: int = MAX_TAGS_LENGTH) -> Dict[str, TagValue]:
+    """Parse the tag section of a line, without the leading '@'.
+
+    Valueless tags are mapped to `True`.
+    Later occurences of a key override earlier ones.
+    """
+    check_length(len(data.encode('utf-8', 'replace')), limit)
+
+    tags: Dict[str, TagValue] = {}
+    for tag in data.split(';'):
+        key, is_not_bool, value = tag.partition('=')
+        if not key:
+            continue
+        tags[key] = unescape(value) if is_not_bool else True
+    return tags
+
+
+def format_tags(tags: Mapping[str, TagValue], limit: int = MAX_TAGS_LENGTH,
+                encoding: str = 'utf-8') -> str:
+    """Serialize a tag mapping to its wire form, without the leading '@'.
+
+    Tags with a value of `True` (or an empty string) are sent without a value,
+    tags with a value of `False` are omitted.
+    """
+    parts = []
+    for key, value in tags.items():
+        if not _KEY_RE.match(key):
+            raise TagError(f"Invalid tag key {key!r}")
+        if value is True or value == '':
+            parts.append(key)
+        elif value is not False:
+            parts.append(f"{key}={escape(value)}")
+
+    data = ';'.join(parts)
+    check_length(len(data.encode(encoding)), limit)
+    return data
@@ -0,0 +1,111 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Line length limits
+
+import collections
+import enum
+from typing import Collection, Counter, Dict, List
+
+from .config import ConfigurationError
+from .irc.message import body_length, split_long_line, truncate_bytes
+from .irc.tags import MAX_TAGS_LENGTH
+
+# RFC 1459 limits lines to 512 bytes, including CRLF
+MAX_LINE_LENGTH = 510
+
+
+class LinePolicy(str, enum.Enum):
+    TRUNCATE = 'truncate'
+    SPLIT = 'split'  # by the last parameter, e.g. the text of a PRIVMSG
+    DROP = 'drop'
+
+
+class LineLimiter:
+
+    """Applies a length limit to lines, not counting their tags.
+
+    Oversized lines are truncated, split or dropped according to `policy`.
+    Lines that can't be split are truncated instead.
+    Counts how often each policy was applied.
+    """
+
+    def __init__(self, limit: int = MAX_LINE_LENGTH, policy: LinePolicy = LinePolicy.TRUNCATE,
+                 allowed_policies: Collection[LinePolicy] = tuple(LinePolicy)) -> None:
+        self.limit = limit
+        try:
+            policy = LinePolicy(policy)
+        except ValueError:
+            pass
+        if policy not in allowed_policies:
+            raise ConfigurationError(f"Invalid line policy {policy!r}; expected one of"
+                                     f" {', '.join(p.value for p in allowed_policies)}")
+        self.policy = policy
+        self.counts: Counter[LinePolicy] = collections.Counter()
+
+    @property
+    def max_raw_length(self) -> int:
+        """Longest acceptable line, including tags."""
+        return MAX_TAGS_LENGTH + self.limit
+
+    def exceeds(self, line: bytes) -> bool:
+        return len(line) > self.limit and body_length(line) > self.limit
+
+    def apply(self, line: bytes) -> List[bytes]:
+        """Return the lines to use in place of an oversized line."""
+        policy = self.policy
+        if policy is LinePolicy.SPLIT:
+            lines = split_long_line(line, self.limit)
+            if lines:
+                self.counts[policy] += 1
+                return lines
+            policy = LinePolicy.TRUNCATE
+
+        self.counts[policy] += 1
+        if policy is LinePolicy.DROP:
+            return []
+        return [truncate_bytes(line, len(line) - body_length(line) + self.limit)]
+
+    def apply_partial(self, data: bytes) -> List[bytes]:
+        """Like `apply`, but for the start of a line longer than `max_raw_length`.
+
+        The line is never split.
+        """
+        policy = LinePolicy.DROP if self.policy is LinePolicy.DROP else LinePolicy.TRUNCATE
+        self.counts[policy] += 1
+        if policy is LinePolicy.DROP:
+            return []
+        line = truncate_bytes(data, self.max_raw_length)
+        if self.exceeds(line):
+            line = truncate_bytes(line, len(line) - body_length(line) + self.limit)
+        return [line]
+
+    def filter(self, lines: List[bytes]) -> List[bytes]:
+        """Apply the limit to several lines."""
+        if max(map(len, lines)) <= self.limit:
+            return lines
+        result = []
+        for line in lines:
+            if self.exceeds(line):
+                result.extend(self.apply(line))
+            else:
+                result.append(line)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {policy.value: count for policy, count in self.counts.items()}
@@ -18,20 +18,34 @@
 
 import asyncio
 import io
-import itertools
 import time
-from typing import Coroutine, Dict, Iterable, Iterator, List, Optional, Set
+from typing import Coroutine, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 
-from .connection import Connection
+from .connection import Connection, get_connection_class
 from .config import NetworkConfiguration, Server
-from .event import build_event, EventDispatcher
+from .event import build_event, Event, EventDispatcher
+from .event_queue import EventQueue
 from .plugin_system import PluginManager
 from .plugin_base import NetworkPlugin, NetworkEventName
-from .irc import Options, Prefix
+from .helpers import HelperPool
+from .limits import LineLimiter, LinePolicy, MAX_LINE_LENGTH
+from .overload import LoadShedder
+from .scheduler import OutboundScheduler
+from .servers import Backoff, ServerPool, ServerStatus
+from .irc import Options, Prefix, PrefixCache
 from .channel import Channel
 from .logging import get_logger
 
 
+class NetworkStatus(NamedTuple):
+    name: str
+    connected: bool
+    registered: bool
+    server: Server
+    reconnect_attempts: int
+    servers: List[ServerStatus]
+
+
 class Network:
     """Sample Network class"""
 
@@ -44,9 +58,12 @@ class Network:
     options: Options
     channels: Dict[str, Channel]
     users: Dict[str, Prefix]
+    prefix_cache: PrefixCache
+    server: Server
 
-    event_queue: asyncio.Queue
+    event_queue: EventQueue[Event]
     _connection: Connection
+    _scheduler: OutboundScheduler
     _worker_task: asyncio.Task
     _connection_task: asyncio.Task
 
@@ -57,12 +74,40 @@ class Network:
         self.loop = loop or asyncio.get_event_loop()
         self.logger = get_logger('network', self.name, config)
         self.plugin_managers: List[PluginManager] = []
+        self.prefix_cache = PrefixCache(config.get('prefix_cache_size', 1024))
+        self._connection_class = get_connection_class(config.get('transport', 'stream'))
+        self.load_shedder = LoadShedder(
+            config.get('overload.threshold', 1000),
+            config.get('overload.policy', 'sample'),
+            config.get('overload.sample_interval', 10),
+        )
 
         self._event_dispatcher = EventDispatcher(logger=self.logger)
         self._plugins: Set[NetworkPlugin] = set()
         self._sub_tasks: List[asyncio.Task] = []
-        self._server_iter: Iterator[Server] = itertools.cycle(self.config.servers)
+        self.inbound_limiter = LineLimiter(
+            config.get('line_limits.inbound.length', 4096),
+            config.get('line_limits.inbound.policy', 'truncate'),
+            allowed_policies=(LinePolicy.TRUNCATE, LinePolicy.DROP),
+        )
+        self.outbound_limiter = LineLimiter(
+            config.get('line_limits.outbound.length', MAX_LINE_LENGTH),
+            config.get('line_limits.outbound.policy', 'split'),
+        )
+        self.server_pool = ServerPool(self.config.servers,
+                                      config.get('reconnect.stable_after', 300),
+                                      clock=self.loop.time)
+        self.backoff = Backoff(config.get('reconnect.delay', 5),
+                               config.get('reconnect.max_delay', 300))
+        self._race_count = config.get('race.count', 1)
+        self._race_stagger = config.get('race.stagger', 0.25)
         self._worker_task_failure_timestamps: List[float] = []
+        nicknames = config.get('helpers.nicks', [])
+        self.helpers = HelperPool(self, nicknames) if nicknames else None
+        # keep channels across reconnects, see ChannelStatePlugin
+        self._warm_resync = config.get('warm_resync', False)
+        self.channels = {}
+        self.users = {}
         self._reset()
 
     def _reset(self) -> None:
@@ -72,36 +117,139 @@ class Network:
         self.realname = ""
         self.vhost = ""
         self.options = Options()
-        self.channels = {}
-        self.users = {}
+        if not self._warm_resync:
+            self.channels = {}
+            self.users = {}
 
         self.stopped = False
         self.connected = False
 
-        server = next(self._server_iter)
-        self.event_queue = asyncio.Queue()
-        self._connection = Connection(server, self.event_queue, self.loop, logger=self.logger)
+        self.server = self.server_pool.select()
+        self.event_queue = EventQueue(self.config.get('event_queue_size', 0), loop=self.loop)
+        self._connection = self._make_connection(self.server)
+        self._scheduler = OutboundScheduler(
+            self._writeline, self.loop,
+            burst=self.config.get('flood_control.burst', 8),
+            rate=self.config.get('flood_control.rate', 1),
+            line_bytes=self.config.get('flood_control.line_bytes', 512),
+            max_targets=self.options.max_targets,
+            writable=self._writable,
+        )
+
+    def _make_connection(self, server: Server) -> Connection:
+        connection = self._connection_class(
+            server, self.event_queue, self.loop, logger=self.logger,
+            high_water=self.config.get('write_high_water', 2 ** 16),
+            shedder=self.load_shedder,
+            line_limiter=self.inbound_limiter,
+            deduplicator=self.helpers.primary if self.helpers else None,
+        )
+        connection.on_drained = self._on_drained
+        return connection
+
+    def _writeline(self, line: bytes) -> None:
+        self._connection.writeline(line)
+
+    def _writable(self) -> bool:
+        return not self._connection.draining
+
+    def _on_drained(self) -> None:
+        self._scheduler.resume()
+
+    async def _race(self) -> None:
+        """Connect to several servers and keep the connection that is established first.
+
+        Every `race.stagger` seconds, or as soon as an attempt failed,
+        another attempt is started for the next best server.
+        """
+        remaining = [self._make_connection(server)
+                     for server in self.server_pool.candidates(self._race_count)]
+        if not remaining:
+            raise ConnectionError(f"No servers to connect to (race.count is {self._race_count})")
+        attempts: Dict[asyncio.Task, Connection] = {}
+        winner: Optional[Connection] = None
+        failures: List[Tuple[Connection, BaseException]] = []
+        try:
+            while winner is None and (remaining or attempts):
+                if remaining:
+                    connection = remaining.pop(0)
+                    attempts[self.loop.create_task(connection.connect())] = connection
+                timeout = self._race_stagger if remaining else None
+                done, _ = await asyncio.wait(attempts, timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    connection = attempts.pop(task)
+                    exc = task.exception()
+                    if exc is None and winner is None:
+                        winner = connection
+                    elif exc is None:
+                        connection.close()
+                    else:
+                        self.logger.info(f"Connecting to {connection.server} failed; {exc}")
+                        failures.append((connection, exc))
+        finally:
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                await asyncio.wait(attempts)
+            for task, connection in attempts.items():
+                if not task.cancelled() and task.exception() is None:
+                    connection.close()
+
+        if winner is None:
+            # leave the last failure for `run` to record
+            connection, error = failures.pop()
+            self._connection, self.server = connection, connection.server
+        for failed, exc in failures:
+            self.server_pool.failed(failed.server, f"{exc.__class__.__name__}: {exc}")
+        if winner is None:
+            raise error
+        self._connection, self.server = winner, winner.server
+
+    async def _connect(self) -> None:
+        if self._race_count > 1:
+            await self._race()
+        await self._connection.run()
 
     async def run(self) -> None:
-        for retry in itertools.count(1):
+        while True:
             self._reset()
-            self._connection_task = self.loop.create_task(self._connection.run())
+            self._connection_task = self.loop.create_task(self._connect())
             self._worker_task = self.loop.create_task(self._worker())
             self._worker_task.add_done_callback(self._worker_done)
 
+            error = None
             try:
                 await self._connection_task
-            except Exception:
+            except Exception as e:
                 self.logger.exception("Connection Task errored")
+                error = f"{e.__class__.__name__}: {e}"
+                if self._connection.connect_duration is None:
+                    # never connected, so nothing else is going to wake up the worker
+                    self.event_queue.put_nowait(build_event(NetworkEventName.DISCONNECTED))
 
             # Wait until worker task emptied the queue (and terminates)
             await self._worker_task
+            self.logger.debug(f"Event queue statistics: {self.event_queue.stats()}")
+            self.logger.debug(f"Outbound queue statistics: {self._scheduler.stats()},"
+                              f" {self._scheduler.consolidated} messages consolidated")
+            self.logger.debug(f"Load shedding statistics: {self.load_shedder.stats()}")
+            if self.helpers:
+                self.logger.debug(f"Helper statistics: {self.helpers.stats()}")
+            self.logger.debug(f"Oversized lines: received {self.inbound_limiter.stats()},"
+                              f" sent {self.outbound_limiter.stats()}")
+            dropped = self._scheduler.close()
+            if dropped:
+                self.logger.info(f"Dropped {dropped} unsent lines")
+            stable = self.server_pool.disconnected(self.server, error)
             if self.stopped:
                 break
 
             # We didn't stop, so try to reconnect after a timeout
-            seconds = 10 * retry
-            self.logger.info(f"Retry connecting in {seconds} seconds")
+            if stable:
+                self.backoff.reset()
+            seconds = self.backoff.next_delay()
+            self.logger.info(f"Retry connecting in {seconds:.1f} seconds")
             await asyncio.sleep(seconds)  # TODO doesn't terminate if KeyboardInterrupt occurs here
 
         # we're leaving, so cancel subtasks
@@ -140,15 +288,27 @@ class Network:
     async def _worker(self) -> None:
         """Dispatches events from the event queue."""
         while not (self._connection_task.done() and self.event_queue.empty()):
-            event = await self.event_queue.get()
-            if event.name != NetworkEventName.RAW_LINE:
-                # too spammy
-                self.logger.debug(f"Dispatching {event}")
+            events = await self.event_queue.get_batch()
+            for i, event in enumerate(events):
+                try:
+                    await self._dispatch(event)
+                except BaseException:
+                    # don't lose the rest of the batch if the worker is restarted
+                    self.event_queue.requeue(events[i + 1:])
+                    raise
+
+    async def _dispatch(self, event: Event) -> None:
+        if event.name != NetworkEventName.RAW_LINES:
+            # too spammy
+            self.logger.debug(f"Dispatching {event}")
+        try:
             result = await self._event_dispatcher.dispatch(event)
-            if result:
-                self._manage_subtasks(result.schedule)
-                for new_event in result.append_events:
-                    self.event_queue.put_nowait(new_event)
+        finally:
+            if event.name == NetworkEventName.RAW_LINES:
+                self.load_shedder.processed(len(event.args['raw_lines']))
+        if result:
+            self._manage_subtasks(result.schedule)
+            self.event_queue.put_many_nowait(result.append_events)
 
     def _manage_subtasks(self, new_coroutines: Optional[Iterable[Coroutine]]):
         """Clean up finished subtasks and add new ones."""
@@ -173,7 +333,58 @@ class Network:
         self.stopped = True
 
     def send_byteline(self, line: bytes) -> None:
-        self._connection.writeline(line)
+        if self.outbound_limiter.exceeds(line):
+            self.logger.warning(f"Line exceeds {self.outbound_limiter.limit} bytes"
+                                f" ({self.outbound_limiter.policy.value}):", line)
+            for part in self.outbound_limiter.apply(line):
+                self._submit(part)
+            return
+        self._submit(line)
+
+    def _submit(self, line: bytes) -> None:
+        if self.helpers:
+            helper = self.helpers.route(line)
+            if helper:
+                helper.send_byteline(line)
+                return
+        self._scheduler.submit(line)
+
+    def source_length(self) -> int:
+        """Return the length of our own `nick!user@host` as the server relays it.
+
+        Parts that haven't been seen yet are estimated generously.
+        """
+        encoding = self.config.get('encoding', 'utf-8')
+        nicknames = [self.nickname]
+        if self.helpers:
+            # messages may be sent from a helper's nickname instead
+            nicknames.extend(helper.nickname for helper in self.helpers.helpers)
+        nick_length = max(len(nickname.encode(encoding)) for nickname in nicknames)
+
+        prefix = self.users.get(self.options.nick_lower(self.nickname))
+        if prefix and prefix.ident and prefix.host:
+            return nick_length + len(f"!{prefix.ident}@{prefix.host}".encode(encoding))
+
+        user = self.options.get('USERLEN', '')
+        host = self.options.get('HOSTLEN', '')
+        # the server may prefix unverified idents with '~'
+        user_length = int(user) if str(user).isdigit() else len(self.user.encode(encoding)) + 1
+        if self.vhost:
+            host_length = len(self.vhost.encode(encoding))
+        else:
+            host_length = int(host) if str(host).isdigit() else 63
+        return nick_length + 1 + user_length + 1 + host_length
+
+    def text_length(self, command: str, target: str) -> int:
+        """Return how many bytes of text fit into a message to `target`.
+
+        The server relays `:nick!user@host COMMAND target :text`,
+        which must not exceed the line length limit.
+        """
+        encoding = self.config.get('encoding', 'utf-8')
+        overhead = (self.source_length() + len(command.encode(encoding))
+                    + len(target.encode(encoding)) + 5)
+        return MAX_LINE_LENGTH - overhead
 
     def request_close(self, quitmsg: str = None) -> None:
         # TODO quitmsg
@@ -192,5 +403,9 @@ class Network:
             self._event_dispatcher.register_plugin(plugin)
         # TODO store plugin instance somewhere for unregistering
 
+    def status(self) -> NetworkStatus:
+        return NetworkStatus(self.name, self.connected, self.registered, self.server,
+                             self.backoff.attempts, self.server_pool.status())
+
     def __repr__(self) -> str:
         return f"Network(name={self.name!r}, nickname={self.nickname!r})"
@@ -0,0 +1,108 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Inbound load shedding
+
+import collections
+import enum
+from typing import Counter, List, NamedTuple
+
+from .config import ConfigurationError
+from .irc.message import Message
+
+# High-volume messages that aren't needed to track the network's state
+SHEDDABLE_COMMANDS = frozenset({b'PRIVMSG', b'NOTICE', b'TAGMSG'})
+
+
+class OverloadPolicy(str, enum.Enum):
+    SHED = 'shed'  # drop all sheddable lines
+    SAMPLE = 'sample'  # keep every n-th sheddable line
+
+
+class LoadShedderStats(NamedTuple):
+    overloads: int
+    kept: int
+    dropped: Counter[bytes]
+
+
+class LoadShedder:
+
+    """Drops chat lines while too many lines are waiting to be processed.
+
+    Once `threshold` lines are queued, lines with one of the `SHEDDABLE_COMMANDS`
+    are dropped (or sampled, depending on `policy`) until the queue is below the threshold again.
+    Everything else, like PINGs, numerics and JOINs, is always kept.
+
+    `pending` counts the lines reported through `queued`
+    until they are reported through `processed`,
+    so it includes the lines of the batch that is being processed.
+    """
+
+    def __init__(self, threshold: int, policy: OverloadPolicy = OverloadPolicy.SAMPLE,
+                 sample_interval: int = 10) -> None:
+        self.threshold = threshold
+        try:
+            self.policy = OverloadPolicy(policy)
+        except ValueError:
+            raise ConfigurationError(f"Unknown overload policy {policy!r}; expected one of"
+                                     f" {', '.join(p.value for p in OverloadPolicy)}") from None
+        self.sample_interval = sample_interval
+        self.overloaded = False
+        self.overloads = 0
+        self.kept = 0
+        self.dropped: Counter[bytes] = collections.Counter()
+        self.pending = 0
+        self._seen = 0
+
+    def queued(self, count: int) -> None:
+        self.pending += count
+
+    def processed(self, count: int) -> None:
+        self.pending = max(self.pending - count, 0)
+
+    def check(self, depth: int) -> bool:
+        """Update the overload state for a queue `depth` and return it."""
+        overloaded = 0 < self.threshold <= depth
+        if overloaded and not self.overloaded:
+            self.overloads += 1
+        self.overloaded = overloaded
+        return overloaded
+
+    def _keep(self) -> bool:
+        if self.policy is OverloadPolicy.SHED or self.sample_interval <= 0:
+            return False
+        keep = self._seen % self.sample_interval == 0
+        self._seen += 1
+        return keep
+
+    def filter(self, lines: List[bytes]) -> List[bytes]:
+        """Return the lines that should be processed while overloaded."""
+        kept = []
+        for line in lines:
+            command = Message.peek_command(line).upper()
+            if command not in SHEDDABLE_COMMANDS:
+                kept.append(line)
+            elif self._keep():
+                kept.append(line)
+                self.kept += 1
+            else:
+                self.dropped[command] += 1
+        return kept
+
+    def stats(self) -> LoadShedderStats:
+        return LoadShedderStats(self.overloads, self.kept, self.dropped.copy())
@@ -18,6 +18,8 @@
 
 import enum
 
+from .irc import Message, ctcp
+from .irc.message import split_text
 from .logging import Logger
 from typing import TYPE_CHECKING
 
@@ -30,7 +32,9 @@ class NetworkEventName(str, enum.Enum):
     CONNECTED = 'connected'  # params: ()
     DISCONNECTED = 'disconnected'  # params: ()
     CLOSE_REQUEST = 'close_request'  # params: (quitmsg: str)
-    RAW_LINE = 'raw_line'  # params: (raw_line: bytes)
+    # All complete lines of one read.
+    # There is no per-line 'raw_line' event anymore; iterate over `raw_lines` instead.
+    RAW_LINES = 'raw_lines'  # params: (raw_lines: List[bytes])
 
     # emitted by core plugins
     MESSAGE = 'message'  # params: (message: Message)
@@ -59,6 +63,13 @@ class NetworkPlugin:
     and any server command like 'KICK' or 'NOTICE'.
     All message events accept a single `message` parameter
     of the type `shanghai.irc.Message`.
+
+    Bot commands in private messages are dispatched to handlers
+    decorated with `command_event`, e.g. `@command_event('!echo')`,
+    with a `message` parameter of the type `PrivateMessage`.
+    Command events are dispatched after the message event they came from,
+    so eating a command event only stops other handlers of that command;
+    eat the message event itself to hide it from later message handlers.
     """
 
     def __init__(self, network: 'Network', logger: Logger) -> None:
@@ -87,19 +98,29 @@ class MessagePluginMixin:
     def send_line(self, line: str) -> None:
         self.network.send_byteline(line.encode(self._encoding))  # type: ignore
 
+    def send_message(self, message: Message) -> None:
+        self.network.send_byteline(message.to_bytes(self._encoding))  # type: ignore
+
     def send_cmd(self, command: str, *params: str) -> None:
-        args = [command, *params]
-        if ' ' in args[-1]:
-            args[-1] = f":{args[-1]}"
-        self.send_line(' '.join(args))
+        self.send_message(Message(command, params=params))
+
+    def send_text(self, command: str, target: str, text: str) -> None:
+        """Send `text` in as few lines as possible, splitting at newlines and spaces.
+
+        CTCP messages are sent unsplit.
+        """
+        if ctcp.is_ctcp(text):
+            self.send_cmd(command, target, text)
+            return
+        length = self.network.text_length(command, target)  # type: ignore
+        for part in split_text(text, length, self._encoding):
+            self.send_cmd(command, target, part)
 
     def send_msg(self, target, text) -> None:
-        # TODO split messages that are too long into multiple, also newlines
-        self.send_cmd('PRIVMSG', target, text)
+        self.send_text('PRIVMSG', target, text)
 
     def send_notice(self, target, text) -> None:
-        # TODO split messages that are too long into multiple, also newlines
-        self.send_cmd('NOTICE', target, text)
+        self.send_text('NOTICE', target, text)
 
 
 class CtcpPluginMixin(MessagePluginMixin):
@@ -113,19 +134,19 @@ class CtcpPluginMixin(MessagePluginMixin):
     e.g. 'VERSION' or 'TIME'.
     """
     def send_ctcp(self, target: str, command: str, text: str = "") -> None:
-        if text:
-            text = ' ' + text
-        text = f"\x01{command}{text}\x01"
-        self.send_msg(target, text)
+        self.send_msg(target, ctcp.frame(command, text))
 
     def send_ctcp_reply(self, target: str, command: str, text: str = "") -> None:
-        if text:
-            text = ' ' + text
-        text = f"\x01{command}{text}\x01"
-        self.send_notice(target, text)
+        self.send_notice(target, ctcp.frame(command, text))
 
     def send_action(self, target: str, text: str = "") -> None:
-        self.send_ctcp(target, 'ACTION', text)
+        if not text:
+            self.send_ctcp(target, 'ACTION')
+            return
+        # 'ACTION', a space and the delimiters
+        length = self.network.text_length('PRIVMSG', target) - 9  # type: ignore
+        for part in split_text(text, length, self._encoding):
+            self.send_ctcp(target, 'ACTION', part)
 
 
 class OptionsPluginMixin:
@@ -154,6 +175,13 @@ class ChannelPlugin(CtcpPluginMixin):
     Event names are listed
     in the `ChannelEventName` enum
     with their parameters.
+
+    Bot commands in channel messages are dispatched to handlers
+    decorated with `command_event`, e.g. `@command_event('!nicks')`,
+    with a `message` parameter of the type `ChannelMessage`.
+    Command events are dispatched after the message event they came from,
+    so eating a command event only stops other handlers of that command;
+    eat the message event itself to hide it from later message handlers.
     """
 
     def __init__(self, channel: 'Channel') -> None:
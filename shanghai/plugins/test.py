@@ -25,7 +25,7 @@ from ..irc.message import ChannelMessage, PrivateMessage
 from ..plugin_base import (ChannelEventName, ChannelPlugin,
                            ChannelMessageMixin, MessagePluginMixin,
                            NetworkEventName, NetworkPlugin)
-from ..event import event, ReturnValue
+from ..event import command_event, event, ReturnValue
 
 
 def _unhighlight(nick):
@@ -35,18 +35,20 @@ def _unhighlight(nick):
 class TestNetworkPlugin(NetworkPlugin, MessagePluginMixin):
 
     @event(NetworkEventName.PRIVATE_MESSAGE)
-    def on_private_message(self, user, message: PrivateMessage):
+    def on_private_message(self, message: PrivateMessage):
         self.logger.debug(f'Got a private message {message}')
 
-        if message.words[0] == '!echo':
-            if len(message.words) >= 3:
-                text = ' '.join(message.words[2:])
-                self.send_msg(message.source, text)
+    @command_event('!echo')
+    def on_echo(self, message: PrivateMessage):
+        if len(message.words) >= 3:
+            text = ' '.join(message.words[2:])
+            self.send_msg(message.sender, text)
 
-        elif message.words[0] == '!say':
-            if len(message.words) >= 3:
-                text = ' '.join(message.words[2:])
-                self.send_msg(message.source, f'{message.sender} told me to say: {text}')
+    @command_event('!say')
+    def on_say(self, message: PrivateMessage):
+        if len(message.words) >= 3:
+            text = ' '.join(message.words[2:])
+            self.send_msg(message.sender, f'{message.sender} told me to say: {text}')
 
 
 class TestChannelPlugin(ChannelPlugin, ChannelMessageMixin):
@@ -58,70 +60,81 @@ class TestChannelPlugin(ChannelPlugin, ChannelMessageMixin):
     @event(ChannelEventName.MESSAGE)
     def on_channel_message(self, message: ChannelMessage):
         self.logger.debug(f'Got a channel message {message}')
-        first_word = message.words[0]
-
-        if first_word == '!nicks':
-            nick_list = [_unhighlight(member.prefix.name)
-                         for member in self.channel.members]
-            self.say(' '.join(nick_list))
-
-        elif first_word == '!names':
-            nick_list = []
-            for member in self.channel.members:
-                prefixes = self.network.options.modes_to_prefixes(member.modes)
-                nick_list.append(f"{prefixes}{_unhighlight(member.prefix.name)}")
-            self.say(' '.join(nick_list))
-
-        elif first_word == '!channels':
-            sorted_channels = sorted(self.network.channels.values(), key=lambda c: c.name)
-            channel_strings = (f"{chan.name} ({len(chan.members)})"
-                               for chan in sorted_channels)
-            self.say(', '.join(channel_strings))
-
-        elif first_word == '!except':
-            raise Exception('Test Exception')
-
-        elif first_word == '!quit':
-            self.network.request_close(message.line)
-
-        elif first_word == '!cancel':
-            # this is private API, but we specifically want to "cancel" the worker
-            self.network._close()
-            self.network.stopped = False
-
-        elif first_word == '!ctcp':
-            if len(message.words) >= 2:
-                self.send_ctcp(message.prefix.name, message.words[1], ' '.join(message.words[2:]))
-
-        elif first_word == '!eat':
+        # Not a command event, because eating it has to stop the message event
+        if message.words and message.words[0] == '!eat':
             if len(message.words) == 2:
                 return message.words[1]
             return ReturnValue(eat=True)
 
-        elif first_word == '!quote':
-            _, line_to_send = message.line.split(maxsplit=1)
-            self.send_line(line_to_send)
-
-        elif first_word == '!say':
-            if len(message.words) >= 2:
-                text = ' '.join(message.words[1:])
-                self.say(text)
-
-        elif first_word == '!me':
-            if len(message.words) >= 2:
-                text = ' '.join(message.words[1:])
-                self.me(text)
-
-        elif first_word == '!join':
-            if len(message.words) == 2:
-                self.send_cmd('JOIN', message.words[1])
-
-        elif first_word == '!part':
-            if len(message.words) >= 2:
-                channel_name = message.words[1]
-                part_msg = ' '.join(message.words[2:])
-            elif len(message.words) == 1:
-                channel_name = self.channel.name
-                part_msg = ""
-
-            self.send_cmd('PART', channel_name, part_msg)
+    @command_event('!nicks')
+    def on_nicks(self, message: ChannelMessage):
+        nick_list = [_unhighlight(member.prefix.name)
+                     for member in self.channel.members]
+        self.say(' '.join(nick_list))
+
+    @command_event('!names')
+    def on_names(self, message: ChannelMessage):
+        nick_list = []
+        for member in self.channel.members:
+            prefixes = self.network.options.modes_to_prefixes(member.modes)
+            nick_list.append(f"{prefixes}{_unhighlight(member.prefix.name)}")
+        self.say(' '.join(nick_list))
+
+    @command_event('!channels')
+    def on_channels(self, message: ChannelMessage):
+        sorted_channels = sorted(self.network.channels.values(), key=lambda c: c.name)
+        channel_strings = (f"{chan.name} ({len(chan.members)})"
+                           for chan in sorted_channels)
+        self.say(', '.join(channel_strings))
+
+    @command_event('!except')
+    def on_except(self, message: ChannelMessage):
+        raise Exception('Test Exception')
+
+    @command_event('!quit')
+    def on_quit(self, message: ChannelMessage):
+        self.network.request_close(message.line)
+
+    @command_event('!cancel')
+    def on_cancel(self, message: ChannelMessage):
+        # this is private API, but we specifically want to "cancel" the worker
+        self.network._close()
+        self.network.stopped = False
+
+    @command_event('!ctcp')
+    def on_ctcp(self, message: ChannelMessage):
+        if len(message.words) >= 2:
+            self.send_ctcp(message.prefix.name, message.words[1], ' '.join(message.words[2:]))
+
+    @command_event('!quote')
+    def on_quote(self, message: ChannelMessage):
+        _, line_to_send = message.line.split(maxsplit=1)
+        self.send_line(line_to_send)
+
+    @command_event('!say')
+    def on_say(self, message: ChannelMessage):
+        if len(message.words) >= 2:
+            text = ' '.join(message.words[1:])
+            self.say(text)
+
+    @command_event('!me')
+    def on_me(self, message: ChannelMessage):
+        if len(message.words) >= 2:
+            text = ' '.join(message.words[1:])
+            self.me(text)
+
+    @command_event('!join')
+    def on_join(self, message: ChannelMessage):
+        if len(message.words) == 2:
+            self.send_cmd('JOIN', message.words[1])
+
+    @command_event('!part')
+    def on_part(self, message: ChannelMessage):
+        if len(message.words) >= 2:
+            channel_name = message.words[1]
+            part_msg = ' '.join(message.words[2:])
+        else:
+            channel_name = self.channel.name
+            part_msg = ""
+
+        self.send_cmd('PART', channel_name, part_msg)
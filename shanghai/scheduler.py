@@ -0,0 +1,260 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Outbound flood control
+
+import asyncio
+import collections
+import enum
+import itertools
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from .irc.message import body_length
+from .limits import MAX_LINE_LENGTH
+from .util import TokenBucket
+
+
+class Lane(enum.IntEnum):
+    URGENT = 0
+    NORMAL = 1
+    BULK = 2
+
+
+URGENT_COMMANDS = frozenset({b'PONG', b'QUIT', b'PASS', b'CAP', b'AUTHENTICATE',
+                             b'NICK', b'USER'})
+BULK_COMMANDS = frozenset({b'PRIVMSG', b'NOTICE'})
+
+_Pending = Tuple[bytes, float]  # (line, time queued)
+
+
+def _split_target(line: bytes) -> Optional[Tuple[bytes, bytes, bytes]]:
+    # (tags and command, target, the rest including its leading space)
+    start = 0
+    if line.startswith(b'@'):
+        start = line.find(b' ') + 1
+        if not start:
+            return None
+    command_end = line.find(b' ', start)
+    target_end = line.find(b' ', command_end + 1) if command_end != -1 else -1
+    if target_end == -1:
+        return None
+    return line[:command_end], line[command_end + 1:target_end], line[target_end:]
+
+
+class LaneStats(NamedTuple):
+    sent: int
+    mean_delay: float
+    max_delay: float
+
+
+class OutboundScheduler:
+
+    """Sends lines through a token bucket to stay below the server's flood limits.
+
+    A line costs one token for every `line_bytes` bytes started,
+    the bucket holds `burst` tokens and refills at `rate` tokens per second.
+    A `rate` of 0 disables flood control.
+
+    Lines are sorted into lanes by their command:
+    Urgent lines (e.g. PONG, QUIT and registration) are sent immediately,
+    but their cost still delays the other lanes.
+    Bulk messages (PRIVMSG and NOTICE) are only sent if no other lines are waiting
+    and are taken from each target in turn,
+    so a long reply to one target doesn't hold back the others.
+
+    If `max_targets` is given, it is called with a bulk command
+    and returns how many comma-separated targets the server accepts (None for no limit).
+    A waiting bulk message is then sent together with identical messages
+    that are next in line for other targets.
+
+    If `writable` is given, lines other than urgent ones are held back
+    while it returns False, e.g. while the connection's write buffer drains.
+    Call `resume` once it returns True again.
+    """
+
+    def __init__(self,
+                 send: Callable[[bytes], None],
+                 loop: asyncio.AbstractEventLoop,
+                 burst: float = 8,
+                 rate: float = 1,
+                 line_bytes: int = 512,
+                 clock: Callable[[], float] = None,
+                 max_targets: Callable[[str], Optional[int]] = None,
+                 writable: Callable[[], bool] = None,
+                 ) -> None:
+        self._send = send
+        self.loop = loop
+        self._clock = clock or loop.time
+        self.bucket = TokenBucket(burst, rate, self._clock)
+        self.line_bytes = line_bytes
+        self._max_targets = max_targets
+        self._writable = writable
+        self.consolidated = 0
+
+        self._normal: Deque[_Pending] = collections.deque()
+        self._bulk: 'collections.OrderedDict[bytes, Deque[_Pending]]' = collections.OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self._sent = [0] * len(Lane)
+        self._total_delay = [0.0] * len(Lane)
+        self._max_delay = [0.0] * len(Lane)
+
+    @staticmethod
+    def classify(line: bytes) -> Tuple[Lane, bytes]:
+        """Return the lane for a line and, for bulk messages, the (lower-cased) target."""
+        words = line.split(b' ', 3)
+        if words[0].startswith(b'@'):
+            del words[0]
+        command = words[0].upper()
+        if command in URGENT_COMMANDS:
+            return Lane.URGENT, b''
+        if command in BULK_COMMANDS and len(words) > 1:
+            return Lane.BULK, words[1].lower()
+        return Lane.NORMAL, b''
+
+    def cost(self, line: bytes) -> float:
+        # don't let a long line exceed the bucket
+        return min(-(-(len(line) + 2) // self.line_bytes), self.bucket.capacity)
+
+    @property
+    def queued(self) -> int:
+        return len(self._normal) + sum(len(queue) for queue in self._bulk.values())
+
+    def _can_write(self) -> bool:
+        return self._writable is None or self._writable()
+
+    def submit(self, line: bytes) -> None:
+        now = self._clock()
+        if not self.bucket.rate and not (self._normal or self._bulk) and self._can_write():
+            self._sent_line(Lane.URGENT, line, now)
+            return
+
+        lane, target = self.classify(line)
+        if lane is Lane.URGENT:
+            if self.bucket.rate:
+                self.bucket.charge(self.cost(line))
+            self._sent_line(lane, line, now)
+            return
+
+        if lane is Lane.NORMAL:
+            self._normal.append((line, now))
+        else:
+            queue = self._bulk.get(target)
+            if queue is None:
+                queue = self._bulk[target] = collections.deque()
+            queue.append((line, now))
+        self._pump()
+
+    def _pump(self) -> None:
+        while self._can_write():
+            target = None
+            if self._normal:
+                lane, queue = Lane.NORMAL, self._normal
+            elif self._bulk:
+                lane = Lane.BULK
+                target, queue = next(iter(self._bulk.items()))
+            else:
+                return
+
+            line, queued_at = queue[0]
+            merged: List[bytes] = []
+            if target is not None and self._max_targets and len(self._bulk) > 1:
+                line, merged = self._consolidate(line)
+            cost = self.cost(line)
+            if self.bucket.rate and not self.bucket.consume(cost):
+                if self._timer is None:
+                    self._timer = self.loop.call_later(self.bucket.delay(cost), self._on_timer)
+                return
+
+            if target is None:
+                queue.popleft()
+            else:
+                for key in [target, *merged]:
+                    # next target's turn
+                    queue = self._bulk[key]
+                    queue.popleft()
+                    if queue:
+                        self._bulk.move_to_end(key)
+                    else:
+                        del self._bulk[key]
+                self.consolidated += len(merged)
+            self._sent_line(lane, line, queued_at)
+
+    def _consolidate(self, line: bytes) -> Tuple[bytes, List[bytes]]:
+        # Only the first waiting message of each target is considered, to keep their order.
+        # Returns the line to send and the keys of the targets that were merged into it.
+        parts = _split_target(line)
+        if parts is None or b',' in parts[1]:
+            return line, []
+        head, target, rest = parts
+        limit = self._max_targets(head.rpartition(b' ')[2].decode('ascii', 'replace'))
+        if limit is not None and limit < 2:
+            return line, []
+
+        targets = [target]
+        merged: List[bytes] = []
+        length = body_length(line)
+        for key, queue in itertools.islice(self._bulk.items(), 1, None):
+            other = _split_target(queue[0][0])
+            if (other is None or other[0] != head or other[2] != rest or b',' in other[1]
+                    or length + 1 + len(other[1]) > MAX_LINE_LENGTH):
+                continue
+            targets.append(other[1])
+            merged.append(key)
+            length += 1 + len(other[1])
+            if len(targets) == limit:
+                break
+
+        if not merged:
+            return line, []
+        return head + b' ' + b','.join(targets) + rest, merged
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._pump()
+
+    def resume(self) -> None:
+        """Send waiting lines that were held back because the connection wasn't writable."""
+        if self._timer is None:
+            self._pump()
+
+    def _sent_line(self, lane: Lane, line: bytes, queued_at: float) -> None:
+        self._send(line)
+        delay = self._clock() - queued_at
+        self._sent[lane] += 1
+        self._total_delay[lane] += delay
+        if delay > self._max_delay[lane]:
+            self._max_delay[lane] = delay
+
+    def stats(self) -> Dict[Lane, LaneStats]:
+        """Return the number of lines sent and their queue delay in seconds per lane."""
+        return {lane: LaneStats(self._sent[lane],
+                                self._total_delay[lane] / self._sent[lane] if self._sent[lane]
+                                else 0.0,
+                                self._max_delay[lane])
+                for lane in Lane}
+
+    def close(self) -> int:
+        """Stop sending and drop all waiting lines. Returns the number of dropped lines."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        dropped = self.queued
+        self._normal.clear()
+        self._bulk.clear()
+        return dropped
@@ -0,0 +1,160 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# Server selection and reconnect backoff
+
+import random
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .config import Server
+
+
+class Backoff:
+
+    """Jittered exponential backoff.
+
+    The n-th delay is `base * factor ** n`, capped at `maximum`,
+    and randomly shortened by up to `jitter` (as a fraction of the delay)
+    so that many clients don't reconnect in lockstep.
+    """
+
+    def __init__(self, base: float = 5, maximum: float = 300, factor: float = 2,
+                 jitter: float = 0.5, rng: Callable[[], float] = random.random) -> None:
+        self.base = base
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.rng = rng
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.maximum, self.base * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay * (1 - self.jitter * self.rng())
+
+    def reset(self) -> None:
+        self.attempts = 0
+
+
+class ServerStatus(NamedTuple):
+    server: Server
+    connects: int
+    failures: int  # consecutive
+    total_failures: int
+    connect_duration: Optional[float]
+    latency: Optional[float]
+    last_error: Optional[str]
+
+
+class ServerHealth:
+
+    """Connection history of a single server."""
+
+    __slots__ = ('server', 'connects', 'failures', 'total_failures', 'connect_duration',
+                 'latency', 'last_error', 'connected_at')
+
+    def __init__(self, server: Server) -> None:
+        self.server = server
+        self.connects = 0
+        self.failures = 0
+        self.total_failures = 0
+        self.connect_duration: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.connected_at: Optional[float] = None
+
+    def status(self) -> ServerStatus:
+        return ServerStatus(self.server, self.connects, self.failures, self.total_failures,
+                            self.connect_duration, self.latency, self.last_error)
+
+
+class ServerPool:
+
+    """Tracks the health of a network's servers and picks the one to connect to next.
+
+    Servers are ranked by their number of consecutive failures,
+    then by their last ping latency (or connect duration, if no ping was answered yet),
+    then by their configured order.
+    A session shorter than `stable_after` seconds counts as a failure.
+    """
+
+    def __init__(self, servers: Iterable[Server], stable_after: float = 300,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.stable_after = stable_after
+        self.clock = clock
+        self.health: Dict[Server, ServerHealth] = {server: ServerHealth(server)
+                                                   for server in servers}
+        if not self.health:
+            raise ValueError("No servers")
+
+    def _rank(self, item: Tuple[int, ServerHealth]) -> Tuple[int, float, int]:
+        index, health = item
+        if health.latency is not None:
+            speed = health.latency
+        elif health.connect_duration is not None:
+            speed = health.connect_duration
+        else:
+            speed = float('inf')
+        return health.failures, speed, index
+
+    def ranked(self) -> List[ServerHealth]:
+        return [health for _, health in sorted(enumerate(self.health.values()), key=self._rank)]
+
+    def select(self) -> Server:
+        return min(enumerate(self.health.values()), key=self._rank)[1].server
+
+    def candidates(self, count: int) -> List[Server]:
+        """Return the `count` best servers."""
+        return [health.server for health in self.ranked()[:count]]
+
+    def connected(self, server: Server, connect_duration: Optional[float] = None) -> None:
+        health = self.health[server]
+        health.connects += 1
+        health.connected_at = self.clock()
+        if connect_duration is not None:
+            health.connect_duration = connect_duration
+
+    def record_latency(self, server: Server, latency: float) -> None:
+        self.health[server].latency = latency
+
+    def failed(self, server: Server, error: Optional[str] = None) -> None:
+        health = self.health[server]
+        health.failures += 1
+        health.total_failures += 1
+        health.last_error = error
+
+    def disconnected(self, server: Server, error: Optional[str] = None) -> bool:
+        """Record the end of a connection attempt or session.
+
+        Returns whether the session was stable.
+        """
+        health = self.health[server]
+        connected_at, health.connected_at = health.connected_at, None
+        if connected_at is None:
+            self.failed(server, error or "connection failed")
+            return False
+        if self.clock() - connected_at < self.stable_after:
+            self.failed(server, error or "unstable session")
+            return False
+        health.failures = 0
+        return True
+
+    def status(self) -> List[ServerStatus]:
+        """Return the status of all servers, best first."""
+        return [health.status() for health in self.ranked()]
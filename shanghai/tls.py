@@ -0,0 +1,75 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+# TLS contexts with session resumption
+
+import functools
+import ssl
+from typing import Any, Optional, Union
+
+from .config import Server
+
+
+class ResumingSSLContext(ssl.SSLContext):
+
+    """Client context that resumes the session stored in `session`.
+
+    asyncio doesn't allow passing a session when connecting,
+    so it is injected when the SSL object is created.
+    """
+
+    session: Optional[ssl.SSLSession] = None
+
+    def wrap_bio(self, incoming: ssl.MemoryBIO, outgoing: ssl.MemoryBIO,
+                 server_side: bool = False,
+                 server_hostname: Optional[Union[str, bytes]] = None,
+                 session: Optional[ssl.SSLSession] = None,
+                 *args: Any, **kwargs: Any) -> ssl.SSLObject:
+        if session is None and not server_side:
+            session = self.session
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session,
+                                *args, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def get_ssl_context(server: Server) -> Optional[ResumingSSLContext]:
+    """Return the SSL context for a server, or None if it doesn't use TLS.
+
+    The context is created once per server and reused for every connection.
+    """
+    if not server.ssl:
+        return None
+
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if not server.verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif server.ca_file:
+        context.load_verify_locations(server.ca_file)
+    else:
+        context.load_default_certs()
+    if server.client_cert:
+        context.load_cert_chain(server.client_cert, server.client_key)
+    return context
+
+
+def store_session(context: ResumingSSLContext, ssl_object: ssl.SSLObject) -> None:
+    """Keep the session of a connection to resume it on the next one."""
+    session = ssl_object.session
+    if session is not None:
+        context.session = session
@@ -16,7 +16,9 @@
 # You should have received a copy of the GNU General Public License
 # along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
 
-from typing import Callable
+import collections
+import time
+from typing import Any, Callable, Hashable
 
 from fullqualname import fullqualname
 
@@ -24,3 +26,97 @@ from fullqualname import fullqualname
 def repr_func(func: Callable) -> str:
     """Represent a function with its full qualname instead of just its name and an address."""
     return f"<{type(func).__name__} {fullqualname(func)}>"
+
+
+class cached_property:
+
+    """A read-only property that is computed once per instance.
+
+    The value is stored in the instance's `__dict__`,
+    which shadows the descriptor for all subsequent lookups.
+    """
+
+    def __init__(self, func: Callable[[Any], Any]) -> None:
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.func(instance)
+        return value
+
+
+class TokenBucket:
+
+    """Allow bursts of up to `capacity` tokens, refilled at `rate` tokens per second."""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'timestamp', 'clock')
+
+    def __init__(self, capacity: float, rate: float,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.clock = clock
+        self.timestamp = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def consume(self, tokens: float = 1) -> bool:
+        """Take `tokens` from the bucket if there are enough."""
+        self._refill()
+        if tokens > self.tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+    def charge(self, tokens: float = 1) -> None:
+        """Take `tokens` from the bucket even if there aren't enough.
+
+        The debt delays later consumers.
+        """
+        self._refill()
+        self.tokens -= tokens
+
+    def delay(self, tokens: float = 1) -> float:
+        """Return the number of seconds until `tokens` can be consumed."""
+        self._refill()
+        missing = tokens - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate else float('inf')
+
+
+class RateLimiter:
+
+    """Independent token buckets per key, e.g. per message source.
+
+    Only the buckets of the `maxsize` most recently limited keys are kept.
+    """
+
+    def __init__(self, capacity: float, rate: float, maxsize: int = 1024,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.capacity = capacity
+        self.rate = rate
+        self.maxsize = maxsize
+        self.clock = clock
+        self._buckets: 'collections.OrderedDict[Hashable, TokenBucket]' \
+            = collections.OrderedDict()
+
+    def consume(self, key: Hashable, tokens: float = 1) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.capacity, self.rate, self.clock)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.consume(tokens)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
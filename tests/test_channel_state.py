@@ -0,0 +1,148 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from shanghai.core_plugins.channel import ChannelStatePlugin
+from shanghai.irc import Message
+
+from .test_network import make_network
+
+
+@pytest.fixture
+def loop():
+    return asyncio.get_event_loop()
+
+
+def msg(line):
+    return Message.from_line(line)
+
+
+@pytest.fixture
+def make_plugin(loop):
+    def make_plugin(**config):
+        network = make_network(loop, [6667], **config)
+        network.nickname = 'bot'
+        return ChannelStatePlugin(network, network.logger)
+    return make_plugin
+
+
+def join(plugin, loop, names):
+    result = loop.run_until_complete(plugin.on_join(msg(':bot!u@h JOIN #chan')))
+    if result:
+        for coro in result.schedule:
+            coro.close()
+    plugin.on_names(msg(f':srv 353 bot = #chan :{names}'))
+    plugin.on_names_end(msg(':srv 366 bot #chan :End of /NAMES list.'))
+
+
+def member_modes(channel):
+    return {member.prefix.name: member.modes for member in channel.members}
+
+
+class TestResync:
+
+    def test_names_diff(self, make_plugin, loop):
+        plugin = make_plugin()
+        join(plugin, loop, 'bot @alice bob')
+        channel = plugin.network.channels['#chan']
+        assert member_modes(channel) == {'bot': '', 'alice': 'o', 'bob': ''}
+        alice_info = plugin._joins[('#chan', 'alice')]
+
+        plugin.on_names(msg(':srv 353 bot = #chan :bot +alice'))
+        plugin.on_names(msg(':srv 353 bot = #chan :carol'))
+        # applied at the end
+        assert 'carol' not in member_modes(channel)
+        plugin.on_names_end(msg(':srv 366 bot #chan :End of /NAMES list.'))
+
+        assert member_modes(channel) == {'bot': '', 'alice': 'v', 'carol': ''}
+        assert plugin._joins[('#chan', 'alice')] is alice_info
+        assert 'bob' not in plugin.network.users
+
+    def test_cold(self, make_plugin, loop):
+        plugin = make_plugin()
+        join(plugin, loop, 'bot alice')
+        assert plugin.on_disconnected()
+        plugin.on_post_disconnected()
+        plugin.network._reset()
+        assert not plugin.network.channels
+        assert not plugin._joins
+
+    def test_warm(self, make_plugin, loop):
+        plugin = make_plugin(warm_resync=True)
+        join(plugin, loop, 'bot alice bob')
+        network = plugin.network
+        channel = network.channels['#chan']
+
+        assert not plugin.on_disconnected()
+        network._reset()
+        network.nickname = 'bot'
+        assert network.channels == {'#chan': channel}
+        assert len(channel.members) == 3
+
+        join(plugin, loop, 'bot alice carol')
+        assert network.channels['#chan'] is channel
+        assert set(member_modes(channel)) == {'bot', 'alice', 'carol'}
+        assert set(network.users) == {'bot', 'alice', 'carol'}
+        assert not plugin._resyncing
+
+    def test_rejoin_failed(self, make_plugin, loop):
+        plugin = make_plugin(warm_resync=True)
+        join(plugin, loop, 'bot alice')
+        plugin.on_disconnected()
+        plugin.network._reset()
+        plugin.network.nickname = 'bot'
+
+        # not a rejoin
+        assert plugin.on_banned_from_chan(msg(':srv 474 bot #other :Cannot join')) is None
+
+        result = plugin.on_banned_from_chan(msg(':srv 474 bot #chan :Cannot join'))
+        assert [evt.args for evt in result.insert_events] == [{'lchannel': '#chan'}]
+        assert not plugin._joins
+        assert set(plugin.network.users) == {'bot'}
+
+    def test_rejoin_timeout(self, make_plugin, loop):
+        plugin = make_plugin(warm_resync=True, warm_resync_timeout=0.01)
+        join(plugin, loop, 'bot alice')
+        plugin.on_disconnected()
+        plugin.network._reset()
+        plugin.network.nickname = 'bot'
+
+        plugin.on_welcome(msg(':srv 001 bot :Welcome'))
+        loop.run_until_complete(asyncio.sleep(0.02))
+        assert len(plugin.network.event_queue.get_batch_nowait()) == 1
+
+        result = plugin.on_resync_expired()
+        assert [evt.args for evt in result.insert_events] == [{'lchannel': '#chan'}]
+        assert not plugin._resyncing
+        assert not plugin._joins
+        # nothing left to expire
+        assert plugin.on_resync_expired() is None
+
+    def test_rejoin_timeout_cancelled(self, make_plugin, loop):
+        plugin = make_plugin(warm_resync=True, warm_resync_timeout=0.01)
+        join(plugin, loop, 'bot alice')
+        plugin.on_disconnected()
+        plugin.network._reset()
+        plugin.on_welcome(msg(':srv 001 bot :Welcome'))
+        plugin.on_disconnected()
+        plugin.network._reset()
+        loop.run_until_complete(asyncio.sleep(0.02))
+        assert plugin.network.event_queue.empty()
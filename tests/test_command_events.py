@@ -0,0 +1,98 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from shanghai.channel import Channel
+from shanghai.core_plugins.command import ChannelCommandPlugin, NetworkCommandPlugin
+from shanghai.event import build_event, command_event
+from shanghai.irc import Message
+from shanghai.irc.message import ChannelMessage, PrivateMessage
+from shanghai.plugin_base import ChannelEventName, NetworkEventName
+
+from .test_network import make_network
+
+
+@pytest.fixture
+def loop():
+    return asyncio.get_event_loop()
+
+
+class EchoPlugin:
+
+    def __init__(self):
+        self.received = []
+
+    @command_event('!echo')
+    def on_echo(self, message):
+        self.received.append(message)
+
+
+def dispatch(dispatcher, loop, name, message):
+    return loop.run_until_complete(dispatcher.dispatch(build_event(name, message=message)))
+
+
+@pytest.fixture
+def network(loop):
+    network = make_network(loop, [6667])
+    network._event_dispatcher.register_plugin(NetworkCommandPlugin(network, network.logger))
+    return network
+
+
+@pytest.fixture
+def channel(network):
+    channel = Channel(network, '#chan', {})
+    channel._event_dispatcher.register_plugin(ChannelCommandPlugin(channel))
+    return channel
+
+
+class TestCommandRouting:
+
+    def test_channel(self, channel, loop):
+        echo = EchoPlugin()
+        channel._event_dispatcher.register_plugin(echo)
+        message = ChannelMessage.from_message(Message.from_line(':a!u@h PRIVMSG #chan :!echo hi'))
+        dispatch(channel._event_dispatcher, loop, ChannelEventName.MESSAGE, message)
+        assert echo.received == [message]
+
+    def test_private(self, network, loop):
+        echo = EchoPlugin()
+        network._event_dispatcher.register_plugin(echo)
+        message = PrivateMessage.from_message(Message.from_line(':a!u@h PRIVMSG bot :!echo hi'))
+        dispatch(network._event_dispatcher, loop, NetworkEventName.PRIVATE_MESSAGE, message)
+        assert echo.received == [message]
+
+    @pytest.mark.parametrize('text', ['echo hi', 'hi !echo', '!echoes', '!other', ' ', ''])
+    def test_no_command(self, channel, loop, text):
+        echo = EchoPlugin()
+        channel._event_dispatcher.register_plugin(echo)
+        message = ChannelMessage.from_message(Message.from_line(f':a!u@h PRIVMSG #chan :{text}'))
+        plugin = ChannelCommandPlugin(channel)
+        # no event is built at all
+        assert plugin.on_channel_message(message) is None
+        dispatch(channel._event_dispatcher, loop, ChannelEventName.MESSAGE, message)
+        assert echo.received == []
+
+    def test_private_no_command(self, network):
+        network._event_dispatcher.register_plugin(EchoPlugin())
+        plugin = NetworkCommandPlugin(network, network.logger)
+        for text in ['echo hi', '!other']:
+            message = PrivateMessage.from_message(Message.from_line(f':a!u@h PRIVMSG bot :{text}'))
+            assert plugin.on_private_message(message) is None
@@ -0,0 +1,67 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import mock
+
+import pytest
+
+from shanghai.irc import ServerReply
+from shanghai.irc.commands import CommandTable
+
+
+@pytest.fixture
+def table():
+    return CommandTable()
+
+
+class TestCommandTable:
+
+    @pytest.mark.parametrize('raw', [b'PRIVMSG', 'PRIVMSG', b'privmsg', 'PrivMsg', b'pRiVmSg'])
+    def test_verb(self, table, raw):
+        command = table.lookup(raw)
+        assert command == 'PRIVMSG'
+        assert type(command) is str
+        assert command is table.lookup('PRIVMSG')
+
+    @pytest.mark.parametrize('raw', [b'001', '001'])
+    def test_numeric(self, table, raw):
+        assert table.lookup(raw) is ServerReply.RPL_WELCOME
+
+    def test_alias(self, table):
+        assert table.lookup(b'005') is ServerReply.RPL_ISUPPORT
+
+    def test_unknown_numeric(self, table):
+        with mock.patch('shanghai.irc.commands.get_default_logger') as get_logger:
+            command = table.lookup(b'1234', b':prefix 1234 foo')
+            assert command == '1234'
+            assert table.lookup(b'1234') is command
+            assert table.lookup('1234') is command
+        assert get_logger.return_value.warning.call_count == 1
+
+    def test_unknown_command(self, table):
+        command = table.lookup(b'foo')
+        assert command == 'FOO'
+        assert table.lookup(b'FOO') is command
+
+    def test_max_dynamic_entries(self):
+        table = CommandTable(max_dynamic_entries=2)  # b'FOO' and 'FOO'
+        table.lookup(b'FOO')
+        table.lookup(b'BAR')
+        assert b'FOO' in table._table
+        assert b'BAR' not in table._table
+        assert table.lookup(b'BAR') == 'BAR'
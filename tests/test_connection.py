@@ -0,0 +1,236 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from shanghai.config import ConfigurationError, Server
+from shanghai.connection import Connection, ProtocolConnection, get_connection_class
+from shanghai.event_queue import EventQueue
+from shanghai.limits import LineLimiter
+from shanghai.overload import LoadShedder
+from shanghai.plugin_base import NetworkEventName
+from shanghai.scheduler import OutboundScheduler
+
+
+@pytest.fixture
+def loop():
+    return asyncio.get_event_loop()
+
+
+CHUNKS = [b':server 001 nick :Welcome\r\nPING :ser', b'ver\r\n', b'\r\nPRIVMSG #chan :hi\n']
+
+
+async def serve_chunks(reader, writer):
+    for chunk in CHUNKS:
+        writer.write(chunk)
+        await writer.drain()
+        await asyncio.sleep(0.01)
+    writer.close()
+
+
+async def run_connection(connection_class, loop, maxsize=0):
+    server = await asyncio.start_server(serve_chunks, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    queue = EventQueue(maxsize)
+    connection = connection_class(Server('127.0.0.1', port), queue, loop)
+    task = loop.create_task(connection.run())
+
+    events = []
+    while not events or events[-1].name != NetworkEventName.DISCONNECTED:
+        events.extend(await queue.get_batch())
+        # be slower than the server
+        await asyncio.sleep(0.02)
+
+    await task
+    server.close()
+    await server.wait_closed()
+    return events
+
+
+@pytest.mark.parametrize('maxsize', [0, 1])
+@pytest.mark.parametrize('connection_class', [Connection, ProtocolConnection])
+def test_run(connection_class, maxsize, loop):
+    events = loop.run_until_complete(run_connection(connection_class, loop, maxsize))
+
+    assert events[0].name == NetworkEventName.CONNECTED
+    assert events[-1].name == NetworkEventName.DISCONNECTED
+    lines = [line for event in events[1:-1] for line in event.args['raw_lines']]
+    assert all(event.name == NetworkEventName.RAW_LINES for event in events[1:-1])
+    assert lines == [b':server 001 nick :Welcome', b'PING :server', b'PRIVMSG #chan :hi']
+
+
+class FakeTransport:
+
+    def __init__(self):
+        self.buffer_size = 0
+        self.closing = False
+
+    def get_write_buffer_size(self):
+        return self.buffer_size
+
+    def is_closing(self):
+        return self.closing
+
+    def get_extra_info(self, name, default=None):
+        return default
+
+
+class FakeWriter:
+
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.writes = []
+        self.can_drain = asyncio.Event()
+
+    def write(self, data):
+        self.writes.append(data)
+        self.transport.buffer_size += len(data)
+
+    async def drain(self):
+        await self.can_drain.wait()
+        self.transport.buffer_size = 0
+
+    def close(self):
+        self.transport.closing = True
+
+
+class TestWrite:
+
+    @pytest.fixture
+    def connection(self, loop):
+        connection = Connection(Server('localhost', 6667), EventQueue(), loop, high_water=10)
+        connection.writer = FakeWriter()
+        yield connection
+        # let pending drain tasks finish
+        connection.writer.can_drain.set()
+        loop.run_until_complete(asyncio.sleep(0.01))
+
+    def test_coalesce(self, connection, loop):
+        connection.writeline(b'PING a')
+        connection.writeline(b'PING b')
+        assert connection.writer.writes == []
+        assert connection.buffered_bytes == 16
+
+        loop.run_until_complete(asyncio.sleep(0))
+        assert connection.writer.writes == [b'PING a\r\nPING b\r\n']
+        assert connection.buffered_bytes == 16
+
+    def test_drain(self, connection, loop):
+        connection.writeline(b'PRIVMSG #chan :long line')
+        loop.run_until_complete(asyncio.sleep(0))
+        assert len(connection.writer.writes) == 1
+
+        # held back until the transport drained
+        connection.writeline(b'PING')
+        loop.run_until_complete(asyncio.sleep(0))
+        assert len(connection.writer.writes) == 1
+        assert connection.buffered_bytes == 26 + 6
+
+        connection.writer.can_drain.set()
+        loop.run_until_complete(asyncio.sleep(0.01))
+        assert connection.writer.writes[1] == b'PING\r\n'
+
+    def test_on_drained(self, connection, loop):
+        drained = []
+        connection.on_drained = lambda: drained.append(connection.draining)
+        connection.writeline(b'PRIVMSG #chan :long line')
+        loop.run_until_complete(asyncio.sleep(0))
+        assert connection.draining
+
+        connection.writer.can_drain.set()
+        loop.run_until_complete(asyncio.sleep(0.01))
+        assert drained == [False]
+
+    def test_bounded(self, connection, loop):
+        # the scheduler holds lines back while the connection drains
+        scheduler = OutboundScheduler(connection.writeline, loop, rate=0,
+                                      writable=lambda: not connection.draining)
+        connection.on_drained = scheduler.resume
+        for i in range(1000):
+            scheduler.submit(b'PRIVMSG #chan :%d' % i)
+            loop.run_until_complete(asyncio.sleep(0))
+        assert len(connection.writer.writes) == 1
+        assert connection.buffered_bytes < 100
+        assert scheduler.queued == 999
+
+        connection.writer.can_drain.set()
+        loop.run_until_complete(asyncio.sleep(0.01))
+        assert scheduler.queued == 0
+        assert b''.join(connection.writer.writes).count(b'\r\n') == 1000
+
+    def test_flush(self, connection, loop):
+        connection.writeline(b'PRIVMSG #chan :long line')
+        loop.run_until_complete(asyncio.sleep(0))
+        connection.writeline(b'QUIT')
+        flush = loop.create_task(connection.flush())
+        loop.run_until_complete(asyncio.sleep(0.01))
+        assert not flush.done()
+
+        connection.writer.can_drain.set()
+        loop.run_until_complete(flush)
+        assert connection.writer.writes[1] == b'QUIT\r\n'
+
+    def test_close(self, connection, loop):
+        connection.writeline(b'QUIT')
+        connection.close()
+        assert connection.writer.writes == [b'QUIT\r\n']
+        assert connection.writer.transport.closing
+
+
+def test_feed_overloaded(loop):
+    shedder = LoadShedder(3, 'shed')
+    connection = Connection(Server('localhost', 6667), EventQueue(loop=loop), loop,
+                            shedder=shedder)
+    data = b'PING :a\r\nPRIVMSG #chan :hi\r\n'
+    assert connection._feed(data).args['raw_lines'] == [b'PING :a', b'PRIVMSG #chan :hi']
+    # counts lines, not events
+    assert len(connection._feed(data).args['raw_lines']) == 2
+    assert shedder.pending == 4
+    assert connection._feed(data).args['raw_lines'] == [b'PING :a']
+    assert connection._feed(b'NOTICE #chan :hi\r\n') is None
+    assert shedder.pending == 5
+
+    shedder.processed(4)
+    assert len(connection._feed(data).args['raw_lines']) == 2
+
+
+@pytest.mark.parametrize('policy, expected', [
+    ('truncate', [b'PRIVMSG #c :01234', b'PING :a', b'PRIVMSG #c :abcde', b'PING :b']),
+    ('drop', [b'PING :a', b'PING :b']),
+])
+def test_feed_oversized(policy, expected, loop):
+    limiter = LineLimiter(17, policy)
+    connection = Connection(Server('localhost', 6667), EventQueue(loop=loop), loop,
+                            line_limiter=limiter)
+    lines = []
+    for data in [b'PRIVMSG #c :0123456789\r\nPING :a\r\n', b'PRIVMSG #c :abcdefgh' * 500,
+                 b'ijklmn' * 500, b'\r\nPING :b\r\n']:
+        event = connection._feed(data)
+        if event:
+            lines.extend(event.args['raw_lines'])
+    assert lines == expected
+    assert sum(limiter.counts.values()) == 2
+
+
+def test_get_connection_class():
+    assert get_connection_class('stream') is Connection
+    assert get_connection_class('protocol') is ProtocolConnection
+    with pytest.raises(ConfigurationError):
+        get_connection_class('carrier pigeon')
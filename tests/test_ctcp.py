@@ -0,0 +1,119 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from shanghai.core_plugins.ctcp import ParseCtcpPlugin
+from shanghai.irc import Message, ctcp
+
+from .test_network import make_network
+
+
+@pytest.fixture
+def loop():
+    return asyncio.get_event_loop()
+
+
+@pytest.mark.parametrize(
+    'text, quoted',
+    [
+        ('VERSION', 'VERSION'),
+        ('a\0b', 'a\x100b'),
+        ('line\r\nbreak', 'line\x10r\x10nbreak'),
+        ('\x10', '\x10\x10'),
+        ('\x10n', '\x10\x10n'),
+    ]
+)
+def test_quote(text, quoted):
+    assert ctcp.quote(text) == quoted
+    assert ctcp.dequote(quoted) == text
+
+
+def test_dequote_invalid():
+    assert ctcp.dequote('a\x10xb') == 'axb'
+    assert ctcp.dequote('trailing\x10') == 'trailing'
+
+
+def test_is_ctcp():
+    assert ctcp.is_ctcp('\x01VERSION\x01')
+    assert not ctcp.is_ctcp('VERSION')
+    assert not ctcp.is_ctcp('')
+
+
+@pytest.mark.parametrize(
+    'text, segments',
+    [
+        ('\x01VERSION\x01', ['VERSION']),
+        ('\x01PING 1\x01\x01TIME\x01', ['PING 1', 'TIME']),
+        ('\x01PING 1\x01 text \x01TIME\x01 more text', ['PING 1', 'TIME']),
+        # unterminated
+        ('\x01VERSION', []),
+        ('\x01PING 1\x01\x01TIME', ['PING 1']),
+        ('\x01\x01', ['']),
+        ('\x01ACTION new\x10nline\x01', ['ACTION new\nline']),
+        ('text \x01VERSION\x01', []),
+    ]
+)
+def test_split_segments(text, segments):
+    assert ctcp.split_segments(text) == segments
+
+
+def test_split_segments_limit():
+    text = '\x01A\x01' * 10
+    assert ctcp.split_segments(text, 3) == ['A', 'A', 'A']
+    assert len(ctcp.split_segments(text)) == 10
+
+
+def test_frame():
+    assert ctcp.frame('VERSION') == '\x01VERSION\x01'
+    assert ctcp.frame('ACTION', 'a\nb') == '\x01ACTION a\x10nb\x01'
+    assert ctcp.split_segments(ctcp.frame('ACTION', 'a\nb')) == ['ACTION a\nb']
+
+
+class TestParseCtcpPlugin:
+
+    def make_plugin(self, loop, **ctcp_config):
+        network = make_network(loop, [6667], ctcp=ctcp_config)
+        return ParseCtcpPlugin(network, network.logger)
+
+    @staticmethod
+    def count(plugin, line):
+        result = plugin.privmsg(Message.from_line(line))
+        return len(result.insert_events) if result else 0
+
+    def test_per_host(self, loop):
+        plugin = self.make_plugin(loop, burst=2, interval=60, global_interval=0)
+        lines = [':a!u@host1 PRIVMSG bot :\x01VERSION\x01'] * 3
+        assert sum(self.count(plugin, line) for line in lines) == 2
+        assert self.count(plugin, ':b!u@host2 PRIVMSG bot :\x01VERSION\x01') == 1
+        assert self.count(plugin, ':a!u@host1 PRIVMSG bot :\x01ACTION waves\x01') == 1
+
+    def test_global(self, loop):
+        plugin = self.make_plugin(loop, burst=1, interval=60, global_burst=5, global_interval=60)
+        lines = [f':n{i}!u@host{i} PRIVMSG bot :\x01VERSION\x01' for i in range(50)]
+        assert sum(self.count(plugin, line) for line in lines) == 5
+        # ACTIONs are never limited
+        assert self.count(plugin, ':x!u@hostx PRIVMSG #chan :\x01ACTION waves\x01') == 1
+
+    def test_global_not_used_up_by_one_host(self, loop):
+        plugin = self.make_plugin(loop, burst=1, interval=60, global_burst=2, global_interval=60)
+        for _ in range(10):
+            self.count(plugin, ':a!u@host1 PRIVMSG bot :\x01VERSION\x01')
+        assert self.count(plugin, ':b!u@host2 PRIVMSG bot :\x01VERSION\x01') == 1
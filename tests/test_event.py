@@ -227,6 +227,13 @@ class TestEventDecorator:
         h_info = on_test._h_info
         assert h_info.priority is event.Priority.CORE
 
+    def test_command_event_deco(self):
+        @event.command_event('!test')
+        def on_test(self):
+            pass
+
+        assert on_test._h_info.event_name == event.COMMAND_PREFIX + '!test'
+
     def test_non_callable(self):
         with pytest.raises(TypeError) as excinfo:
             event.event(123)
@@ -411,7 +418,81 @@ class TestEventDispatcher:
         loop.run_until_complete(dispatcher.dispatch(evt))
         assert called == 0
 
-    # TODO test disabled
+    def test_compile(self, dispatcher, evt):
+        @event.event(evt.name, priority=event.Priority.CORE)
+        async def corofunc():
+            pass
+
+        @event.event(evt.name, priority=event.Priority.CORE)
+        def handler():
+            pass
+
+        @event.event(evt.name, priority=1)
+        def handler2():
+            pass
+
+        for func in (corofunc, handler, handler2):
+            dispatcher.register(event.HandlerInstance.from_handler(func))
+        assert dispatcher.plans[evt.name] == (
+            (1, (), (handler2,), (handler2,)),
+            (event.Priority.CORE, (corofunc,), (handler,), (corofunc, handler)),
+        )
+        assert dispatcher.plans[evt.name][1].priority is event.Priority.CORE
+
+    def test_enable_disable(self, dispatcher, loop, evt):
+        called = 0
+
+        @event.event(evt.name, enable=False)
+        def handler():
+            nonlocal called
+            called += 1
+
+        h_inst = event.HandlerInstance.from_handler(handler)
+        dispatcher.register(h_inst)
+        assert not dispatcher.has_handlers(evt.name)
+
+        h_inst.enable()
+        assert dispatcher.has_handlers(evt.name)
+        loop.run_until_complete(dispatcher.dispatch(evt))
+        assert called == 1
+
+        h_inst.disable()
+        assert not dispatcher.has_handlers(evt.name)
+        loop.run_until_complete(dispatcher.dispatch(evt))
+        assert called == 1
+
+    def test_disabled_level(self, dispatcher, loop, evt):
+        called = []
+
+        @event.event(evt.name, priority=1, enable=False)
+        def handler():
+            called.append(handler)
+
+        @event.event(evt.name, priority=0)
+        def handler2():
+            called.append(handler2)
+
+        dispatcher.register(event.HandlerInstance.from_handler(handler))
+        dispatcher.register(event.HandlerInstance.from_handler(handler2))
+        loop.run_until_complete(dispatcher.dispatch(evt))
+        assert called == [handler2]
+
+    def test_unregister(self, dispatcher, evt):
+        @event.event(evt.name)
+        def handler():
+            pass
+
+        h_inst = event.HandlerInstance.from_handler(handler)
+        dispatcher.register(h_inst)
+        assert h_inst.dispatcher is dispatcher
+        dispatcher.unregister(h_inst)
+        assert evt.name not in dispatcher.event_map
+        assert not dispatcher.has_handlers(evt.name)
+
+        # no longer updates the dispatcher
+        h_inst.disable()
+        h_inst.enable()
+        assert not dispatcher.plans
 
     def test_dispatch_exception(self, loop, evt):
         logger = mock.Mock(Logger)
@@ -437,6 +518,65 @@ class TestEventDispatcher:
         assert called == 2
         assert logger.exception.call_count == 2
 
+    @pytest.mark.skipif(not event._AWAIT_LONE_HANDLER, reason="requires Task.cancelling")
+    def test_dispatch_lone_coroutine(self, dispatcher, loop, evt):
+        current_task = getattr(asyncio, 'current_task', None) or asyncio.Task.current_task
+        tasks = []
+
+        @event.event(evt.name, priority=1)
+        async def corofunc():
+            tasks.append(current_task())
+
+        @event.event(evt.name, priority=0)
+        async def corofunc2():
+            tasks.append(current_task())
+
+        @event.event(evt.name, priority=0)
+        async def corofunc3():
+            tasks.append(current_task())
+
+        for func in (corofunc, corofunc2, corofunc3):
+            dispatcher.register(event.HandlerInstance.from_handler(func))
+
+        async def test():
+            await dispatcher.dispatch(evt)
+            return current_task()
+
+        outer = loop.run_until_complete(test())
+        # awaited directly, but level 0 is run concurrently
+        assert tasks[0] is outer
+        assert outer not in tasks[1:]
+        assert tasks[1] is not tasks[2]
+
+    def test_dispatch_cancelled(self, dispatcher, loop, evt):
+        @event.event(evt.name)
+        async def corofunc():
+            await asyncio.sleep(10)
+
+        dispatcher.register(event.HandlerInstance.from_handler(corofunc))
+        task = asyncio.ensure_future(dispatcher.dispatch(evt))
+        loop.call_soon(task.cancel)
+        with pytest.raises(asyncio.CancelledError):
+            loop.run_until_complete(task)
+
+    def test_dispatch_handler_cancelled(self, loop, evt):
+        logger = mock.Mock(Logger)
+        logger.isEnabledFor.return_value = False
+        dispatcher = event.EventDispatcher(logger=logger)
+
+        @event.event(evt.name)
+        async def corofunc():
+            future = loop.create_future()
+            future.cancel()
+            await future
+
+        dispatcher.register(event.HandlerInstance.from_handler(corofunc))
+        task = asyncio.ensure_future(dispatcher.dispatch(evt))
+        # isolated like any other exception
+        loop.run_until_complete(task)
+        assert not task.cancelled()
+        assert logger.exception.call_count == 1
+
     def test_dispatch_unknown_return(self, loop, evt):
         logger = mock.Mock(Logger)
         dispatcher = event.EventDispatcher(logger=logger)
@@ -0,0 +1,108 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from shanghai.event_queue import EventQueue
+
+
+@pytest.fixture
+def loop():
+    return asyncio.get_event_loop()
+
+
+class TestEventQueue:
+
+    def test_nowait(self):
+        queue = EventQueue()
+        assert queue.empty()
+        queue.put_nowait(1)
+        queue.put_many_nowait([2, 3, 4])
+        assert len(queue) == 4
+        assert queue.get_nowait() == 1
+        assert queue.get_batch_nowait(2) == [2, 3]
+        assert queue.get_batch_nowait() == [4]
+        assert queue.get_batch_nowait() == []
+        with pytest.raises(asyncio.QueueEmpty):
+            queue.get_nowait()
+
+    def test_stats(self):
+        queue = EventQueue(10)
+        queue.put_many_nowait(range(5))
+        queue.get_batch_nowait()
+        queue.put_nowait(5)
+        assert queue.stats() == (1, 10, 5, 6, 1)
+
+    def test_requeue(self):
+        queue = EventQueue()
+        queue.put_many_nowait([1, 2, 3])
+        batch = queue.get_batch_nowait()
+        queue.put_nowait(4)
+        queue.requeue(batch[1:])
+        assert queue.get_batch_nowait() == [2, 3, 4]
+
+    def test_get_batch(self, loop):
+        queue = EventQueue()
+
+        async def producer():
+            await asyncio.sleep(0.01)
+            queue.put_nowait(1)
+            queue.put_many_nowait([2, 3])
+
+        async def consumer():
+            return await queue.get_batch()
+
+        batch, _ = loop.run_until_complete(asyncio.gather(consumer(), producer()))
+        assert batch == [1, 2, 3]
+        assert queue.batches == 1
+
+    def test_bounded(self, loop):
+        queue = EventQueue(2)
+        queue.put_many_nowait([1, 2, 3])
+        assert queue.full()
+        batches = []
+
+        async def producer():
+            await queue.put_many([4, 5, 6])
+            await queue.put(7)
+
+        async def consumer():
+            while sum(map(len, batches)) < 7:
+                batches.append(await queue.get_batch())
+                assert len(queue) <= 2
+                await asyncio.sleep(0.01)
+
+        loop.run_until_complete(asyncio.gather(consumer(), producer()))
+        assert [item for batch in batches for item in batch] == [1, 2, 3, 4, 5, 6, 7]
+        assert batches[0] == [1, 2, 3]
+        assert all(len(batch) <= 2 for batch in batches[1:])
+
+    def test_cancelled_getter(self, loop):
+        queue = EventQueue()
+
+        async def run():
+            getter = loop.create_task(queue.get())
+            other = loop.create_task(queue.get())
+            await asyncio.sleep(0)
+            queue.put_nowait(1)
+            getter.cancel()
+            return await other
+
+        assert loop.run_until_complete(run()) == 1
@@ -0,0 +1,152 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from shanghai.config import Server
+from shanghai.connection import Connection
+from shanghai.event_queue import EventQueue
+from shanghai.helpers import InboundDeduplicator
+from shanghai.plugin_base import NetworkEventName
+from shanghai.scheduler import OutboundScheduler
+
+from .test_connection import FakeWriter
+from .test_network import make_network
+
+
+@pytest.fixture
+def loop():
+    return asyncio.get_event_loop()
+
+
+class TestInboundDeduplicator:
+
+    def test_offer(self):
+        dedupe = InboundDeduplicator()
+        a, b = dedupe.source().index, dedupe.source().index
+        line = b':nick!u@h PRIVMSG #chan :hi'
+        assert dedupe.offer(a, line)
+        assert not dedupe.offer(b, line)
+        # said twice, whichever connection sees it first
+        assert dedupe.offer(b, b'@time=x ' + line)
+        assert not dedupe.offer(a, b'@time=y ' + line)
+        assert dedupe.duplicates == 2
+
+    def test_maxsize(self):
+        dedupe = InboundDeduplicator(maxsize=2)
+        a, b = dedupe.source().index, dedupe.source().index
+        for line in (b'JOIN #a', b'JOIN #b', b'JOIN #c'):
+            assert dedupe.offer(a, line)
+        assert dedupe.offer(b, b'JOIN #a')
+        assert not dedupe.offer(b, b'JOIN #c')
+
+    def test_filter(self):
+        dedupe = InboundDeduplicator()
+        a, b = dedupe.source(), dedupe.source()
+        lines = [b'PING :x', b':srv 001 nick :Welcome', b':n!u@h JOIN #chan', b'TOPIC #chan :x']
+        assert a.filter(lines) == lines
+        assert b.filter(lines) == lines[:2]
+
+
+class TestHelperPool:
+
+    @pytest.fixture
+    def network(self, loop):
+        network = make_network(loop, [6667], helpers=dict(nicks=['h1', 'h2', 'h3']))
+        network.nickname = 'bot'
+        return network
+
+    def test_route(self, network):
+        pool = network.helpers
+        assert pool is not None
+        assert [helper.nickname for helper in pool.helpers] == ['h1', 'h2', 'h3']
+        # none registered yet
+        assert pool.route(b'PRIVMSG #chan :hi') is None
+
+        for helper in pool.helpers:
+            helper.registered = True
+            helper.channels.update(f'#chan{i}' for i in range(25))
+        pool.helpers[0].channels.add('#chan')
+        targets = ([f'#chan{i}'.encode() for i in range(50)]
+                   + [f'nick{i}'.encode() for i in range(50)])
+        routes = {target: pool.route(b'PRIVMSG ' + target + b' :hi') for target in targets}
+        assert set(routes[target] for target in targets[:25]) == {None, *pool.helpers}
+        # can't send to channels it isn't in
+        assert all(routes[target] is None for target in targets[25:50])
+        # users and services always get messages from the network's nickname
+        assert all(routes[target] is None for target in targets[50:])
+        assert pool.route(b'NOTICE NickServ :IDENTIFY pw') is None
+        assert pool.route(b'NOTICE #CHAN :hi') in (None, pool.helpers[0])
+        assert pool.route(b'JOIN #chan') is None
+        # stable
+        assert all(pool.route(b'PRIVMSG ' + target + b' :x') is routes[target]
+                   for target in targets)
+
+    def test_own_messages(self, network):
+        network.connected = True
+        helper = network.helpers.helpers[1]
+        helper._handle_lines([b':bot!u@h PRIVMSG #chan :!say hello',
+                              b'@t=1 :H1!u@h NOTICE #chan :hi',
+                              b':h3 TAGMSG #chan'])
+        assert network.event_queue.empty()
+
+        lines = [b':h2!u@h PRIVMSG #chan :hello', b':bot!u@h JOIN #chan',
+                 b':alice!u@h PRIVMSG #chan :hi']
+        assert network.helpers.primary.filter(lines) == lines[1:]
+
+    def test_handle_lines(self, network):
+        helper = network.helpers.helpers[0]
+        sent = []
+        helper.send_byteline = sent.append
+        network.channels['#chan'] = None
+        network.connected = True
+
+        helper._handle_lines([b':srv 433 * h1 :in use'])
+        helper._handle_lines([b':srv 001 h1_ :Welcome', b'PING :srv'])
+        assert helper.registered
+        assert helper.nickname == 'h1_'
+        assert sent == [b'NICK h1_', b'JOIN #chan', b'PONG srv']
+
+        network.helpers.primary.filter([b':alice!u@h PRIVMSG #chan :hi'])
+        helper._handle_lines([
+            b':h1_!u@h JOIN #chan',
+            b':alice!u@h PRIVMSG #chan :hi',
+            b':alice!u@h PRIVMSG h1_ :private',
+        ])
+        assert helper.channels == {'#chan'}
+        event = network.event_queue.get_nowait()
+        assert event.name == NetworkEventName.RAW_LINES
+        assert event.args['raw_lines'] == [b':h1_!u@h JOIN #chan']
+
+        helper._handle_lines([b':op!u@h KICK #chan h1_ :bye'])
+        assert not helper.channels
+
+    def test_stop_sends_quit(self, network, loop):
+        helper = network.helpers.helpers[0]
+        connection = helper._connection = Connection(Server('localhost', 6667), EventQueue(),
+                                                     loop)
+        connection.writer = FakeWriter()
+        helper._scheduler = OutboundScheduler(connection.writeline, loop)
+        helper.registered = True
+        helper._task = loop.create_task(asyncio.sleep(60))
+
+        loop.run_until_complete(helper.stop())
+        assert connection.writer.writes == [b'QUIT\r\n']
+        assert helper._task is None
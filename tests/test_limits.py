@@ -0,0 +1,69 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from shanghai.config import ConfigurationError
+from shanghai.limits import LineLimiter, LinePolicy
+
+LONG = b'PRIVMSG #chan :' + b'x' * 20
+
+
+class TestLineLimiter:
+
+    def test_exceeds(self):
+        limiter = LineLimiter(10)
+        assert not limiter.exceeds(b'x' * 10)
+        assert limiter.exceeds(b'x' * 11)
+        assert not limiter.exceeds(b'@' + b't' * 100 + b' PING :x')
+
+    def test_truncate(self):
+        limiter = LineLimiter(20, 'truncate')
+        assert limiter.apply(LONG) == [LONG[:20]]
+        assert limiter.apply(b'@tag ' + LONG) == [b'@tag ' + LONG[:20]]
+        assert limiter.stats() == {'truncate': 2}
+
+    def test_split(self):
+        limiter = LineLimiter(25, LinePolicy.SPLIT)
+        assert limiter.apply(LONG) == [LONG[:25], b'PRIVMSG #chan :' + b'x' * 10]
+        # can't split, so truncate
+        assert limiter.apply(b'PRIVMSG #a-very-long-channel :hi') == [b'PRIVMSG #a-very-long-chan']
+        assert limiter.stats() == {'split': 1, 'truncate': 1}
+
+    def test_drop(self):
+        limiter = LineLimiter(20, 'drop')
+        assert limiter.apply(LONG) == []
+        assert limiter.apply_partial(LONG) == []
+        assert limiter.stats() == {'drop': 2}
+
+    def test_filter(self):
+        limiter = LineLimiter(20, 'drop')
+        lines = [b'PING :x', b'PING :y']
+        assert limiter.filter(lines) is lines
+        assert limiter.filter([b'PING :x', LONG, b'PING :y']) == lines
+
+    def test_apply_partial(self):
+        limiter = LineLimiter(20, 'split')
+        assert limiter.apply_partial(LONG) == [LONG[:20]]
+        assert limiter.stats() == {'truncate': 1}
+
+    def test_invalid_policy(self):
+        with pytest.raises(ConfigurationError):
+            LineLimiter(10, 'shorten')
+        with pytest.raises(ConfigurationError):
+            LineLimiter(10, 'split', allowed_policies=(LinePolicy.TRUNCATE, LinePolicy.DROP))
@@ -18,8 +18,11 @@
 
 import pytest
 
-from shanghai.irc import Prefix, Message, ServerReply
-from shanghai.irc.message import CtcpMessage, TextMessage
+from shanghai.irc import LazyMessage, Prefix, PrefixCache, Message, ServerReply
+from shanghai.irc.message import (
+    CtcpMessage, TextMessage, body_length, split_lines, split_long_line, split_text,
+    truncate_bytes,
+)
 
 
 class TestPrefix:
@@ -44,6 +47,51 @@ class TestPrefix:
         assert str(prefix) == string.lstrip(':')
 
 
+class TestPrefixCache:
+
+    def test_from_string(self):
+        cache = PrefixCache(2)
+        prefix = cache.from_string('nick!user@host')
+        assert prefix == ('nick', 'user', 'host')
+        assert cache.from_string('nick!user@host') is prefix
+        assert cache.info() == (1, 1, 2, 1)
+
+    def test_from_bytes(self):
+        cache = PrefixCache(2)
+        prefix = cache.from_bytes(b'n\xc3\xafck!user@host')
+        assert prefix == ('nïck', 'user', 'host')
+        assert cache.from_bytes(b'n\xc3\xafck!user@host') is prefix
+        # one shared cache for both entry points
+        assert cache.from_string(':nïck!user@host') is prefix
+        assert cache.info() == (2, 1, 2, 1)
+
+    def test_bounded_shared(self):
+        cache = PrefixCache(2)
+        for prefix in ('a', 'b', 'c'):
+            cache.from_string(prefix)
+            cache.from_bytes(prefix.encode())
+        assert cache.info().currsize == 2
+
+    def test_bounded(self):
+        cache = PrefixCache(2)
+        first = cache.from_string('a')
+        cache.from_string('b')
+        cache.from_string('c')
+        assert cache.info().currsize == 2
+        assert cache.from_string('a') is not first
+
+        cache.clear()
+        assert cache.info() == (0, 0, 2, 0)
+
+    def test_messages(self):
+        cache = PrefixCache()
+        line = b':nick!user@host PRIVMSG #channel :text'
+        m1 = Message.from_bytes(line, prefix_cache=cache)
+        m2 = LazyMessage.from_bytes(line, prefix_cache=cache)
+        assert m1.prefix is m2.prefix
+        assert cache.info().hits == 1
+
+
 class TestMessage:
 
     def test_privmsg(self):
@@ -80,10 +128,52 @@ class TestMessage:
                           'tag2': 'val\nue2',
                           'tag3': True}
 
+    def test_tags_limit(self):
+        line = '@tag=' + 'x' * 9000 + ' CMD p1'
+        for m in (Message.from_line(line), Message.from_bytes(line.encode())):
+            assert m.tags == {}
+            assert m.params == ['p1']
+
     def test_edge_cases(self):
         m = Message.from_line(':prefix COMMAND')
         assert m.params == []
 
+    @pytest.mark.parametrize(
+        'line',
+        [
+            ':nick!user@host PRIVMSG #channel :Some message',
+            'PRIVMSG #channel :message test',
+            ':prefix 001 params',
+            '@tag=value;tag2=val\\nue2;tag3 :prefix CMD p1 :p2 long',
+            '@tag=value CMD',
+            ':prefix COMMAND',
+            ': PING',
+            'PING',
+        ]
+    )
+    def test_from_bytes(self, line):
+        m = Message.from_bytes(line.encode('utf-8'))
+        expected = Message.from_line(line)
+        assert m.command == expected.command
+        assert m.prefix == expected.prefix
+        assert m.params == expected.params
+        assert m.tags == expected.tags
+        assert m.raw_line == line.encode('utf-8')
+
+    def test_from_bytes_encoding(self):
+        line = ':nick!user@host PRIVMSG #chän :f\xfc\xfc'.encode('utf-8')[:-4] + b'\xfc\xfc'
+        m = Message.from_bytes(line, 'utf-8', 'latin1')
+        # only the broken field uses the fallback encoding
+        assert m.params == ['#chän', 'füü']
+
+        m = Message.from_bytes(memoryview(b'PRIVMSG #channel :text'))
+        assert m.params == ['#channel', 'text']
+
+    def test_peek_command(self):
+        assert Message.peek_command(b'@a=b :prefix PRIVMSG #channel :text') == b'PRIVMSG'
+        assert Message.peek_command(b'PING :server') == b'PING'
+        assert Message.peek_command(b':prefix 001') == b'001'
+
     def test_escape(self):
         s = Message.escape('hello world\r\nfoo\\bar;=')
         assert s == 'hello\\sworld\\r\\nfoo\\\\bar\\:='
@@ -105,6 +195,167 @@ class TestMessage:
         )
 
 
+class TestLazyMessage:
+
+    line = b'@tag=val\\sue;tag2 :nick!user@host TOPIC #channel :Some message'
+
+    def test_lazy(self):
+        m = LazyMessage.from_bytes(self.line)
+        assert isinstance(m, LazyMessage)
+        assert m.command == 'TOPIC'
+        assert not {'prefix', 'params', 'tags'} & vars(m).keys()
+
+        assert m.params == ['#channel', 'Some message']
+        assert 'params' in vars(m)
+        assert 'prefix' not in vars(m)
+        assert m.params is m.params
+
+        assert m.prefix == ('nick', 'user', 'host')
+        assert m.tags == {'tag': 'val ue', 'tag2': True}
+
+    def test_missing_fields(self):
+        m = LazyMessage.from_bytes(b'PING')
+        assert m.command == 'PING'
+        assert m.prefix is None
+        assert m.params == []
+        assert m.tags == {}
+
+    def test_numeric(self):
+        m = LazyMessage.from_bytes(b':prefix 001 params')
+        assert m.command == ServerReply.RPL_WELCOME
+
+    def test_tuple_behavior(self):
+        m = LazyMessage.from_bytes(self.line)
+        expected = Message.from_bytes(self.line)
+        assert m == expected
+        assert tuple(m) == tuple(expected)
+        assert m._asdict() == expected._asdict()
+        assert m[2] == expected.params
+        assert m._replace(command='NOTICE').params == expected.params
+
+    def test_eager(self):
+        line = self.line.replace(b'TOPIC', b'PRIVMSG')
+        m = LazyMessage.from_bytes(line)
+        assert type(m) is Message
+        assert m == Message.from_bytes(line)
+
+    def test_derived_messages(self):
+        m = LazyMessage.from_bytes(b':nick!user@host PRIVMSG #channel :\001PING PONG\001')
+        cm = CtcpMessage.from_message(m)
+        assert cm.command == "PING"
+        assert cm.params == ["PONG"]
+        assert cm.prefix == ('nick', 'user', 'host')
+
+        tm = TextMessage.from_message(m)
+        assert tm.sender == "nick"
+        assert tm.target == "#channel"
+
+
+class TestParseMany:
+
+    def test_split_lines(self):
+        assert split_lines(b'a\r\nb\n\r\n\nc\r\nd') == ([b'a', b'b', b'c'], b'd')
+        assert split_lines(b'a\r\n') == ([b'a'], b'')
+        assert split_lines(memoryview(b'partial')) == ([], b'partial')
+
+    def test_body_length(self):
+        assert body_length(b'PING :x') == 7
+        assert body_length(b'@a=b;c PING :x') == 7
+        assert body_length(b'@a=b') == 0
+
+    def test_truncate_bytes(self):
+        data = "aäx€".encode()
+        assert truncate_bytes(data, 10) == data
+        assert truncate_bytes(data, 2) == b'a'
+        assert truncate_bytes(data, 3) == "aä".encode()
+        assert truncate_bytes(data, 6) == "aäx".encode()
+        assert truncate_bytes(b'\x80\x80\x80\x80\x80', 4) == b'\x80'
+
+    def test_split_long_line(self):
+        assert split_long_line(b'PRIVMSG #c :hello world', 15) \
+            == [b'PRIVMSG #c :hel', b'PRIVMSG #c :lo ', b'PRIVMSG #c :wor', b'PRIVMSG #c :ld']
+        assert split_long_line(b'@t PRIVMSG #c :hello', 15) \
+            == [b'@t PRIVMSG #c :hel', b'@t PRIVMSG #c :lo']
+        assert split_long_line(b'PRIVMSG #c hello', 14) \
+            == [b'PRIVMSG #c :he', b'PRIVMSG #c :ll', b'PRIVMSG #c :o']
+        assert split_long_line("PRIVMSG #c :ää".encode(), 15) \
+            == ["PRIVMSG #c :ä".encode(), "PRIVMSG #c :ä".encode()]
+        assert split_long_line(b'PRIVMSG #channel :hello', 15) == []
+        assert split_long_line(b'QUIT', 2) == []
+
+    def test_split_text(self):
+        assert split_text("hello world", 11) == ["hello world"]
+        assert split_text("hello world foo", 11) == ["hello world", "foo"]
+        assert split_text("hello world foo", 10) == ["hello", "world foo"]
+        assert split_text("abcdefghij klm", 4) == ["abcd", "efgh", "ij", "klm"]
+        assert split_text("a\nb\r\n\nc d", 2) == ["a", "b", "c", "d"]
+        assert split_text("\n\n", 5) == []
+        assert split_text("ä€ä", 4) == ["ä", "€", "ä"]
+        assert split_text("ä€ä", 5) == ["ä€", "ä"]
+        assert split_text("ää ää", 5, 'latin1') == ["ää ää"]
+        assert split_text("ää ää", 3, 'utf-16-le') == ["ä", "ä", "ä", "ä"]
+        assert split_text("x  y", 2) == ["x ", "y"]
+        # formatting codes and other characters that str.splitlines breaks at
+        text = "\x1ditalic\x1d \x1estrike\x1e\x0b\x0c\x1c\x85\u2028\u2029"
+        assert split_text(text, 100) == [text]
+        assert split_text("a\r\rb", 5) == ["a", "b"]
+        with pytest.raises(ValueError):
+            split_text("text", 0)
+
+    @pytest.mark.parametrize('params', [
+        'a  b', 'a ', 'a  ', ':x', 'a :b c', '', 'a  :b', 'a b:c', ' a', '  ', ' :x', 'a::b :c :d',
+    ])
+    def test_from_bytes_params(self, params):
+        line = f'CMD {params}'.replace('a', 'ä')
+        expected = Message.from_line(line).params
+        assert Message.from_bytes(line.encode()).params == expected
+        # not UTF-8, so decoded field by field
+        assert Message.from_bytes(line.encode('latin1')).params == expected
+
+
+class TestToBytes:
+
+    @pytest.mark.parametrize(
+        'line',
+        [
+            ':nick!user@host PRIVMSG #channel :Some message',
+            'PRIVMSG #channel text',
+            'PING',
+            ':prefix 001 nick :Welcome here',
+            '@msgid=abc;+reply=a\\sb;flag :nick PRIVMSG #channel text',
+        ]
+    )
+    def test_roundtrip(self, line):
+        assert Message.from_line(line).to_bytes() == line.encode('utf-8')
+
+    def test_trailing(self):
+        assert Message('PART', params=['#channel', '']).to_bytes() == b'PART #channel :'
+        assert Message('PRIVMSG', params=['#c', ':)']).to_bytes() == b'PRIVMSG #c ::)'
+        assert Message('PRIVMSG', params=['#c', 'a b']).to_bytes() == b'PRIVMSG #c :a b'
+
+    def test_encoding(self):
+        m = Message('PRIVMSG', params=['#chän', 'fü'])
+        assert m.to_bytes() == b'PRIVMSG #ch\xc3\xa4n f\xc3\xbc'
+        assert m.to_bytes('latin1') == b'PRIVMSG #ch\xe4n f\xfc'
+
+    @pytest.mark.parametrize(
+        'message',
+        [
+            Message('PRIVMSG', params=['#channel', 'line\r\nQUIT']),
+            Message('PRIVMSG', params=['#chan nel', 'text']),
+            Message('PRIVMSG', params=[':channel', 'text']),
+            Message('PRIVMSG', params=['', 'text']),
+            Message('PRIVMSG', params=['#channel\0', 'text']),
+            Message('PRI VMSG'),
+            Message(''),
+            Message('PRIVMSG', tags={'in valid': True}),
+        ]
+    )
+    def test_invalid(self, message):
+        with pytest.raises(ValueError):
+            message.to_bytes()
+
+
 class TestCtcpMessage:
 
     def test_message(self):
@@ -127,6 +378,32 @@ class TestCtcpMessage:
         m = Message.from_line(':nick!user@host PRIVMSG #channel :\001 or this\001')
         assert CtcpMessage.from_message(m) is None
 
+        m = Message.from_line(':nick!user@host PRIVMSG #channel')
+        assert CtcpMessage.from_message(m) is None
+
+    def test_split_message(self):
+        m = Message.from_line(':nick!user@host PRIVMSG nick :\001PING 1\001 hi \001TIME\001')
+        cms = CtcpMessage.split_message(m)
+        assert [(cm.command, cm.params) for cm in cms] == [("PING", ["1"]), ("TIME", [])]
+        assert all(cm.prefix == m.prefix for cm in cms)
+        assert len(CtcpMessage.split_message(m, 1)) == 1
+
+    @pytest.mark.parametrize(
+        'line, expected',
+        [
+            (b':nick!user@host PRIVMSG #channel :\x01VERSION\x01', True),
+            (b'PRIVMSG #channel \x01VERSION\x01', True),
+            (b'PRIVMSG #channel :text \x01VERSION\x01', False),
+            (b'PRIVMSG \x01channel :text', False),
+            (b'PRIVMSG #channel :', False),
+            (b'PRIVMSG #channel ', False),
+            (b'PRIVMSG', False),
+        ]
+    )
+    def test_has_ctcp(self, line, expected):
+        assert LazyMessage.from_bytes(line).has_ctcp() is expected
+        assert Message.from_bytes(line).has_ctcp() is expected
+
 
 class TestTextMessage:
 
@@ -137,3 +414,4 @@ class TestTextMessage:
         assert tm.target == "#channel"
         assert tm.line == "Some  message"
         assert tm.words == ["Some", "message"]
+        assert tm.words is tm.words
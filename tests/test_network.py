@@ -0,0 +1,115 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import socket
+
+import pytest
+
+from shanghai.config import NetworkConfiguration
+from shanghai.event import build_event
+from shanghai.irc import Prefix
+from shanghai.network import Network
+from shanghai.plugin_base import NetworkEventName
+
+
+@pytest.fixture
+def loop():
+    return asyncio.get_event_loop()
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_network(loop, ports, **config):
+    config.update(nick='nick', user='user', realname='realname',
+                  servers=[f'127.0.0.1:{port}' for port in ports])
+    # don't write log files into the working directory
+    config.setdefault('logging', {'disable': True})
+    return Network(NetworkConfiguration('test', config), loop=loop)
+
+
+class TestRace:
+
+    def test_first_wins(self, loop):
+        async def test():
+            server = await asyncio.start_server(lambda r, w: None, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            refused = unused_port()
+            network = make_network(loop, [refused, port, port], race=dict(count=3, stagger=5))
+            await asyncio.wait_for(network._race(), 1)
+
+            assert network.server.port == port
+            assert network._connection.connect_duration is not None
+            status = {s.server.port: s for s in network.server_pool.status()}
+            assert status[refused].failures == 1
+            assert status[port].failures == 0
+
+            network._connection.close()
+            server.close()
+            await server.wait_closed()
+
+        loop.run_until_complete(test())
+
+    def test_all_fail(self, loop):
+        ports = [unused_port(), unused_port()]
+        network = make_network(loop, ports, race=dict(count=2))
+        with pytest.raises(OSError):
+            loop.run_until_complete(network._race())
+        # the last failure is left for `run` to record
+        assert sum(s.failures for s in network.server_pool.status()) == 1
+        assert network._connection.server is network.server
+
+    def test_no_candidates(self, loop):
+        network = make_network(loop, [unused_port()], race=dict(count=0))
+        with pytest.raises(ConnectionError):
+            loop.run_until_complete(network._race())
+
+
+class TestTextLength:
+
+    def test_text_length(self, loop):
+        network = make_network(loop, [6667])
+        network.nickname = 'nick'
+        network.user = 'user'
+        # 'nick!~user@' and a 63 byte hostname
+        assert network.source_length() == 11 + 63
+        network.options['HOSTLEN'] = '10'
+        assert network.source_length() == 11 + 10
+
+        network.users['nick'] = Prefix('nick', '~user', 'host.example')
+        assert network.source_length() == len('nick!~user@host.example')
+        assert network.text_length('PRIVMSG', '#chan') \
+            == 510 - len(':nick!~user@host.example PRIVMSG #chan :')
+
+    def test_helpers(self, loop):
+        network = make_network(loop, [6667], helpers=dict(nicks=['longer_helper']))
+        network.nickname = 'nick'
+        network.users['nick'] = Prefix('nick', 'user', 'host')
+        assert network.source_length() == len('longer_helper!user@host')
+
+
+def test_dispatch_processed(loop):
+    network = make_network(loop, [6667])
+    network.load_shedder.queued(5)
+    event = build_event(NetworkEventName.RAW_LINES, raw_lines=[b'PING :a', b'PING :b'])
+    loop.run_until_complete(network._dispatch(event))
+    assert network.load_shedder.pending == 3
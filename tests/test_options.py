@@ -0,0 +1,39 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from shanghai.irc import Options
+
+
+class TestMaxTargets:
+
+    @pytest.mark.parametrize("options, command, expected", [
+        ({}, 'PRIVMSG', 1),
+        ({'MAXTARGETS': '4'}, 'PRIVMSG', 4),
+        ({'MAXTARGETS': '4'}, 'notice', 4),
+        ({'MAXTARGETS': '4'}, 'KICK', 1),
+        ({'MAXTARGETS': ''}, 'PRIVMSG', None),
+        ({'TARGMAX': 'PRIVMSG:3,NOTICE:,JOIN:'}, 'privmsg', 3),
+        ({'TARGMAX': 'PRIVMSG:3,NOTICE:,JOIN:'}, 'NOTICE', None),
+        ({'TARGMAX': 'PRIVMSG:3,NOTICE:,JOIN:'}, 'KICK', 1),
+        # TARGMAX takes precedence
+        ({'TARGMAX': 'NOTICE:2', 'MAXTARGETS': '4'}, 'PRIVMSG', 1),
+    ])
+    def test_max_targets(self, options, command, expected):
+        assert Options(**options).max_targets(command) == expected
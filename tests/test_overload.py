@@ -0,0 +1,82 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from shanghai.config import ConfigurationError
+from shanghai.overload import LoadShedder, OverloadPolicy
+
+LINES = [
+    b'PING :server',
+    b':server 353 nick = #chan :nick other',
+    b':other!u@h PRIVMSG #chan :1',
+    b':other!u@h JOIN #chan',
+    b'@time=x :other!u@h privmsg #chan :2',
+    b':other!u@h NOTICE #chan :3',
+    b':other!u@h MODE #chan +o nick',
+    b':other!u@h TAGMSG #chan',
+]
+KEEP = [LINES[i] for i in (0, 1, 3, 6)]
+
+
+class TestLoadShedder:
+
+    def test_check(self):
+        shedder = LoadShedder(3)
+        assert not shedder.check(2)
+        assert shedder.check(3)
+        assert shedder.check(4)
+        assert not shedder.check(0)
+        assert shedder.check(3)
+        assert shedder.overloads == 2
+
+    def test_pending(self):
+        shedder = LoadShedder(3)
+        shedder.queued(3)
+        assert shedder.check(shedder.pending)
+        shedder.processed(2)
+        assert not shedder.check(shedder.pending)
+        shedder.processed(5)
+        assert shedder.pending == 0
+
+    def test_disabled(self):
+        shedder = LoadShedder(0)
+        assert not shedder.check(10 ** 6)
+
+    def test_shed(self):
+        shedder = LoadShedder(1, OverloadPolicy.SHED)
+        assert shedder.filter(LINES) == KEEP
+        stats = shedder.stats()
+        assert stats.kept == 0
+        assert stats.dropped == {b'PRIVMSG': 2, b'NOTICE': 1, b'TAGMSG': 1}
+
+    def test_sample(self):
+        shedder = LoadShedder(1, 'sample', sample_interval=3)
+        assert shedder.filter(LINES) == [
+            LINES[0], LINES[1], LINES[2], LINES[3], LINES[6], LINES[7],
+        ]
+        assert shedder.stats().kept == 2
+        assert sum(shedder.stats().dropped.values()) == 2
+
+    def test_sample_all(self):
+        shedder = LoadShedder(1, 'sample', sample_interval=1)
+        assert shedder.filter(LINES) == LINES
+
+    def test_unknown_policy(self):
+        with pytest.raises(ConfigurationError):
+            LoadShedder(1, 'panic')
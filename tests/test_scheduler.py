@@ -0,0 +1,245 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from shanghai.scheduler import Lane, OutboundScheduler
+
+
+class FakeTimer:
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeLoop:
+
+    def __init__(self):
+        self.now = 0.0
+        self.timers = []
+
+    def time(self):
+        return self.now
+
+    def call_later(self, delay, callback):
+        timer = FakeTimer(self.now + delay, callback)
+        self.timers.append(timer)
+        return timer
+
+    def advance(self, seconds):
+        end = self.now + seconds
+        while True:
+            due = [t for t in self.timers if not t.cancelled and t.when <= end]
+            if not due:
+                break
+            timer = min(due, key=lambda t: t.when)
+            self.timers.remove(timer)
+            self.now = timer.when
+            timer.callback()
+        self.now = end
+
+
+@pytest.fixture
+def loop():
+    return FakeLoop()
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+def make_scheduler(loop, sent, **kwargs):
+    kwargs.setdefault('burst', 2)
+    kwargs.setdefault('rate', 1)
+    return OutboundScheduler(sent.append, loop, **kwargs)
+
+
+class TestClassify:
+
+    @pytest.mark.parametrize("line, expected", [
+        (b"PONG :server", (Lane.URGENT, b'')),
+        (b"QUIT :bye", (Lane.URGENT, b'')),
+        (b"NICK Shanghai", (Lane.URGENT, b'')),
+        (b"JOIN #chan", (Lane.NORMAL, b'')),
+        (b"PRIVMSG #Chan :hi", (Lane.BULK, b'#chan')),
+        (b"notice nick :hi", (Lane.BULK, b'nick')),
+        (b"@+draft/reply=1 PRIVMSG #chan :hi", (Lane.BULK, b'#chan')),
+        (b"PRIVMSG", (Lane.NORMAL, b'')),
+    ])
+    def test_classify(self, line, expected):
+        assert OutboundScheduler.classify(line) == expected
+
+
+class TestOutboundScheduler:
+
+    def test_burst_and_refill(self, loop, sent):
+        scheduler = make_scheduler(loop, sent)
+        for i in range(4):
+            scheduler.submit(f"JOIN #{i}".encode())
+        assert sent == [b"JOIN #0", b"JOIN #1"]
+        assert scheduler.queued == 2
+
+        loop.advance(1)
+        assert sent[2:] == [b"JOIN #2"]
+        loop.advance(1)
+        assert sent[3:] == [b"JOIN #3"]
+        assert scheduler.queued == 0
+
+    def test_byte_cost(self, loop, sent):
+        scheduler = make_scheduler(loop, sent, burst=4, line_bytes=10)
+        assert scheduler.cost(b"x" * 8) == 1
+        assert scheduler.cost(b"x" * 9) == 2
+        assert scheduler.cost(b"x" * 1000) == 4
+        scheduler.submit(b"x" * 9)
+        scheduler.submit(b"x" * 9)
+        scheduler.submit(b"y")
+        assert sent == [b"x" * 9, b"x" * 9]
+        loop.advance(0.5)
+        assert len(sent) == 2
+        loop.advance(0.5)
+        assert sent[2:] == [b"y"]
+
+    def test_urgent_not_delayed(self, loop, sent):
+        scheduler = make_scheduler(loop, sent)
+        for i in range(5):
+            scheduler.submit(f"PRIVMSG #chan :{i}".encode())
+        scheduler.submit(b"PONG :server")
+        assert sent[-1] == b"PONG :server"
+
+        # but it is paid for
+        loop.advance(1)
+        assert len(sent) == 3
+        loop.advance(1)
+        assert len(sent) == 4
+
+    def test_normal_before_bulk(self, loop, sent):
+        scheduler = make_scheduler(loop, sent, burst=1)
+        scheduler.submit(b"PRIVMSG #chan :1")
+        scheduler.submit(b"PRIVMSG #chan :2")
+        scheduler.submit(b"MODE #chan +o nick")
+        loop.advance(2)
+        assert sent == [b"PRIVMSG #chan :1", b"MODE #chan +o nick", b"PRIVMSG #chan :2"]
+
+    def test_target_fairness(self, loop, sent):
+        scheduler = make_scheduler(loop, sent, burst=1)
+        for i in range(3):
+            scheduler.submit(f"PRIVMSG #a :{i}".encode())
+        scheduler.submit(b"PRIVMSG #b :0")
+        scheduler.submit(b"NOTICE #c :0")
+        loop.advance(10)
+        assert sent == [
+            b"PRIVMSG #a :0",
+            b"PRIVMSG #a :1",  # #b and #c weren't waiting yet
+            b"PRIVMSG #b :0",
+            b"NOTICE #c :0",
+            b"PRIVMSG #a :2",
+        ]
+
+    def test_disabled(self, loop, sent):
+        scheduler = make_scheduler(loop, sent, rate=0)
+        for i in range(10):
+            scheduler.submit(b"PRIVMSG #chan :hi")
+        assert len(sent) == 10
+        assert not loop.timers
+
+    @pytest.mark.parametrize('rate', [1, 0])
+    def test_not_writable(self, loop, sent, rate):
+        writable = [False]
+        scheduler = make_scheduler(loop, sent, burst=8, rate=rate,
+                                   writable=lambda: writable[0])
+        scheduler.submit(b"PRIVMSG #chan :1")
+        scheduler.submit(b"MODE #chan +o nick")
+        scheduler.submit(b"PONG :server")
+        assert sent == [b"PONG :server"]
+        assert scheduler.queued == 2
+
+        writable[0] = True
+        scheduler.resume()
+        assert sent == [b"PONG :server", b"MODE #chan +o nick", b"PRIVMSG #chan :1"]
+
+    def test_stats(self, loop, sent):
+        scheduler = make_scheduler(loop, sent, burst=1)
+        scheduler.submit(b"PRIVMSG #chan :1")
+        scheduler.submit(b"PRIVMSG #chan :2")
+        scheduler.submit(b"PRIVMSG #chan :3")
+        scheduler.submit(b"PONG :x")
+        loop.advance(10)
+        stats = scheduler.stats()
+        assert stats[Lane.URGENT] == (1, 0.0, 0.0)
+        assert stats[Lane.NORMAL] == (0, 0.0, 0.0)
+        # PONG's cost pushed the second line to 2 s and the third to 3 s
+        assert stats[Lane.BULK] == (3, 5 / 3, 3)
+
+    def test_close(self, loop, sent):
+        scheduler = make_scheduler(loop, sent, burst=1)
+        scheduler.submit(b"JOIN #a")
+        scheduler.submit(b"JOIN #b")
+        scheduler.submit(b"PRIVMSG #a :hi")
+        assert scheduler.close() == 2
+        assert all(timer.cancelled for timer in loop.timers)
+        loop.advance(10)
+        assert sent == [b"JOIN #a"]
+
+    def test_consolidate(self, loop, sent):
+        limits = {'PRIVMSG': 3, 'NOTICE': None}
+        scheduler = make_scheduler(loop, sent, burst=1, max_targets=limits.get)
+        scheduler.submit(b"PRIVMSG #a :first")
+        scheduler.submit(b"PRIVMSG #a :second")
+        for target in (b"#a", b"#b", b"#c", b"#d", b"#e"):
+            scheduler.submit(b"PRIVMSG " + target + b" :hi")
+        scheduler.submit(b"PRIVMSG #f :other")
+        scheduler.submit(b"@t NOTICE #a :hi")
+        scheduler.submit(b"NOTICE #b :hi")
+        loop.advance(10)
+        assert sent == [
+            b"PRIVMSG #a :first",
+            b"PRIVMSG #a :second",
+            # #a's message was waiting behind the second one
+            b"PRIVMSG #b,#c,#d :hi",
+            b"PRIVMSG #e,#a :hi",
+            b"PRIVMSG #f :other",
+            # tags differ
+            b"NOTICE #b :hi",
+            b"@t NOTICE #a :hi",
+        ]
+        assert scheduler.consolidated == 3
+        assert scheduler.queued == 0
+
+    def test_consolidate_length(self, loop, sent):
+        scheduler = make_scheduler(loop, sent, burst=1, max_targets=lambda command: None)
+        text = b" :" + b"x" * 493
+        scheduler.submit(b"PRIVMSG #wait :x")
+        for i in range(3):
+            scheduler.submit(f"PRIVMSG #{i}".encode() + text)
+        loop.advance(10)
+        # 'PRIVMSG #0,#1' + text is 508 bytes, a third target doesn't fit
+        assert sent[1:] == [b"PRIVMSG #0,#1" + text, b"PRIVMSG #2" + text]
+
+    def test_consolidate_unsupported(self, loop, sent):
+        scheduler = make_scheduler(loop, sent, burst=1, max_targets=lambda command: 1)
+        for target in (b"#a", b"#b", b"#c"):
+            scheduler.submit(b"PRIVMSG " + target + b" :hi")
+        loop.advance(10)
+        assert len(sent) == 3
+        assert scheduler.consolidated == 0
@@ -0,0 +1,96 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from shanghai.config import Server
+from shanghai.servers import Backoff, ServerPool
+
+from .test_util import FakeClock
+
+A = Server('a.example.org', 6667)
+B = Server('b.example.org', 6667)
+C = Server('c.example.org', 6697, True)
+
+
+class TestBackoff:
+
+    def test_exponential(self):
+        backoff = Backoff(5, 60, rng=lambda: 0)
+        assert [backoff.next_delay() for _ in range(6)] == [5, 10, 20, 40, 60, 60]
+        assert backoff.attempts == 6
+        backoff.reset()
+        assert backoff.next_delay() == 5
+
+    def test_jitter(self):
+        backoff = Backoff(10, jitter=0.5, rng=lambda: 1)
+        assert backoff.next_delay() == 5
+        assert backoff.next_delay() == 10
+
+
+class TestServerPool:
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def pool(self, clock):
+        return ServerPool([A, B, C], stable_after=60, clock=clock)
+
+    def test_config_order(self, pool):
+        assert pool.select() == A
+
+    def test_failures(self, pool):
+        pool.disconnected(A, "refused")
+        assert pool.select() == B
+        pool.disconnected(B)
+        assert pool.select() == C
+        pool.disconnected(C)
+        assert pool.select() == A
+
+        status = pool.status()
+        assert [s.server for s in status] == [A, B, C]
+        assert status[0].failures == 1
+        assert status[0].last_error == "refused"
+        assert status[1].last_error == "connection failed"
+
+    def test_stable_session(self, pool, clock):
+        pool.connected(A, 0.1)
+        clock.now = 10
+        assert not pool.disconnected(A)
+        assert pool.select() == B
+
+        pool.connected(A)
+        clock.now = 100
+        assert pool.disconnected(A)
+        status = pool.status()[0]
+        assert status.server == A
+        assert (status.connects, status.failures, status.total_failures) == (2, 0, 1)
+
+    def test_prefer_fast(self, pool):
+        pool.connected(B, 0.5)
+        pool.connected(C, 0.2)
+        assert pool.select() == C
+        pool.record_latency(B, 0.1)
+        assert pool.select() == B
+        assert pool.status()[-1].server == A
+
+    def test_empty(self):
+        with pytest.raises(ValueError):
+            ServerPool([])
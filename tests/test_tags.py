@@ -0,0 +1,110 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from shanghai.irc import tags
+
+
+class TestEscaping:
+
+    @pytest.mark.parametrize(
+        'value, escaped',
+        [
+            ('hello world\r\nfoo\\bar;=', 'hello\\sworld\\r\\nfoo\\\\bar\\:='),
+            ('plain', 'plain'),
+            ('', ''),
+            (';;', '\\:\\:'),
+        ]
+    )
+    def test_roundtrip(self, value, escaped):
+        assert tags.escape(value) == escaped
+        assert tags.unescape(escaped) == value
+
+    def test_unescape_invalid(self):
+        assert tags.unescape('\\b') == 'b'
+        assert tags.unescape('trailing\\') == 'trailing'
+        assert tags.unescape('\\\\s') == '\\s'
+        # slow path
+        assert tags.unescape('\0\\s\\b\\') == '\0 b'
+
+
+class TestTagKey:
+
+    @pytest.mark.parametrize(
+        'key, expected',
+        [
+            ('msgid', ('msgid', None, False)),
+            ('+typing', ('typing', None, True)),
+            ('example.com/foo', ('foo', 'example.com', False)),
+            ('+draft.example.com/reply', ('reply', 'draft.example.com', True)),
+        ]
+    )
+    def test_from_string_and_str(self, key, expected):
+        tag_key = tags.TagKey.from_string(key)
+        assert tuple(tag_key) == expected
+        assert str(tag_key) == key
+        assert tags.is_client_only(key) is expected[2]
+
+    @pytest.mark.parametrize('key', ['', '+', 'foo/', 'a b', 'foo=bar'])
+    def test_invalid(self, key):
+        with pytest.raises(tags.TagError):
+            tags.TagKey.from_string(key)
+
+
+class TestParseTags:
+
+    def test_parse(self):
+        parsed = tags.parse_tags('time=2016-01-01T00:00:00.000Z;+typing=active;bot;empty=;'
+                                 'example.com/x=a\\sb')
+        assert parsed == {'time': '2016-01-01T00:00:00.000Z',
+                          '+typing': 'active',
+                          'bot': True,
+                          'empty': '',
+                          'example.com/x': 'a b'}
+
+    def test_limit(self):
+        tags.parse_tags('a=' + 'x' * 8187)
+        with pytest.raises(tags.TagError):
+            tags.parse_tags('a=' + 'x' * 8188)
+        with pytest.raises(tags.TagError):
+            tags.parse_tags('a=' + 'ä' * 4094)
+
+
+class TestFormatTags:
+
+    def test_format(self):
+        formatted = tags.format_tags({'msgid': 'abc',
+                                      '+reply': 'a b;c',
+                                      'flag': True,
+                                      'empty': '',
+                                      'omitted': False})
+        assert formatted == 'msgid=abc;+reply=a\\sb\\:c;flag;empty'
+
+    def test_roundtrip(self):
+        mapping = {'account': 'user', 'batch': 'x\\y', 'vendor.example/z': True}
+        assert tags.parse_tags(tags.format_tags(mapping)) == mapping
+
+    def test_invalid_key(self):
+        with pytest.raises(tags.TagError):
+            tags.format_tags({'a b': True})
+
+    def test_limit(self):
+        tags.format_tags({'a': 'x' * 4090}, limit=tags.MAX_CLIENT_TAGS_LENGTH)
+        with pytest.raises(tags.TagError):
+            tags.format_tags({'a': 'x' * 4091}, limit=tags.MAX_CLIENT_TAGS_LENGTH)
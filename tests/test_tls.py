@@ -0,0 +1,105 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import shutil
+import ssl
+import subprocess
+
+import pytest
+
+from shanghai.config import Server
+from shanghai.connection import Connection, ProtocolConnection
+from shanghai.event_queue import EventQueue
+from shanghai.plugin_base import NetworkEventName
+from shanghai.tls import get_ssl_context
+
+
+@pytest.fixture
+def loop():
+    return asyncio.get_event_loop()
+
+
+@pytest.fixture(scope='module')
+def certificate(tmpdir_factory):
+    if not shutil.which('openssl'):
+        pytest.skip("openssl is not available")
+    path = tmpdir_factory.mktemp('tls')
+    cert, key = str(path / 'cert.pem'), str(path / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+class TestGetSslContext:
+
+    def test_plain(self):
+        assert get_ssl_context(Server('localhost', 6667)) is None
+
+    def test_cached(self):
+        server = Server('localhost', 6697, True)
+        context = get_ssl_context(server)
+        assert context is get_ssl_context(Server('localhost', 6697, True))
+        assert context.verify_mode == ssl.CERT_REQUIRED
+        assert context.check_hostname
+        assert context is not get_ssl_context(server._replace(verify=False))
+
+    def test_no_verify(self):
+        context = get_ssl_context(Server('localhost', 6697, True, verify=False))
+        assert context.verify_mode == ssl.CERT_NONE
+        assert not context.check_hostname
+
+    def test_client_cert(self, certificate):
+        cert, key = certificate
+        assert get_ssl_context(Server('localhost', 6697, True, ca_file=cert,
+                                      client_cert=cert, client_key=key))
+
+
+async def serve_welcome(reader, writer):
+    writer.write(b':server 001 nick :Welcome\r\n')
+    await writer.drain()
+    writer.close()
+
+
+@pytest.mark.parametrize('connection_class', [Connection, ProtocolConnection])
+def test_resume(connection_class, certificate, loop):
+    cert, key = certificate
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert, key)
+
+    async def test():
+        tcp_server = await asyncio.start_server(serve_welcome, '127.0.0.1', 0,
+                                                ssl=server_context)
+        port = tcp_server.sockets[0].getsockname()[1]
+        server = Server('localhost', port, True, ca_file=cert)
+        resumed = []
+        for _ in range(2):
+            queue = EventQueue()
+            connection = connection_class(server, queue, loop)
+            await connection.run()
+            events = queue.get_batch_nowait()
+            assert events[-1].name == NetworkEventName.DISCONNECTED
+            assert connection.connect_duration > 0
+            resumed.append(connection.tls_resumed)
+
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        return resumed
+
+    assert loop.run_until_complete(test()) == [False, True]
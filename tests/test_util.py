@@ -0,0 +1,92 @@
+# Copyright © 2016  Lars Peter Søndergaard <lps@chireiden.net>
+# Copyright © 2016  FichteFoll <fichtefoll2@googlemail.com>
+#
+# This file is part of Shanghai, an asynchronous multi-server IRC bot.
+#
+# Shanghai is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Shanghai is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Shanghai.  If not, see <http://www.gnu.org/licenses/>.
+
+from shanghai.util import RateLimiter, TokenBucket
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+
+    def test_burst_and_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 0.5, clock)
+        assert bucket.consume()
+        assert bucket.consume()
+        assert not bucket.consume()
+        assert bucket.delay() == 2
+
+        clock.now = 1
+        assert not bucket.consume()
+        clock.now = 2
+        assert bucket.consume()
+        assert bucket.delay() == 2
+
+    def test_capacity(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 1, clock)
+        clock.now = 100
+        assert bucket.consume(2)
+        assert not bucket.consume()
+
+    def test_cost(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, 1, clock)
+        assert bucket.consume(7)
+        assert not bucket.consume(4)
+        assert bucket.delay(4) == 1
+        assert bucket.consume(3)
+
+    def test_charge(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 1, clock)
+        bucket.charge(3)
+        assert not bucket.consume()
+        assert bucket.delay() == 2
+        clock.now = 2
+        assert bucket.consume()
+
+
+class TestRateLimiter:
+
+    def test_keys(self):
+        clock = FakeClock()
+        limiter = RateLimiter(1, 1, clock=clock)
+        assert limiter.consume('a')
+        assert not limiter.consume('a')
+        assert limiter.consume('b')
+        clock.now = 1
+        assert limiter.consume('a')
+
+    def test_maxsize(self):
+        limiter = RateLimiter(1, 0, maxsize=2, clock=FakeClock())
+        assert limiter.consume('a')
+        assert limiter.consume('b')
+        assert not limiter.consume('a')
+        # evicts 'b', the least recently used key
+        assert limiter.consume('c')
+        assert len(limiter) == 2
+        assert not limiter.consume('a')
+        assert limiter.consume('b')